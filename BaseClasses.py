@@ -2,13 +2,15 @@ from __future__ import annotations
 
 import collections
 import functools
+import itertools
 import logging
 import random
 import secrets
 import warnings
+from array import array
 from argparse import Namespace
 from collections import Counter, deque, defaultdict
-from collections.abc import Collection, MutableSequence
+from collections.abc import Collection, MutableMapping, MutableSequence
 from enum import IntEnum, IntFlag
 from typing import (AbstractSet, Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Literal, Mapping, NamedTuple,
                     Optional, Protocol, Set, Tuple, Union, TYPE_CHECKING, Literal, overload)
@@ -22,6 +24,7 @@ import Utils
 
 if TYPE_CHECKING:
     from entrance_rando import ERPlacementState
+    from generation_profile import GenerationProfile
     from worlds import AutoWorld
 
 
@@ -56,6 +59,17 @@ class HasNameAndPlayer(Protocol):
     player: int
 
 
+@dataclasses.dataclass
+class RuleDependencies:
+    """What an access rule read while it was evaluated, see CollectionState.trace_rule."""
+    items: Set[Tuple[int, str]]
+    """(player, item name) of every item count the rule read."""
+    regions: Set[int]
+    """Players whose reachable regions the rule looked at, e.g. through state.can_reach."""
+    opaque: bool
+    """If True, the rule read prog_items in a way that can't be attributed to single items, like iterating them."""
+
+
 @dataclasses.dataclass
 class PlandoItemBlock:
     player: int
@@ -78,6 +92,10 @@ class MultiWorld():
     is_race: bool = False
     precollected_items: Dict[int, List[Item]]
     state: CollectionState
+    generation_profile: Optional[GenerationProfile] = None
+    """Timings of this generation, if it is being profiled."""
+    item_count_indices: Dict[int, ItemCountIndex]
+    """Interned progression item names of worlds with interned_prog_items, see index_prog_items."""
 
     plando_options: PlandoOptions
     early_items: Dict[int, Dict[str, int]]
@@ -168,6 +186,7 @@ class MultiWorld():
         self.indirect_connections = {}
         self.start_inventory_from_pool: Dict[int, Options.StartInventoryPool] = {}
         self.plando_item_blocks = {}
+        self.item_count_indices = {}
 
         for player in range(1, players + 1):
             def set_player_attr(attr: str, val) -> None:
@@ -427,6 +446,34 @@ class MultiWorld():
     def get_location(self, location_name: str, player: int) -> Location:
         return self.regions.location_cache[player][location_name]
 
+    def index_prog_items(self) -> None:
+        """
+        Interns the progression item names of every world with interned_prog_items into an ItemCountIndex, so that
+        CollectionStates created afterwards count them in an IndexedItemCounter. Called once all items are created.
+        """
+        names: Dict[int, Dict[str, None]] = {player: {} for player in self.player_ids
+                                             if self.worlds[player].interned_prog_items}
+        if not names:
+            return
+        for item in itertools.chain(self.itempool, itertools.chain.from_iterable(self.precollected_items.values()),
+                                    (location.item for location in self.get_filled_locations())):
+            if item.advancement and item.player in names:
+                names[item.player][item.name] = None
+        for player, player_names in names.items():
+            index = self.item_count_indices[player] = ItemCountIndex(player_names,
+                                                                     self.get_item_group_memberships(player))
+            if getattr(self, "state", None):
+                self.state.prog_items[player] = index.new_counter(self.state.prog_items[player])
+
+    def get_item_group_memberships(self, player: int) -> ItemGroupMemberships:
+        """Maps the item names of `player`'s item groups to the groups they are in, for the running group counts of
+        IndexedItemCounter."""
+        memberships: Dict[str, Tuple[str, ...]] = {}
+        for group, item_names in self.worlds[player].item_name_groups.items():
+            for item_name in item_names:
+                memberships[item_name] = memberships.get(item_name, ()) + (group,)
+        return memberships
+
     def get_all_state(self, use_cache: bool | None = None, allow_partial_entrances: bool = False,
                       collect_pre_fill_items: bool = True, perform_sweep: bool = True) -> CollectionState:
         """
@@ -581,6 +628,19 @@ class MultiWorld():
 
         return False
 
+    def trace_rule_dependencies(self, state: Optional[CollectionState] = None) \
+            -> Dict[Union[Location, Entrance], RuleDependencies]:
+        """
+        Records what the access rule of every location and entrance reads when evaluated in `state`, by default the state
+        with all items collected. See CollectionState.trace_rule.
+        """
+        if state is None:
+            state = self.get_all_state()
+        dependencies: Dict[Union[Location, Entrance], RuleDependencies] = {}
+        for spot in itertools.chain(self.get_locations(), self.get_entrances()):
+            dependencies[spot] = state.trace_rule(spot.access_rule)[1]
+        return dependencies
+
     def get_spheres(self) -> Iterator[Set[Location]]:
         """
         yields a set of locations for each logical sphere
@@ -718,6 +778,320 @@ class MultiWorld():
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+ItemGroupMemberships = Mapping[str, Tuple[str, ...]]
+"""Maps item names to the names of the item groups they are in."""
+
+
+def _update_group_counts(counter: IndexedItemCounter, groups: Tuple[str, ...], old: int, new: int) -> None:
+    group_counts = counter.group_counts
+    group_unique_counts = counter.group_unique_counts
+    unique = (new > 0) - (old > 0)
+    for group in groups:
+        group_counts[group] = group_counts.get(group, 0) + new - old
+        if unique:
+            group_unique_counts[group] = group_unique_counts.get(group, 0) + unique
+
+
+class ItemCountIndex:
+    """
+    Dense indices of the progression item names of one world, shared by all IndexedItemCounters of its player.
+    """
+    __slots__ = ("names", "indices", "item_groups")
+
+    names: Tuple[str, ...]
+    indices: Dict[str, int]
+    item_groups: Optional[ItemGroupMemberships]
+
+    def __init__(self, names: Iterable[str], item_groups: Optional[ItemGroupMemberships] = None) -> None:
+        self.names = tuple(dict.fromkeys(names))
+        self.indices = {name: index for index, name in enumerate(self.names)}
+        self.item_groups = item_groups
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def new_counter(self, counts: Optional[Mapping[str, int]] = None) -> IndexedItemCounter:
+        """Creates a counter of this index, holding `counts`."""
+        ret = IndexedItemCounter(self)
+        if counts:
+            for name, count in counts.items():
+                ret[name] = count
+        return ret
+
+
+class IndexedItemCounter(MutableMapping):
+    """
+    Counter of item names used for CollectionState.prog_items of worlds with interned_prog_items.
+    The counts of the names of its ItemCountIndex live in an array, so copying it is a single memory copy no matter how
+    many items were collected. Names outside the index, such as items created after create_items or names that worlds
+    count in collect, are kept in a regular Counter. It also keeps running counts of the item groups of its index, for
+    CollectionState.has_group and co.
+    """
+    __slots__ = ("index", "counts", "extra", "item_groups", "group_counts", "group_unique_counts", "_indices")
+
+    index: ItemCountIndex
+    counts: array
+    extra: Counter[str]
+    item_groups: Optional[ItemGroupMemberships]
+    group_counts: Dict[str, int]
+    """Summed count of the items of each item group."""
+    group_unique_counts: Dict[str, int]
+    """Amount of different items of each item group."""
+
+    def __init__(self, index: ItemCountIndex) -> None:
+        self.index = index
+        self._indices = index.indices
+        self.counts = array("i", bytes(4 * len(index)))
+        self.extra = Counter()
+        self.item_groups = index.item_groups
+        self.group_counts = {}
+        self.group_unique_counts = {}
+
+    def __getitem__(self, name: str) -> int:
+        index = self._indices.get(name)
+        if index is None:
+            return self.extra[name]
+        return self.counts[index]
+
+    def __setitem__(self, name: str, count: int) -> None:
+        if self.item_groups and name in self.item_groups:
+            _update_group_counts(self, self.item_groups[name], self[name], count)
+        index = self._indices.get(name)
+        if index is None:
+            self.extra[name] = count
+        else:
+            self.counts[index] = count
+
+    def __delitem__(self, name: str) -> None:
+        if self.item_groups and name in self.item_groups:
+            _update_group_counts(self, self.item_groups[name], self[name], 0)
+        index = self._indices.get(name)
+        if index is None:
+            del self.extra[name]
+        else:
+            self.counts[index] = 0
+
+    def __contains__(self, name: object) -> bool:
+        index = self._indices.get(name)  # type: ignore[call-overload]
+        if index is None:
+            return name in self.extra
+        return self.counts[index] != 0
+
+    def __iter__(self) -> Iterator[str]:
+        for name, count in zip(self.index.names, self.counts):
+            if count:
+                yield name
+        yield from self.extra
+
+    def __len__(self) -> int:
+        return len(self.counts) - self.counts.count(0) + len(self.extra)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in self:
+            return self[name]
+        return default
+
+    def total(self) -> int:
+        return sum(self.counts) + sum(self.extra.values())
+
+    def update(self, iterable=None, /, **kwds) -> None:
+        """Adds the counts of `iterable`, a mapping or an iterable of names, like Counter.update."""
+        if iterable is not None:
+            if isinstance(iterable, Mapping):
+                for name, count in iterable.items():
+                    self[name] += count
+            else:
+                for name in iterable:
+                    self[name] += 1
+        if kwds:
+            self.update(kwds)
+
+    def clear(self) -> None:
+        self.counts = array("i", bytes(4 * len(self.index)))
+        self.extra.clear()
+        self.group_counts.clear()
+        self.group_unique_counts.clear()
+
+    def copy(self) -> IndexedItemCounter:
+        ret = IndexedItemCounter.__new__(IndexedItemCounter)
+        ret.index = self.index
+        ret._indices = self._indices
+        ret.counts = self.counts[:]
+        ret.extra = self.extra.copy()
+        ret.item_groups = self.item_groups
+        ret.group_counts = self.group_counts.copy()
+        ret.group_unique_counts = self.group_unique_counts.copy()
+        return ret
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return self.index.new_counter, (dict(self.items()),)
+
+
+class _ItemReadRecorder:
+    """
+    Stands in for CollectionState.prog_items while an access rule of `player` is evaluated and records which of that
+    player's item names the rule reads. Any other kind of access (other players, iteration, writes, ...) makes the read
+    set unknown, which is reported through `opaque`.
+    """
+    __slots__ = ("prog_items", "player", "reads", "opaque", "_counter")
+
+    def __init__(self, prog_items: Dict[int, Counter[str]], player: int) -> None:
+        self.prog_items = prog_items
+        self.player = player
+        self.reads: Set[str] = set()
+        self.opaque = False
+        self._counter = _ItemCounterReadRecorder(self, prog_items[player])
+
+    def reset(self) -> None:
+        self.reads = set()
+        self.opaque = False
+
+    def __getitem__(self, player: int) -> Any:
+        if player == self.player:
+            return self._counter
+        self.opaque = True
+        return self.prog_items[player]
+
+    def __getattr__(self, name: str) -> Any:
+        self.opaque = True
+        return getattr(self.prog_items, name)
+
+    def __contains__(self, player: int) -> bool:
+        return player in self.prog_items
+
+    def __iter__(self) -> Iterator[int]:
+        self.opaque = True
+        return iter(self.prog_items)
+
+    def __len__(self) -> int:
+        return len(self.prog_items)
+
+
+class _ItemCounterReadRecorder:
+    __slots__ = ("recorder", "counter")
+
+    def __init__(self, recorder: _ItemReadRecorder, counter: Counter[str]) -> None:
+        self.recorder = recorder
+        self.counter = counter
+
+    def __getitem__(self, item: str) -> int:
+        self.recorder.reads.add(item)
+        return self.counter[item]
+
+    def get(self, item: str, default: Any = None) -> Any:
+        self.recorder.reads.add(item)
+        return self.counter.get(item, default)
+
+    def __contains__(self, item: str) -> bool:
+        self.recorder.reads.add(item)
+        return item in self.counter
+
+    def __setitem__(self, item: str, value: int) -> None:
+        self.recorder.opaque = True
+        self.counter[item] = value
+
+    def __delitem__(self, item: str) -> None:
+        self.recorder.opaque = True
+        del self.counter[item]
+
+    def __getattr__(self, name: str) -> Any:
+        self.recorder.opaque = True
+        return getattr(self.counter, name)
+
+    def __iter__(self) -> Iterator[str]:
+        self.recorder.opaque = True
+        return iter(self.counter)
+
+    def __len__(self) -> int:
+        self.recorder.opaque = True
+        return len(self.counter)
+
+    def __eq__(self, other: object) -> bool:
+        self.recorder.opaque = True
+        return self.counter == other
+
+    def __ne__(self, other: object) -> bool:
+        self.recorder.opaque = True
+        return self.counter != other
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+class _RegionReadRecorder:
+    """
+    Stands in for CollectionState.reachable_regions while an access rule is evaluated and records whose reachable
+    regions the rule looked at.
+    """
+    __slots__ = ("reachable_regions", "players")
+
+    def __init__(self, reachable_regions: Dict[int, Set[Region]]) -> None:
+        self.reachable_regions = reachable_regions
+        self.players: Set[int] = set()
+
+    def __getitem__(self, player: int) -> Set[Region]:
+        self.players.add(player)
+        return self.reachable_regions[player]
+
+    def __getattr__(self, name: str) -> Any:
+        self.players.update(self.reachable_regions)
+        return getattr(self.reachable_regions, name)
+
+    def __contains__(self, player: int) -> bool:
+        return player in self.reachable_regions
+
+    def __iter__(self) -> Iterator[int]:
+        self.players.update(self.reachable_regions)
+        return iter(self.reachable_regions)
+
+    def __len__(self) -> int:
+        return len(self.reachable_regions)
+
+
+class _ItemReadTracer:
+    """
+    Stands in for CollectionState.prog_items while a rule is traced and records the item reads of all players.
+    """
+    __slots__ = ("prog_items", "recorders", "_opaque")
+
+    def __init__(self, prog_items: Dict[int, Counter[str]]) -> None:
+        self.prog_items = prog_items
+        self.recorders: Dict[int, _ItemReadRecorder] = {}
+        self._opaque = False
+
+    @property
+    def reads(self) -> Set[Tuple[int, str]]:
+        return {(player, name) for player, recorder in self.recorders.items() for name in recorder.reads}
+
+    @property
+    def opaque(self) -> bool:
+        return self._opaque or any(recorder.opaque for recorder in self.recorders.values())
+
+    def __getitem__(self, player: int) -> Any:
+        recorder = self.recorders.get(player)
+        if recorder is None:
+            if player not in self.prog_items:
+                return self.prog_items[player]
+            recorder = self.recorders[player] = _ItemReadRecorder(self.prog_items, player)
+        return recorder[player]
+
+    def __getattr__(self, name: str) -> Any:
+        self._opaque = True
+        return getattr(self.prog_items, name)
+
+    def __contains__(self, player: int) -> bool:
+        return player in self.prog_items
+
+    def __iter__(self) -> Iterator[int]:
+        self._opaque = True
+        return iter(self.prog_items)
+
+    def __len__(self) -> int:
+        return len(self.prog_items)
+
+
 class CollectionState():
     prog_items: Dict[int, Counter[str]]
     multiworld: MultiWorld
@@ -728,15 +1102,28 @@ class CollectionState():
     locations_checked: Set[Location]
     stale: Dict[int, bool]
     allow_partial_entrances: bool
+    shared_players: Set[int]
+    """
+    players whose prog_items, reachable_regions and blocked_connections values are shared with copies of this state,
+    see own_player
+    """
+    _updating_players: Set[int]
+    """ players whose reachable regions are being updated, which copies taken meanwhile can't share """
     additional_init_functions: List[Callable[[CollectionState, MultiWorld], None]] = []
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
 
     def __init__(self, parent: MultiWorld, allow_partial_entrances: bool = False):
         assert parent.worlds, "CollectionState created without worlds initialized in parent"
-        self.prog_items = {player: Counter() for player in parent.get_all_ids()}
+        indices = parent.item_count_indices
+        self.prog_items = {
+            player: indices[player].new_counter() if player in indices else Counter()
+            for player in parent.get_all_ids()
+        }
         self.multiworld = parent
         self.reachable_regions = {player: set() for player in parent.get_all_ids()}
         self.blocked_connections = {player: set() for player in parent.get_all_ids()}
+        self.shared_players = set()
+        self._updating_players = set()
         self.advancements = set()
         self.path = {}
         self.locations_checked = set()
@@ -750,6 +1137,15 @@ class CollectionState():
 
     def update_reachable_regions(self, player: int):
         self.stale[player] = False
+        if player in self.shared_players:
+            self.own_player(player)
+        self._updating_players.add(player)
+        try:
+            self._update_reachable_regions(player)
+        finally:
+            self._updating_players.discard(player)
+
+    def _update_reachable_regions(self, player: int) -> None:
         world: AutoWorld.World = self.multiworld.worlds[player]
         reachable_regions = self.reachable_regions[player]
         queue = deque(self.blocked_connections[player])
@@ -816,20 +1212,62 @@ class CollectionState():
             queue.extend(blocked_connections)
 
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
-        ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
-        ret.reachable_regions = {player: region_set.copy() for player, region_set in
-                                 self.reachable_regions.items()}
-        ret.blocked_connections = {player: entrance_set.copy() for player, entrance_set in
-                                   self.blocked_connections.items()}
+        # The per-player values are shared with the copy until either state writes to them, see own_player.
+        # This bypasses __init__, as collecting the precollected items again would just be overwritten.
+        ret = CollectionState.__new__(CollectionState)
+        ret.multiworld = self.multiworld
+        ret.prog_items = self.prog_items.copy()
+        ret.reachable_regions = self.reachable_regions.copy()
+        ret.blocked_connections = self.blocked_connections.copy()
+        self.shared_players = set(self.prog_items)
+        self.shared_players -= self._updating_players
+        ret.shared_players = self.shared_players.copy()
+        ret._updating_players = set()
+        for player in self._updating_players:
+            ret.own_player(player)
         ret.advancements = self.advancements.copy()
         ret.path = self.path.copy()
         ret.locations_checked = self.locations_checked.copy()
+        ret.stale = self.stale.copy()
         ret.allow_partial_entrances = self.allow_partial_entrances
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
 
+    def own_player(self, player: int) -> None:
+        """
+        Gives this state its own copies of the prog_items, reachable_regions and blocked_connections values of `player`,
+        which it may share with copies of it. collect, remove, update_reachable_regions and the item methods do this
+        themselves, anything else writing to these values directly has to call it first.
+        """
+        self.shared_players.discard(player)
+        self.prog_items[player] = self.prog_items[player].copy()
+        self.reachable_regions[player] = self.reachable_regions[player].copy()
+        self.blocked_connections[player] = self.blocked_connections[player].copy()
+
+    def trace_rule(self, rule: Callable[[CollectionState], bool]) -> Tuple[bool, RuleDependencies]:
+        """
+        Evaluates `rule` in this state and records which items and reachable regions it read.
+        Only what the rule read in this state is recorded, so branches it skipped, e.g. by short-circuiting, are missing.
+        """
+        # the recorders stand in for the per-player dicts, which can't be written to while they do
+        for player in list(self.shared_players):
+            self.own_player(player)
+        prog_items = self.prog_items
+        reachable_regions = self.reachable_regions
+        item_tracer = _ItemReadTracer(prog_items)
+        region_recorder = _RegionReadRecorder(reachable_regions)
+        self.prog_items = item_tracer  # type: ignore[assignment]
+        self.reachable_regions = region_recorder  # type: ignore[assignment]
+        try:
+            result = rule(self)
+        finally:
+            self.prog_items = prog_items
+            self.reachable_regions = reachable_regions
+        return result, RuleDependencies(item_tracer.reads, region_recorder.players, item_tracer.opaque)
+
     def can_reach(self,
                   spot: Union[Location, Entrance, Region, str],
                   resolution_hint: Optional[str] = None,
@@ -1069,8 +1507,25 @@ class CollectionState():
         return total
 
     # item name group related
+    def _group_count(self, item_name_group: str, player: int, unique: bool) -> Optional[int]:
+        """Returns the running count of an item group kept by prog_items, or None if prog_items doesn't keep one."""
+        player_prog_items = self.prog_items[player]
+        if not isinstance(player_prog_items, IndexedItemCounter) or not player_prog_items.item_groups:
+            # e.g. a plain Counter, or while an access rule is traced, which has to see the reads of the group's items
+            return None
+        counts = player_prog_items.group_unique_counts if unique else player_prog_items.group_counts
+        count = counts.get(item_name_group)
+        if count is None:
+            if item_name_group not in self.multiworld.worlds[player].item_name_groups:
+                raise KeyError(item_name_group)
+            return 0
+        return count
+
     def has_group(self, item_name_group: str, player: int, count: int = 1) -> bool:
         """Returns True if the state contains at least `count` items present in a specified item group."""
+        group_count = self._group_count(item_name_group, player, False)
+        if group_count is not None:
+            return group_count >= count
         found: int = 0
         player_prog_items = self.prog_items[player]
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
@@ -1083,6 +1538,9 @@ class CollectionState():
         """Returns True if the state contains at least `count` items present in a specified item group.
         Ignores duplicates of the same item.
         """
+        group_count = self._group_count(item_name_group, player, True)
+        if group_count is not None:
+            return group_count >= count
         found: int = 0
         player_prog_items = self.prog_items[player]
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
@@ -1093,6 +1551,9 @@ class CollectionState():
 
     def count_group(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state."""
+        group_count = self._group_count(item_name_group, player, False)
+        if group_count is not None:
+            return group_count
         player_prog_items = self.prog_items[player]
         return sum(
             player_prog_items[item_name]
@@ -1102,6 +1563,9 @@ class CollectionState():
     def count_group_unique(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state.
         Ignores duplicates of the same item."""
+        group_count = self._group_count(item_name_group, player, True)
+        if group_count is not None:
+            return group_count
         player_prog_items = self.prog_items[player]
         return sum(
             player_prog_items[item_name] > 0
@@ -1113,6 +1577,8 @@ class CollectionState():
         if location:
             self.locations_checked.add(location)
 
+        if item.player in self.shared_players:
+            self.own_player(item.player)
         changed = self.multiworld.worlds[item.player].collect(self, item)
 
         self.stale[item.player] = True
@@ -1131,9 +1597,13 @@ class CollectionState():
         :param count: How many of the item to add.
         """
         assert count > 0
+        if player in self.shared_players:
+            self.own_player(player)
         self.prog_items[player][item] += count
 
     def remove(self, item: Item):
+        if item.player in self.shared_players:
+            self.own_player(item.player)
         changed = self.multiworld.worlds[item.player].remove(self, item)
         if changed:
             # invalidate caches, nothing can be trusted anymore now
@@ -1150,6 +1620,8 @@ class CollectionState():
         :param count: How many of the item to remove.
         """
         assert count > 0
+        if player in self.shared_players:
+            self.own_player(player)
         self.prog_items[player][item] -= count
         if self.prog_items[player][item] < 1:
             del (self.prog_items[player][item])
@@ -1163,6 +1635,8 @@ class CollectionState():
         :param count: How many of the item to now have.
         """
         assert count >= 0
+        if player in self.shared_players:
+            self.own_player(player)
         if count == 0:
             del (self.prog_items[player][item])
         else:
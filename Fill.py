@@ -6,6 +6,7 @@ from collections import Counter, deque
 
 from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock
 from Options import Accessibility
+from generation_profile import enter_phase
 
 from worlds.AutoWorld import call_all
 from worlds.generic.Rules import add_item_rule
@@ -619,6 +620,7 @@ def distribute_items_restrictive(multiworld: MultiWorld,
             location.locked = True
     del mark_for_locking, lock_later
 
+    enter_phase(multiworld, "remaining")
     inaccessible_location_rules(multiworld, multiworld.state, defaultlocations)
 
     remaining_fill(multiworld, excludedlocations, filleritempool, "Remaining Excluded",
@@ -57,6 +57,10 @@ def mystery_argparse(argv: list[str] | None = None):
     parser.add_argument("--spoiler_only", action="store_true",
                         help="Skips generation assertion and multidata, outputting only a spoiler log. "
                              "Intended for debugging and testing purposes.")
+    parser.add_argument("--profile_generation", type=int, nargs="?", const=20, default=0, metavar="RULES",
+                        help="Write a json report of the time taken by each step per player, each fill phase and "
+                             "the RULES slowest access rules (default 20) next to the output. "
+                             "Intended for finding out why a seed is slow to generate.")
     args = parser.parse_args(argv)
 
     if args.skip_output and args.spoiler_only:
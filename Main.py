@@ -7,15 +7,15 @@ import tempfile
 import time
 from typing import Any
 import zipfile
-import zlib
 
 import worlds
 from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld
 from Fill import FillError, balance_multiworld_progression, distribute_items_restrictive, flood_items, \
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from NetUtils import convert_to_base_types
+from generation_profile import GenerationProfile, enter_phase
 from Options import StartInventoryPool
-from Utils import __version__, output_path, restricted_dumps, version_tuple
+from Utils import __version__, output_path, version_tuple
 from settings import get_settings
 from worlds import AutoWorld
 from worlds.generic.Rules import exclusion_rules, locality_rules
@@ -34,6 +34,9 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     start = time.perf_counter()
     # initialize the multiworld
     multiworld = MultiWorld(args.multi)
+    if args.profile_generation:
+        multiworld.generation_profile = GenerationProfile(args.profile_generation)
+        enter_phase(multiworld, "setup")
 
     logger = logging.getLogger()
     multiworld.set_seed(seed, args.race, str(args.outputname) if args.outputname else None)
@@ -184,6 +187,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     if any(world.options.item_links for world in multiworld.worlds.values()):
         multiworld._all_state = None
 
+    enter_phase(multiworld, "prefill")
+    if multiworld.generation_profile:
+        multiworld.generation_profile.sample_rules(multiworld)
+
     logger.info("Running Item Plando.")
     resolve_early_locations_for_planned(multiworld)
     distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
@@ -194,27 +201,36 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     AutoWorld.call_all(multiworld, "pre_fill")
 
     logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
+    enter_phase(multiworld, "progression")
 
     if multiworld.algorithm == 'flood':
         flood_items(multiworld)  # different algo, biased towards early game progress items
     elif multiworld.algorithm == 'balanced':
         distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
 
+    enter_phase(multiworld, "post_fill")
     AutoWorld.call_all(multiworld, 'post_fill')
 
+    enter_phase(multiworld, "balancing")
     if multiworld.players > 1 and not args.skip_prog_balancing:
         balance_multiworld_progression(multiworld)
     else:
         logger.info("Progression balancing skipped.")
 
+    if multiworld.generation_profile:
+        # output runs in threads, which must not race on the counts of the sampled rules
+        multiworld.generation_profile.stop_sampling()
+
     # we're about to output using multithreading, so we're removing the global random state to prevent accidental use
     multiworld.random.passthrough = False
 
     if args.skip_output:
         logger.info('Done. Skipped output/spoiler generation. Total Time: %s', time.perf_counter() - start)
+        _write_generation_profile(multiworld)
         return multiworld
 
     logger.info(f'Beginning output...')
+    enter_phase(multiworld, "output")
     outfilebase = 'AP_' + multiworld.seed_name
 
     if args.spoiler_only:
@@ -224,6 +240,7 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
         multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
         logger.info('Done. Skipped multidata modification. Total time: %s', time.perf_counter() - start)
+        _write_generation_profile(multiworld)
         return multiworld
 
     output = tempfile.TemporaryDirectory()
@@ -350,10 +367,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
                 for key in ("slot_data", "er_hint_data"):
                     multidata[key] = convert_to_base_types(multidata[key])
 
-                serialized_multidata = zlib.compress(restricted_dumps(multidata), 9)
+                serialized_multidata = NetUtils.compress_multidata(multidata,
+                                                                   get_settings().generator.multidata_format)
 
                 with open(os.path.join(temp_dir, f'{outfilebase}.archipelago'), 'wb') as f:
-                    f.write(bytes([3]))  # version of format
                     f.write(serialized_multidata)
 
             output_file_futures.append(pool.submit(write_multidata))
@@ -384,4 +401,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
                 zf.write(file.path, arcname=file.name)
 
     logger.info('Done. Enjoy. Total Time: %s', time.perf_counter() - start)
+    _write_generation_profile(multiworld)
     return multiworld
+
+
+def _write_generation_profile(multiworld: MultiWorld) -> None:
+    if multiworld.generation_profile:
+        multiworld.generation_profile.write(output_path(f"AP_{multiworld.seed_name}_profile.json"), multiworld)
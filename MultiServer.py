@@ -12,10 +12,13 @@ import inspect
 import itertools
 import logging
 import math
+import mmap
 import operator
+import os
 import pickle
 import random
 import shlex
+import struct
 import threading
 import time
 import typing
@@ -43,7 +46,7 @@ import NetUtils
 import Utils
 from Utils import version_tuple, restricted_loads, Version, async_start, get_intended_text
 from NetUtils import Endpoint, ClientStatus, NetworkItem, decode, encode, NetworkPlayer, Permission, NetworkSlot, \
-    SlotType, LocationStore, MultiData, Hint, HintStatus
+    SlotType, LocationStore, MultiData, Hint, HintStatus, decompress_multidata
 from BaseClasses import ItemClassification
 
 
@@ -133,6 +136,95 @@ def get_saving_second(seed_name: str, interval: int = 60) -> int:
     return int(hashlib.sha256(seed_name.encode()).hexdigest(), 16) % interval
 
 
+class SendQueue:
+    """
+    Messages waiting to be sent to a client that fell behind, written by one task at a time.
+    Only Context.queued_commands start queueing. Once messages are queued, everything else sent to the client gets
+    queued behind them as well, so it does not overtake them.
+    Messages piling up while the socket is busy get sent together, in messages of up to max_frame_size characters,
+    so that even encoded as 4 byte UTF-8 they stay within the 1 MiB websockets clients accept by default.
+    Past max_size the queued text gets dropped, and if that is not enough the client gets disconnected instead,
+    as it would miss state otherwise, which it gets again when reconnecting.
+    """
+    __slots__ = ("messages", "size", "max_size", "max_frame_size", "writing", "sent", "coalesced", "dropped",
+                 "dropped_size")
+
+    messages: typing.Deque[typing.Tuple[str, bool]]
+    """ encoded messages and whether they only contain text """
+    size: int
+    """ characters queued """
+    max_size: int
+    max_frame_size: int
+    """ characters sent as one message at most, unless a single queued message is larger """
+    writing: bool
+    sent: int
+    """ messages sent to the socket """
+    coalesced: int
+    """ messages sent as part of another one """
+    dropped: int
+    dropped_size: int
+
+    def __init__(self, max_size: int, max_frame_size: int = 256 * 1024) -> None:
+        self.messages = collections.deque()
+        self.size = 0
+        self.max_size = max_size
+        self.max_frame_size = max_frame_size
+        self.writing = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.dropped_size = 0
+
+    def put(self, msg: str, text: bool) -> bool:
+        """Queues msg, returns False if it does not fit, even after dropping the queued text."""
+        if self.messages and self.size + len(msg) > self.max_size:
+            self.drop_text()
+            if self.messages and self.size + len(msg) > self.max_size:
+                if text:
+                    self._drop(len(msg))
+                    return True
+                return False
+        self.messages.append((msg, text))
+        self.size += len(msg)
+        return True
+
+    def drop_text(self) -> None:
+        kept: typing.Deque[typing.Tuple[str, bool]] = collections.deque()
+        for msg, text in self.messages:
+            if text:
+                self._drop(len(msg))
+                self.size -= len(msg)
+            else:
+                kept.append((msg, text))
+        self.messages = kept
+
+    def _drop(self, size: int) -> None:
+        self.dropped += 1
+        self.dropped_size += size
+
+    def pop(self) -> str:
+        """Removes queued messages, returning as many of them as fit into max_frame_size as one message."""
+        msg = self.messages.popleft()[0]
+        size = len(msg)
+        if self.messages and size + len(self.messages[0][0]) <= self.max_frame_size:
+            # a message is a list of commands, so several messages become one by joining their lists
+            commands = [msg[1:-1]] if len(msg) > 2 else []
+            while self.messages and size + len(self.messages[0][0]) <= self.max_frame_size:
+                queued = self.messages.popleft()[0]
+                size += len(queued)
+                if len(queued) > 2:
+                    commands.append(queued[1:-1])
+                self.coalesced += 1
+            msg = "[" + ",".join(commands) + "]"
+        self.sent += 1
+        self.size -= size
+        return msg
+
+    def clear(self) -> None:
+        self.messages.clear()
+        self.size = 0
+
+
 class Client(Endpoint):
     __slots__ = (
         "__weakref__",
@@ -149,6 +241,7 @@ class Client(Endpoint):
         "no_items",
         "no_locations",
         "no_text",
+        "send_queue",
     )
 
     version: Version
@@ -164,6 +257,7 @@ class Client(Endpoint):
     no_items: bool
     no_locations: bool
     no_text: bool
+    send_queue: SendQueue
 
     def __init__(self, socket: "ServerConnection", ctx: Context) -> None:
         super().__init__(socket)
@@ -180,6 +274,7 @@ class Client(Endpoint):
         self.no_items = False
         self.no_locations = False
         self.no_text = False
+        self.send_queue = SendQueue(ctx.send_queue_size)
 
     @property
     def items_handling(self):
@@ -206,6 +301,199 @@ class Client(Endpoint):
 team_slot = typing.Tuple[int, int]
 
 
+class SaveJournal:
+    """
+    Append-only log of the changes to a Context's save data, kept next to its save file.
+    Instead of rewriting the whole save file every time, the changes since the last save get appended as records,
+    each setting part of the save to its value at that time, so replaying a record more than once does no harm.
+    Once the journal outgrows the save file, a new save file gets written and the journal starts over.
+    """
+    record_header = struct.Struct(">I")
+    min_compaction_size: typing.ClassVar[int] = 1024 * 1024
+    """Journals smaller than this many bytes do not get compacted, even if the save file is smaller."""
+
+    path: str
+    save_filename: str
+    generation: int
+    """Counts up with every save file written, so a journal is only ever replayed onto the save file it belongs to."""
+    size: int
+    snapshot_size: int
+    compact_next: bool
+    lock: threading.Lock
+    """Held while writing, so the autosave thread and the exit save do not write at the same time."""
+
+    def __init__(self, save_filename: str) -> None:
+        self.save_filename = save_filename
+        self.path = save_filename + ".journal"
+        self.generation = 0
+        self.size = 0
+        self.snapshot_size = 0
+        self.compact_next = False
+        self.lock = threading.Lock()
+        self._notes_lock = threading.Lock()
+        self._location_checks: typing.List[typing.Tuple[int, int, typing.Set[int]]] = []
+        self._stored_data_keys: typing.Set[str] = set()
+        self._received_counts: typing.Dict[typing.Tuple[int, int, bool], int] = {}
+        self._hint_slots: typing.Set[team_slot] = set()
+        self._meta_changed = False
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.compact_next or self.size > max(self.snapshot_size, self.min_compaction_size)
+
+    # changes that cannot be found by comparing against the last flush get noted from the event loop
+
+    def note_location_checks(self, team: int, slot: int, locations: typing.Set[int]) -> None:
+        with self._notes_lock:
+            self._location_checks.append((team, slot, set(locations)))
+
+    def note_stored_data(self, key: str) -> None:
+        with self._notes_lock:
+            self._stored_data_keys.add(key)
+
+    def note_hints(self, team: int, slot: int) -> None:
+        with self._notes_lock:
+            self._hint_slots.add((team, slot))
+
+    def note_meta(self) -> None:
+        """Notes a change to any part of Context.get_save_meta, which then gets journaled as a whole."""
+        with self._notes_lock:
+            self._meta_changed = True
+
+    def load(self, ctx: Context, generation: typing.Optional[int]) -> int:
+        """
+        Replays the journal onto the save data loaded from the save file of `generation` and returns the amount of
+        records replayed. A torn record at the end, left by a crash, gets cut off. If the save file was not written by
+        a journaling server, the journal gets discarded and the next save writes a new save file.
+        """
+        replayed = 0
+        valid_size = 0
+        if generation is not None:
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = b""
+            records = self._read_records(data)
+            header = next(records, None)
+            if header and header[0] == ("journal", generation):
+                valid_size = header[1]
+                for record, valid_size in records:
+                    self._replay(ctx, record)
+                    replayed += 1
+                if replayed:
+                    # hints records replace all hints of a slot, so hints they replaced may still be indexed
+                    ctx.reindex_hints()
+        self.generation = generation or 0
+        self.snapshot_size = os.path.getsize(self.save_filename) if os.path.exists(self.save_filename) else 0
+        if valid_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_size)
+                os.fsync(f.fileno())
+            self.size = valid_size
+        else:
+            self._write([("journal", self.generation)], truncate=True)
+            self.compact_next = generation is None
+        self._reset(ctx)
+        if replayed:
+            ctx.logger.info(f"Replayed {replayed} records from save journal {self.path}")
+        return replayed
+
+    def flush(self, ctx: Context) -> None:
+        """Appends the changes since the last flush, with a single write and fsync."""
+        with self._notes_lock:
+            location_checks, self._location_checks = self._location_checks, []
+            stored_data_keys, self._stored_data_keys = self._stored_data_keys, set()
+            hint_slots, self._hint_slots = self._hint_slots, set()
+            meta_changed, self._meta_changed = self._meta_changed, False
+        records: typing.List[tuple] = [("checks", team, slot, locations)
+                                       for team, slot, locations in location_checks]
+        for key, items in list(ctx.received_items.items()):
+            start = self._received_counts.get(key, 0)
+            if len(items) > start:
+                new_items = items[start:]
+                records.append(("items", key, start, new_items))
+                self._received_counts[key] = start + len(new_items)
+        records.extend(("hints", team, slot, set(ctx.hints[team, slot])) for team, slot in hint_slots)
+        records.extend(("stored_data", key, ctx.stored_data[key])
+                       for key in stored_data_keys if key in ctx.stored_data)
+        if meta_changed:
+            records.append(("meta", pickle.dumps(ctx.get_save_meta())))
+        if records:
+            self._write(records)
+
+    def begin_compaction(self, ctx: Context) -> int:
+        """Forgets the changes so far, as they are about to be in the new save file, and returns its generation."""
+        self.compact_next = True  # in case writing the save file fails
+        with self._notes_lock:
+            self._location_checks = []
+            self._stored_data_keys = set()
+            self._hint_slots = set()
+            self._meta_changed = False
+        self._reset(ctx)
+        self.generation += 1
+        return self.generation
+
+    def end_compaction(self, snapshot_size: int) -> None:
+        """Starts over the journal for the save file that was just written."""
+        self._write([("journal", self.generation)], truncate=True)
+        self.snapshot_size = snapshot_size
+        self.compact_next = False
+
+    def _reset(self, ctx: Context) -> None:
+        self._received_counts = {key: len(items) for key, items in list(ctx.received_items.items())}
+
+    def _write(self, records: typing.List[tuple], truncate: bool = False) -> None:
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        data = b"".join(self.record_header.pack(len(encoded)) + encoded
+                        for encoded in map(pickle.dumps, records))
+        with open(self.path, "wb" if truncate else "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size = len(data) if truncate else self.size + len(data)
+
+    @classmethod
+    def _read_records(cls, data: bytes) -> typing.Iterator[typing.Tuple[tuple, int]]:
+        """Yields the records in data along with the offset after each, up to the first incomplete one."""
+        offset = 0
+        header_size = cls.record_header.size
+        while offset + header_size <= len(data):
+            length, = cls.record_header.unpack_from(data, offset)
+            end = offset + header_size + length
+            if end > len(data):
+                return
+            try:
+                record = restricted_loads(data[offset + header_size:end])
+            except Exception:
+                return
+            yield record, end
+            offset = end
+
+    @staticmethod
+    def _replay(ctx: Context, record: tuple) -> None:
+        kind = record[0]
+        if kind == "checks":
+            _, team, slot, locations = record
+            ctx.location_checks[team, slot] |= locations
+        elif kind == "items":
+            _, key, start, items = record
+            received = ctx.received_items.setdefault(key, [])
+            received[start:start + len(items)] = items
+        elif kind == "hints":
+            _, team, slot, hints = record
+            ctx.hints[team, slot] = hints
+            for hint in hints:
+                ctx.index_hint(team, hint)
+        elif kind == "stored_data":
+            _, key, value = record
+            ctx.stored_data[key] = value
+        elif kind == "meta":
+            ctx.set_save_meta(restricted_loads(record[1]))
+        else:
+            raise ValueError(f"Unknown save journal record {kind}")
+
+
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
@@ -228,9 +516,18 @@ class Context:
     hints_used: typing.Dict[typing.Tuple[int, int], int]
     groups: typing.Dict[int, typing.Set[int]]
     save_version = 2
+    send_queue_size = 8 * 1024 * 1024
+    """ characters that may be queued for a client before its text gets dropped or it gets disconnected """
+    queued_commands: typing.ClassVar[typing.FrozenSet[str]] = frozenset(("PrintJSON", "RoomUpdate"))
+    """ commands that start queueing for a client that fell behind, see SendQueue """
+    send_queue_overflows: int
     stored_data: typing.Dict[str, object]
     read_data: typing.Dict[str, object]
     stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
+    bounce_games: typing.Dict[typing.Tuple[int, str], typing.Set[Client]]
+    """ team, game -> authenticated clients playing it, to find the receivers of Bounce """
+    bounce_tags: typing.Dict[typing.Tuple[int, str], typing.Set[Client]]
+    """ team, tag -> authenticated clients with that tag, to find the receivers of Bounce """
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
     checksums: typing.Dict[str, str]
@@ -255,6 +552,9 @@ class Context:
         self.log_network = log_network
         self.endpoints = []
         self.clients = {}
+        self.bounce_games = collections.defaultdict(set)
+        self.bounce_tags = collections.defaultdict(set)
+        self.send_queue_overflows = 0
         self.compatibility: int = compatibility
         self.shutdown_task = None
         self.data_filename = None
@@ -271,6 +571,9 @@ class Context:
         self.server = None
         self.countdown_timer = 0
         self.received_items = {}
+        # received_items keys that got new items since they were last sent, see send_new_items
+        self.new_items_receivers: typing.Set[typing.Tuple[int, int, bool]] = set()
+        self.new_items_handle: typing.Optional[asyncio.Handle] = None
         self.start_inventory = {}
         self.name_aliases: typing.Dict[team_slot, str] = {}
         self.location_checks = collections.defaultdict(set)
@@ -278,6 +581,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # hints by team, finding player and location, so a check only rechecks the hints for that location
+        self.location_hints: typing.Dict[typing.Tuple[int, int, int], typing.Set[Hint]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -297,6 +602,7 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_journal: typing.Optional[SaveJournal] = None
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -338,8 +644,9 @@ class Context:
 
         for game_package in self.gamespackage.values():
             # remove groups from data sent to clients
-            del game_package["item_name_groups"]
-            del game_package["location_name_groups"]
+            # the data package is shared, so another Context may have removed them already
+            game_package.pop("item_name_groups", None)
+            game_package.pop("location_name_groups", None)
 
     def _init_game_data(self):
         for game_name, game_package in self.gamespackage.items():
@@ -368,24 +675,18 @@ class Context:
         return self.gamespackage[game]["location_name_to_id"] if game in self.gamespackage else None
 
     # General networking
-    async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
-        if not endpoint.socket or not endpoint.socket.open:
-            return False
+    async def send_msgs(self, endpoint: Client, msgs: typing.Iterable[dict]) -> bool:
+        msgs = list(msgs)
         msg = self.dumper(msgs)
-        try:
-            await endpoint.socket.send(msg)
-        except websockets.ConnectionClosed:
-            self.logger.exception(f"Exception during send_msgs, could not send {msg}")
-            await self.disconnect(endpoint)
-            return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing message: {msg}")
-            return True
+        if self.all_queued(msgs) and endpoint.socket and self.is_behind(endpoint):
+            return self.queue_msg(endpoint, msg, all(msg["cmd"] == "PrintJSON" for msg in msgs))
+        return await self.send_encoded_msgs(endpoint, msg)
 
-    async def send_encoded_msgs(self, endpoint: Endpoint, msg: str) -> bool:
+    async def send_encoded_msgs(self, endpoint: Client, msg: str) -> bool:
         if not endpoint.socket or not endpoint.socket.open:
             return False
+        if endpoint.send_queue.writing:
+            return self.queue_msg(endpoint, msg, False)
         try:
             await endpoint.socket.send(msg)
         except websockets.ConnectionClosed:
@@ -397,21 +698,87 @@ class Context:
                 self.logger.info(f"Outgoing message: {msg}")
             return True
 
-    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
+    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Client], msg: str, queued: bool = False,
+                                          msg_is_text: bool = False) -> bool:
+        """
+        Sends msg to all endpoints, queueing it for those that fell behind if it only contains queued_commands,
+        and for those with messages queued already in any case.
+        """
         sockets = []
+        sent = False
         for endpoint in endpoints:
             if endpoint.socket and endpoint.socket.open:
-                sockets.append(endpoint.socket)
+                if endpoint.send_queue.writing or queued and self.is_behind(endpoint):
+                    sent |= self.queue_msg(endpoint, msg, msg_is_text)
+                else:
+                    sockets.append(endpoint.socket)
         try:
             websockets.broadcast(sockets, msg)
         except RuntimeError:
             self.logger.exception("Exception during broadcast_send_encoded_msgs")
-            return False
+            return sent
         else:
             if self.log_network:
                 self.logger.info(f"Outgoing broadcast: {msg}")
             return True
 
+    @staticmethod
+    def is_behind(endpoint: Client) -> bool:
+        """Whether messages to endpoint pile up, unsent, in its send queue or the write buffer of its socket."""
+        queue = endpoint.send_queue
+        return queue.writing or endpoint.socket.transport.get_write_buffer_size() > queue.max_frame_size
+
+    def queue_msg(self, endpoint: Client, msg: str, msg_is_text: bool) -> bool:
+        """Queues an encoded message to be sent to endpoint, returns False if it will not be sent."""
+        if not endpoint.socket or not endpoint.socket.open:
+            return False
+        queue = endpoint.send_queue
+        if msg_is_text and endpoint.no_text:
+            queue.dropped += 1
+            queue.dropped_size += len(msg)
+            return False
+        if not queue.put(msg, msg_is_text):
+            self.logger.warning(f"Disconnecting a client that did not keep up with {queue.size} queued characters")
+            self.send_queue_overflows += 1
+            queue.clear()
+            async_start(endpoint.socket.close(1013, "Send queue overflow"))
+            return False
+        if not queue.writing:
+            queue.writing = True
+            async_start(self._write_send_queue(endpoint))
+        return True
+
+    async def _write_send_queue(self, endpoint: Client) -> None:
+        queue = endpoint.send_queue
+        try:
+            while queue.messages:
+                msg = queue.pop()
+                try:
+                    await endpoint.socket.send(msg)
+                except websockets.ConnectionClosed:
+                    self.logger.exception(f"Exception during send, could not send {msg}")
+                    queue.clear()
+                    await self.disconnect(endpoint)
+                    return
+                if self.log_network:
+                    self.logger.info(f"Outgoing message: {msg}")
+        finally:
+            queue.writing = False
+
+    def get_send_queue_stats(self) -> typing.Dict[str, int]:
+        """Sums up the send queues of the connected clients."""
+        queues = [endpoint.send_queue for endpoint in self.endpoints]
+        return {
+            "queued": sum(len(queue.messages) for queue in queues),
+            "queued_size": sum(queue.size for queue in queues),
+            "max_queued_size": max((queue.size for queue in queues), default=0),
+            "sent": sum(queue.sent for queue in queues),
+            "coalesced": sum(queue.coalesced for queue in queues),
+            "dropped": sum(queue.dropped for queue in queues),
+            "dropped_size": sum(queue.dropped_size for queue in queues),
+            "overflows": self.send_queue_overflows,
+        }
+
     def broadcast_all(self, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
         data = self.dumper(msgs)
@@ -420,7 +787,7 @@ class Context:
             for endpoint in self.endpoints
             if endpoint.auth and not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        async_start(self.broadcast_send_encoded_msgs(endpoints, data, self.all_queued(msgs), msg_is_text))
 
     def broadcast_text_all(self, text: str, additional_arguments: dict = {}):
         self.logger.info("Notice (all): %s" % text)
@@ -434,19 +801,54 @@ class Context:
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        async_start(self.broadcast_send_encoded_msgs(endpoints, data, self.all_queued(msgs), msg_is_text))
 
     def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
-        msgs = self.dumper(msgs)
-        async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
+        msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
+        async_start(self.broadcast_send_encoded_msgs(endpoints, self.dumper(msgs), self.all_queued(msgs),
+                                                     msg_is_text))
+
+    def all_queued(self, msgs: typing.List[dict]) -> bool:
+        return bool(msgs) and all(msg["cmd"] in self.queued_commands for msg in msgs)
 
     async def disconnect(self, endpoint: Client):
         if endpoint in self.endpoints:
             self.endpoints.remove(endpoint)
         if endpoint.slot and endpoint in self.clients[endpoint.team][endpoint.slot]:
             self.clients[endpoint.team][endpoint.slot].remove(endpoint)
+        if endpoint.slot:
+            self.remove_bounce_receiver(endpoint)
         await on_client_disconnected(self, endpoint)
 
+    def add_bounce_receiver(self, client: Client) -> None:
+        """Indexes an authenticated client by its game and tags, call again after its tags change."""
+        self.bounce_games[client.team, self.games[client.slot]].add(client)
+        for tag in client.tags:
+            self.bounce_tags[client.team, tag].add(client)
+
+    def remove_bounce_receiver(self, client: Client) -> None:
+        """Removes a client from the indexes of add_bounce_receiver, call before its team, slot or tags change."""
+        keys = [(self.bounce_games, (client.team, self.games.get(client.slot)))]
+        keys += [(self.bounce_tags, (client.team, tag)) for tag in client.tags]
+        for index, key in keys:
+            receivers = index.get(key)
+            if receivers is not None:
+                receivers.discard(client)
+                if not receivers:
+                    del index[key]
+
+    def get_bounce_receivers(self, team: int, games: typing.AbstractSet[str], tags: typing.AbstractSet[str],
+                             slots: typing.AbstractSet[int]) -> typing.Set[Client]:
+        receivers: typing.Set[Client] = set()
+        for game in games:
+            receivers.update(self.bounce_games.get((team, game), ()))
+        for tag in tags:
+            receivers.update(self.bounce_tags.get((team, tag), ()))
+        team_clients = self.clients.get(team, {})
+        for slot in slots:
+            receivers.update(team_clients.get(slot, ()))
+        return receivers
+
     def notify_client(self, client: Client, text: str, additional_arguments: dict = {}):
         if not client.auth or client.no_text:
             return
@@ -473,17 +875,20 @@ class Context:
                     raise Exception("No .archipelago found in archive.")
         else:
             with open(multidatapath, 'rb') as f:
-                data = f.read()
+                format_version = f.read(1)
+                if format_version and format_version[0] >= 4:
+                    # sections get loaded as needed, so let the system page them in and out as well
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    f.seek(0)
+                    data = f.read()
 
         self._load(self.decompress(data), {}, use_embedded_server_options)
         self.data_filename = multidatapath
 
     @staticmethod
-    def decompress(data: bytes) -> dict:
-        format_version = data[0]
-        if format_version > 3:
-            raise Utils.VersionException("Incompatible multidata.")
-        return restricted_loads(zlib.decompress(data[1:]))
+    def decompress(data: bytes | memoryview | mmap.mmap) -> MultiData:
+        return decompress_multidata(data)
 
     def _load(self, decoded_obj: MultiData, game_data_packages: typing.Dict[str, typing.Any],
               use_embedded_server_options: bool):
@@ -529,8 +934,8 @@ class Context:
         self.connect_names = decoded_obj['connect_names']
         self.locations = LocationStore(decoded_obj.pop("locations"))  # pre-emptively free memory
         self.slot_data = decoded_obj['slot_data']
-        for slot, data in self.slot_data.items():
-            self.read_data[f"slot_data_{slot}"] = lambda data=data: data
+        for slot in self.slot_data:
+            self.read_data[f"slot_data_{slot}"] = lambda slot=slot: self.slot_data[slot]
         self.er_hint_data = {int(player): {int(address): name for address, name in loc_data.items()}
                              for player, loc_data in decoded_obj["er_hint_data"].items()}
 
@@ -540,6 +945,8 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+            for hint in hints:
+                self.index_hint(0, hint)
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -570,6 +977,7 @@ class Context:
 
         # sorted access spheres
         self.spheres = decoded_obj.get("spheres", [])
+        self.locations.set_spheres(self.spheres)
 
     # saving
 
@@ -586,32 +994,69 @@ class Context:
 
     def _save(self, exit_save: bool = False) -> bool:
         try:
-            # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            journal = self.save_journal
+            if journal:
+                with journal.lock:
+                    if exit_save or journal.needs_compaction:
+                        self._write_save_file(journal)
+                    else:
+                        journal.flush(self)
+            else:
+                self._write_save_file(None)
         except Exception as e:
             self.logger.exception(e)
             return False
         else:
             return True
 
-    def init_save(self, enabled: bool = True):
+    def _write_save_file(self, journal: typing.Optional[SaveJournal]) -> None:
+        if journal:
+            # the new save file contains everything noted so far, so the journal can start over after it
+            generation = journal.begin_compaction(self)
+            save_data = self.get_save()
+            save_data["journal_generation"] = generation
+        else:
+            save_data = self.get_save()
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        encoded_save = zlib.compress(pickle.dumps(save_data))
+        if journal:
+            # the journal only applies to the save file of its generation, so replace that one atomically
+            temp_filename = self.save_filename + ".tmp"
+            with open(temp_filename, "wb") as f:
+                f.write(encoded_save)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_filename, self.save_filename)
+            journal.end_compaction(len(encoded_save))
+        else:
+            with open(self.save_filename, "wb") as f:
+                f.write(encoded_save)
+
+    def init_save(self, enabled: bool = True, journal: bool = True):
         self.saving = enabled
         if self.saving:
             if not self.save_filename:
-                import os
                 name, ext = os.path.splitext(self.data_filename)
                 self.save_filename = name + '.apsave' if ext.lower() in ('.archipelago', '.zip') \
                     else self.data_filename + '_' + 'apsave'
+            generation: typing.Optional[int] = None
             try:
                 with open(self.save_filename, 'rb') as f:
                     save_data = restricted_loads(zlib.decompress(f.read()))
                     self.set_save(save_data)
+                    generation = save_data.get("journal_generation", None)
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
                 self.logger.exception(e)
+            if journal:
+                self.save_journal = SaveJournal(self.save_filename)
+                try:
+                    self.save_journal.load(self, generation)
+                except Exception as e:
+                    self.logger.exception(e)
+                    self.logger.error("Could not use the save journal, falling back to rewriting the save file.")
+                    self.save_journal = None
             self._start_async_saving()
 
     def _start_async_saving(self, atexit_save: bool = True):
@@ -647,13 +1092,25 @@ class Context:
 
     def get_save(self) -> dict:
         self.recheck_hints()
-        d = {
-            "version": self.save_version,
-            "connect_names": self.connect_names,
+        d = self.get_save_meta()
+        d.update({
             "received_items": self.received_items,
-            "hints_used": dict(self.hints_used),
             "hints": dict(self.hints),
             "location_checks": dict(self.location_checks),
+            "stored_data": self.stored_data,
+        })
+
+        return d
+
+    def get_save_meta(self) -> dict:
+        """
+        The parts of the save that are small enough to be journaled as a whole whenever any of them changes.
+        Anything changing them has to call note_save_meta.
+        """
+        return {
+            "version": self.save_version,
+            "connect_names": self.connect_names,
+            "hints_used": dict(self.hints_used),
             "name_aliases": self.name_aliases,
             "client_game_state": dict(self.client_game_state),
             "client_activity_timers": tuple(
@@ -662,27 +1119,38 @@ class Context:
                 (key, value.timestamp()) for key, value in self.client_connection_timers.items()),
             "random_state": self.random.getstate(),
             "group_collected": dict(self.group_collected),
-            "stored_data": self.stored_data,
             "game_options": {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
                              "server_password": self.server_password, "password": self.password,
                              "release_mode": self.release_mode,
                              "remaining_mode": self.remaining_mode, "collect_mode": self.collect_mode,
                              "countdown_mode": self.countdown_mode,
                              "item_cheat": self.item_cheat, "compatibility": self.compatibility}
-
         }
 
-        return d
-
     def set_save(self, savedata: dict):
         if self.connect_names != savedata["connect_names"]:
             raise Exception("This savegame does not appear to match the loaded multiworld.")
         if savedata["version"] > self.save_version:
             raise Exception("This savegame is newer than the server.")
         self.received_items = savedata["received_items"]
-        self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        for (team, _), hints in savedata["hints"].items():
+            for hint in hints:
+                self.index_hint(team, hint)
+        self.location_checks.update(savedata["location_checks"])
+        self.set_save_meta(savedata)
 
+        if "stored_data" in savedata:
+            self.stored_data = savedata["stored_data"]
+        # count items and slots from lists for items_handling = remote
+        self.logger.info(
+            f'Loaded save file with {sum([len(v) for k, v in self.received_items.items() if k[2]])} received items '
+            f'for {sum(k[2] for k in self.received_items)} players')
+
+    def set_save_meta(self, savedata: dict):
+        self.hints_used.update(savedata["hints_used"])
+        # aliases can be removed, so this has to replace them when replaying the save journal
+        self.name_aliases.clear()
         self.name_aliases.update(savedata["name_aliases"])
         self.client_game_state.update(savedata["client_game_state"])
         self.client_connection_timers.update(
@@ -691,7 +1159,6 @@ class Context:
         self.client_activity_timers.update(
             {tuple(key): datetime.datetime.fromtimestamp(value, datetime.timezone.utc) for key, value
              in savedata["client_activity_timers"]})
-        self.location_checks.update(savedata["location_checks"])
         self.random.setstate(savedata["random_state"])
 
         if "game_options" in savedata:
@@ -709,13 +1176,6 @@ class Context:
         if "group_collected" in savedata:
             self.group_collected = savedata["group_collected"]
 
-        if "stored_data" in savedata:
-            self.stored_data = savedata["stored_data"]
-        # count items and slots from lists for items_handling = remote
-        self.logger.info(
-            f'Loaded save file with {sum([len(v) for k, v in self.received_items.items() if k[2]])} received items '
-            f'for {sum(k[2] for k in self.received_items)} players')
-
     # rest
 
     def get_hint_cost(self, slot):
@@ -740,13 +1200,53 @@ class Context:
                 new_hints.add(new_hint)
                 if hint == new_hint:
                     continue
+                self.unindex_hint(hint_team, hint)
+                self.index_hint(hint_team, new_hint)
                 for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
                     if changed is not None:
                         changed.add((hint_team,player))
                     if slot is not None and slot != player:
                         self.replace_hint(hint_team, player, hint, new_hint)
+            if self.save_journal and new_hints != self.hints[hint_team, hint_slot]:
+                self.save_journal.note_hints(hint_team, hint_slot)
             self.hints[hint_team, hint_slot] = new_hints
 
+    def recheck_location_hints(self, team: int, slot: int, locations: typing.Iterable[int],
+                               changed: typing.Optional[typing.Set[team_slot]] = None) -> None:
+        """Refreshes the hints for the given locations of team/slot, like recheck_hints.
+        If a set is passed for 'changed', each (team,slot) pair that has at least one hint modified will be added to it.
+        """
+        for location in locations:
+            hints = self.location_hints.get((team, slot, location))
+            if not hints:
+                continue
+            for hint in list(hints):
+                new_hint = hint.re_check(self, team)
+                if hint == new_hint:
+                    continue
+                hints.discard(hint)
+                hints.add(new_hint)
+                for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                    if self.replace_hint(team, player, hint, new_hint) and changed is not None:
+                        changed.add((team, player))
+
+    def index_hint(self, team: int, hint: Hint) -> None:
+        """Adds hint to location_hints, so it gets rechecked when its location is checked."""
+        self.location_hints.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
+
+    def reindex_hints(self) -> None:
+        """Rebuilds location_hints from hints, for when hints got replaced without unindexing them."""
+        self.location_hints.clear()
+        for (team, _), hints in self.hints.items():
+            for hint in hints:
+                self.index_hint(team, hint)
+
+    def unindex_hint(self, team: int, hint: Hint) -> None:
+        """Removes hint from location_hints, for when it was replaced."""
+        hints = self.location_hints.get((team, hint.finding_player, hint.location))
+        if hints:
+            hints.discard(hint)
+
     def get_rechecked_hints(self, team: int, slot: int):
         self.recheck_hints(team, slot)
         return self.hints[team, slot]
@@ -754,11 +1254,11 @@ class Context:
     def get_sphere(self, player: int, location_id: int) -> int:
         """Get sphere of a location, -1 if spheres are not available."""
         if self.spheres:
-            for i, sphere in enumerate(self.spheres):
-                if location_id in sphere.get(player, set()):
-                    return i
-            raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
-                           f"Location or player may not exist.")
+            sphere = self.locations.get_sphere(player, location_id)
+            if sphere < 0:
+                raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
+                               f"Location or player may not exist.")
+            return sphere
         return -1
 
     def get_players_package(self):
@@ -817,10 +1317,14 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.index_hint(team, hint)
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
                         new_hint_events.add(player)
+                    if self.save_journal:
+                        for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                            self.save_journal.note_hints(team, player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
         for slot in new_hint_events:
@@ -840,10 +1344,16 @@ class Context:
                 return hint
         return None
     
-    def replace_hint(self, team: int, slot: int, old_hint: Hint, new_hint: Hint) -> None:
+    def replace_hint(self, team: int, slot: int, old_hint: Hint, new_hint: Hint) -> bool:
         if old_hint in self.hints[team, slot]:
             self.hints[team, slot].remove(old_hint)
             self.hints[team, slot].add(new_hint)
+            self.unindex_hint(team, old_hint)
+            self.index_hint(team, new_hint)
+            if self.save_journal:
+                self.save_journal.note_hints(team, slot)
+            return True
+        return False
     
     # "events"
 
@@ -870,6 +1380,10 @@ class Context:
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
 
+    def note_save_meta(self) -> None:
+        if self.save_journal:
+            self.save_journal.note_meta()
+
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
         targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
@@ -982,12 +1496,14 @@ async def on_client_joined(ctx: Context, client: Client):
                                   "It may stop working in the future. If you are a player, please report this to the "
                                   "client's developer.")
     ctx.client_connection_timers[client.team, client.slot] = datetime.datetime.now(datetime.timezone.utc)
+    ctx.note_save_meta()
 
 
 async def on_client_left(ctx: Context, client: Client):
     if len(ctx.clients[client.team][client.slot]) < 1:
         update_client_status(ctx, client, ClientStatus.CLIENT_UNKNOWN)
         ctx.client_connection_timers[client.team, client.slot] = datetime.datetime.now(datetime.timezone.utc)
+        ctx.note_save_meta()
 
     version_str = '.'.join(str(x) for x in client.version)
 
@@ -1066,20 +1582,36 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
 
 
 def send_new_items(ctx: Context):
-    for team, clients in ctx.clients.items():
-        for slot, clients in clients.items():
-            for client in clients:
-                if client.no_items:
-                    continue
-                start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-                items = get_received_items(ctx, team, slot, client.remote_items)
-                if len(start_inventory) + len(items) > client.send_index:
-                    first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
-                        "cmd": "ReceivedItems",
-                        "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
-                    client.send_index = len(start_inventory) + len(items)
+    """
+    Sends the items received since the last call to their receivers' clients.
+    Sending is deferred to the next event loop iteration, so a burst of checks results in one packet per client.
+    """
+    if ctx.new_items_handle or not ctx.new_items_receivers:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _send_new_items(ctx)
+    else:
+        ctx.new_items_handle = loop.call_soon(_send_new_items, ctx)
+
+
+def _send_new_items(ctx: Context):
+    ctx.new_items_handle = None
+    receivers, ctx.new_items_receivers = ctx.new_items_receivers, set()
+    for team, slot, remote_items in receivers:
+        for client in ctx.clients.get(team, {}).get(slot, ()):
+            if client.no_items or client.remote_items != remote_items:
+                continue
+            start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
+            items = get_received_items(ctx, team, slot, client.remote_items)
+            if len(start_inventory) + len(items) > client.send_index:
+                first_new_item = max(0, client.send_index - len(start_inventory))
+                async_start(ctx.send_msgs(client, [{
+                    "cmd": "ReceivedItems",
+                    "index": client.send_index,
+                    "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
+                client.send_index = len(start_inventory) + len(items)
 
 
 def update_checked_locations(ctx: Context, team: int, slot: int):
@@ -1113,6 +1645,7 @@ def collect_player(ctx: Context, team: int, slot: int, is_group: bool = False):
             if slot in group_players:
                 group_collected_players = ctx.group_collected.setdefault(group, set())
                 group_collected_players.add(slot)
+                ctx.note_save_meta()
                 if set(group_players) == group_collected_players:
                     collect_player(ctx, team, group, True)
 
@@ -1126,7 +1659,9 @@ def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem
         for item in items:
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
+                ctx.new_items_receivers.add((team, target, False))
             get_received_items(ctx, team, target, True).append(item)
+            ctx.new_items_receivers.add((team, target, True))
 
 
 def register_location_checks(ctx: Context, team: int, slot: int, locations: typing.Iterable[int],
@@ -1137,6 +1672,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
     if new_locations:
         if count_activity:
             ctx.client_activity_timers[team, slot] = datetime.datetime.now(datetime.timezone.utc)
+            ctx.note_save_meta()
 
         sortable: list[tuple[int, int, int, int]] = []
         for location in new_locations:
@@ -1164,6 +1700,8 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
         del sortable
 
         ctx.location_checks[team, slot] |= new_locations
+        if ctx.save_journal:
+            ctx.save_journal.note_location_checks(team, slot, new_locations)
         send_new_items(ctx)
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
@@ -1171,7 +1709,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             "checked_locations": new_locations,  # send back new checks only
         }])
         updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
+        ctx.recheck_location_hints(team, slot, new_locations, updated_slots)
         for hint_team, hint_slot in updated_slots:
             ctx.on_changed_hints(hint_team, hint_slot)
         ctx.save()
@@ -1638,12 +2176,14 @@ class ClientMessageProcessor(CommonCommandProcessor):
         if alias_name:
             alias_name = alias_name[:16].strip()
             self.ctx.name_aliases[self.client.team, self.client.slot] = alias_name
+            self.ctx.note_save_meta()
             self.output(f"Hello, {alias_name}")
             update_aliases(self.ctx, self.client.team)
             self.ctx.save()
             return True
         elif (self.client.team, self.client.slot) in self.ctx.name_aliases:
             del (self.ctx.name_aliases[self.client.team, self.client.slot])
+            self.ctx.note_save_meta()
             self.output("Removed Alias")
             update_aliases(self.ctx, self.client.team)
             self.ctx.save()
@@ -1663,6 +2203,8 @@ class ClientMessageProcessor(CommonCommandProcessor):
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                self.ctx.new_items_receivers.add((self.client.team, self.client.slot, False))
+                self.ctx.new_items_receivers.add((self.client.team, self.client.slot, True))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1682,6 +2224,8 @@ class ClientMessageProcessor(CommonCommandProcessor):
         if not input_text:
             hints = {hint.re_check(self.ctx, self.client.team) for hint in
                      self.ctx.hints[self.client.team, self.client.slot]}
+            if hints != self.ctx.hints[self.client.team, self.client.slot] and self.ctx.save_journal:
+                self.ctx.save_journal.note_hints(self.client.team, self.client.slot)
             self.ctx.hints[self.client.team, self.client.slot] = hints
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
@@ -1760,6 +2304,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                     can_pay = 1000
 
                 self.ctx.random.shuffle(not_found_hints)
+                self.ctx.note_save_meta()
                 # By popular vote, make hints prefer non-local placements
                 not_found_hints.sort(key=lambda hint: int(hint.receiving_player != hint.finding_player))
                 # By another popular vote, prefer early sphere
@@ -1774,6 +2319,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                     hints.append(hint)
                     can_pay -= 1
                     self.ctx.hints_used[self.client.team, self.client.slot] += 1
+                    self.ctx.note_save_meta()
 
                 self.ctx.notify_hints(self.client.team, hints)
                 if not_found_hints:
@@ -1891,6 +2437,8 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             await ctx.send_msgs(client, [{"cmd": "ConnectionRefused", "errors": list(errors)}])
         else:
             team, slot = ctx.connect_names[args['name']]
+            if client.slot:
+                ctx.remove_bounce_receiver(client)
             if client.auth and client.team is not None and client.slot in ctx.clients[client.team]:
                 ctx.clients[team][slot].remove(client)  # re-auth, remove old entry
                 if client.team != team or client.slot != slot:
@@ -1905,6 +2453,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             client.no_locations = bool(client.tags & _non_game_messages.keys())
             # set NoText for old PopTracker clients that predate the tag to save traffic
             client.no_text = "NoText" in client.tags or ("PopTracker" in client.tags and client.version < (0, 5, 1))
+            ctx.add_bounce_receiver(client)
             connected_packet = {
                 "cmd": "Connected",
                 "team": client.team, "slot": client.slot,
@@ -1974,7 +2523,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
 
             if "tags" in args:
                 old_tags = client.tags
+                ctx.remove_bounce_receiver(client)
                 client.tags = args["tags"]
+                ctx.add_bounce_receiver(client)
                 if set(old_tags) != set(client.tags):
                     client.no_locations = bool(client.tags & _non_game_messages.keys())
                     client.no_text = "NoText" in client.tags or (
@@ -2141,11 +2692,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             args["cmd"] = "Bounced"
             msg = ctx.dumper([args])
 
-            for bounceclient in ctx.endpoints:
-                if client.team == bounceclient.team and (ctx.games[bounceclient.slot] in games or
-                                                         set(bounceclient.tags) & tags or
-                                                         bounceclient.slot in slots):
-                    await ctx.send_encoded_msgs(bounceclient, msg)
+            await ctx.broadcast_send_encoded_msgs(ctx.get_bounce_receivers(client.team, games, tags, slots), msg)
 
         elif cmd == "Get":
             if "keys" not in args or type(args["keys"]) != list:
@@ -2175,6 +2722,8 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                 func = modify_functions[operation["operation"]]
                 value = func(value, operation["value"])
             ctx.stored_data[args["key"]] = args["value"] = value
+            if ctx.save_journal:
+                ctx.save_journal.note_stored_data(args["key"])
             targets = set(ctx.stored_data_notification_clients[args["key"]])
             if args.get("want_reply", False):
                 targets.add(client)
@@ -2203,6 +2752,7 @@ def update_client_status(ctx: Context, client: Client, new_status: ClientStatus)
                 ctx.broadcast_text_all(f"Team #{client.team + 1} has completed all of their games! Congratulations!")
 
         ctx.client_game_state[client.team, client.slot] = new_status
+        ctx.note_save_meta()
         ctx.on_client_status_change(client.team, client.slot)
         ctx.save()
 
@@ -2262,12 +2812,14 @@ class ServerCommandProcessor(CommonCommandProcessor):
                     if alias_name:
                         alias_name = alias_name.strip()[:15]
                         self.ctx.name_aliases[team, slot] = alias_name
+                        self.ctx.note_save_meta()
                         self.output(f"Named {player_name} as {alias_name}")
                         update_aliases(self.ctx, team)
                         self.ctx.save()
                         return True
                     else:
                         del (self.ctx.name_aliases[team, slot])
+                        self.ctx.note_save_meta()
                         self.output(f"Removed Alias for {player_name}")
                         update_aliases(self.ctx, team)
                         self.ctx.save()
@@ -2525,6 +3077,7 @@ class ServerCommandProcessor(CommonCommandProcessor):
                 return False
 
         setattr(self.ctx, option_name, value_type(option_value))
+        self.ctx.note_save_meta()
         self.output(f"Set option {option_name} to {getattr(self.ctx, option_name)}")
         if option_name in {"release_mode", "remaining_mode", "collect_mode"}:
             self.ctx.broadcast_all([{"cmd": "RoomUpdate", 'permissions': get_permissions(self.ctx)}])
@@ -2577,6 +3130,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--password', default=defaults["password"])
     parser.add_argument('--savefile', default=defaults["savefile"])
     parser.add_argument('--disable_save', default=defaults["disable_save"], action='store_true')
+    parser.add_argument('--disable_save_journal', default=defaults["disable_save_journal"], action='store_true',
+                        help="Rewrite the whole save file on every save, instead of appending changes to a journal.")
     parser.add_argument('--cert', help="Path to a SSL Certificate for encryption.")
     parser.add_argument('--cert_key', help="Path to SSL Certificate Key file")
     parser.add_argument('--loglevel', default=defaults["loglevel"],
@@ -2707,7 +3262,7 @@ async def main(args: argparse.Namespace):
         logging.exception(f"Failed to read multiworld data ({e})")
         raise
 
-    ctx.init_save(not args.disable_save)
+    ctx.init_save(not args.disable_save, not args.disable_save_journal)
 
     ssl_context = load_server_cert(args.cert, args.cert_key) if args.cert else None
 
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 from collections.abc import Mapping, Sequence
+import abc
 import typing
 import enum
+import itertools
+import re
+import struct
 import warnings
+import zlib
 from json import JSONEncoder, JSONDecoder
 
 if typing.TYPE_CHECKING:
+    import mmap
+
     from websockets import WebSocketServerProtocol as ServerConnection
 
-from Utils import ByValue, Version
+from Utils import ByValue, Version, VersionException, restricted_dumps, restricted_loads
 
 
 class HintStatus(ByValue, enum.IntEnum):
@@ -136,7 +143,7 @@ _encode = JSONEncoder(
 
 
 def encode(obj: typing.Any) -> str:
-    return _encode(_scan_for_TypedTuples(obj))
+    return json_codec.encode(obj)
 
 
 def get_any_version(data: dict) -> Version:
@@ -170,7 +177,159 @@ def _object_hook(o: typing.Any) -> typing.Any:
     return o
 
 
-decode = JSONDecoder(object_hook=_object_hook).decode
+_decode = JSONDecoder(object_hook=_object_hook).decode
+
+
+def decode(text: str) -> typing.Any:
+    return json_codec.decode(text)
+
+
+class JSONCodec(abc.ABC):
+    """Turns packets into json and back, see encode and decode."""
+    name: typing.ClassVar[str]
+
+    @abc.abstractmethod
+    def encode(self, obj: typing.Any) -> str:
+        ...
+
+    @abc.abstractmethod
+    def decode(self, text: str) -> typing.Any:
+        ...
+
+
+class StdlibJSONCodec(JSONCodec):
+    name = "json"
+
+    def encode(self, obj: typing.Any) -> str:
+        return _encode(_scan_for_TypedTuples(obj))
+
+    def decode(self, text: str) -> typing.Any:
+        return _decode(text)
+
+
+_float_free_types = frozenset((str, int, bool, type(None), NetworkItem, NetworkPlayer))
+
+
+def _has_inexact_float(obj: typing.Any) -> bool:
+    """
+    Whether obj contains a float that orjson writes differently than the standard library,
+    which is any below 1e-4 or from 1e16, NaN and Infinity.
+    """
+    containers = [[obj]]
+    while containers:
+        container = containers.pop()
+        for value in (itertools.chain(container, container.values()) if isinstance(container, dict) else container):
+            value_type = type(value)
+            if value_type in _float_free_types:
+                continue
+            if value_type is float:
+                if not (value == 0 or 1e-4 <= abs(value) < 1e16):  # NaN fails every comparison
+                    return True
+            elif isinstance(value, (dict, list, tuple, set, frozenset)):
+                containers.append(value)
+    return False
+
+
+# How orjson writes the floats _has_inexact_float looks for: with an exponent, with more leading zeros than 0.0001 has,
+# or as null. Strings and None can match as well, which only costs walking through the packet to rule out floats.
+_inexact_float_text = re.compile(rb"\de|0\.0000|null")
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Uses orjson, falling back to the standard library for packets containing values it would write or read differently,
+    so the output is the same either way.
+    """
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    @staticmethod
+    def _default(obj: typing.Any) -> typing.Any:
+        # orjson calls this for what it can't write itself, same conversion as _scan_for_TypedTuples
+        if isinstance(obj, tuple) and hasattr(obj, "_fields"):
+            data = obj._asdict()
+            data["class"] = obj.__class__.__name__
+            return data
+        if isinstance(obj, (tuple, set, frozenset)):
+            return tuple(obj)
+        raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+    def encode(self, obj: typing.Any) -> str:
+        try:
+            text = self._dumps(obj, default=self._default, option=self._options)
+        except TypeError:  # such as integers above 64 bit, let the standard library write or raise them
+            return _encode(_scan_for_TypedTuples(obj))
+        if _inexact_float_text.search(text) and _has_inexact_float(obj):
+            return _encode(_scan_for_TypedTuples(obj))
+        return text.decode("utf-8")
+
+    def decode(self, text: str) -> typing.Any:
+        try:
+            obj = self._loads(text)
+        except ValueError:  # such as NaN, let the standard library read or raise them
+            return _decode(text)
+        try:
+            if type(obj) is list:
+                return _apply_object_hook_list(obj)
+            if type(obj) is dict:
+                return _apply_object_hook_dict(obj)
+            if type(obj) is float and abs(obj) >= _min_inexact_decoded_float:
+                raise _InexactFloat
+        except _InexactFloat:  # integers beyond 64 bit, which orjson reads as float
+            return _decode(text)
+        return obj
+
+
+# apply _object_hook to every dict of what orjson read, innermost first like JSONDecoder does
+
+class _InexactFloat(Exception):
+    """Raised while applying object hooks to what orjson read, if it read a float the standard library wouldn't."""
+
+
+# orjson reads integers below -2 ** 63 or from 2 ** 64 as float, the standard library keeps them integers
+_min_inexact_decoded_float = float(2 ** 63)
+
+
+def _apply_object_hook_list(obj: typing.List[typing.Any]) -> typing.List[typing.Any]:
+    for index, value in enumerate(obj):
+        value_type = type(value)
+        if value_type is dict:
+            obj[index] = _apply_object_hook_dict(value)
+        elif value_type is list:
+            _apply_object_hook_list(value)
+        elif value_type is float and abs(value) >= _min_inexact_decoded_float:
+            raise _InexactFloat
+    return obj
+
+
+def _apply_object_hook_dict(obj: typing.Dict[str, typing.Any]) -> typing.Any:
+    for key, value in obj.items():
+        value_type = type(value)
+        if value_type is dict:
+            obj[key] = _apply_object_hook_dict(value)
+        elif value_type is list:
+            _apply_object_hook_list(value)
+        elif value_type is float and abs(value) >= _min_inexact_decoded_float:
+            raise _InexactFloat
+    if "class" in obj:
+        return _object_hook(obj)
+    return obj
+
+
+def get_json_codec() -> JSONCodec:
+    """Returns the fastest available codec."""
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return StdlibJSONCodec()
+
+
+json_codec: JSONCodec = get_json_codec()
 
 
 class Endpoint:
@@ -415,7 +574,14 @@ class Hint(typing.NamedTuple):
 
 
 class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
-    def __init__(self, values: typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
+    _received: typing.Optional[
+        typing.Dict[int, typing.Dict[int, typing.List[typing.Tuple[int, int, int, int, int, int]]]]]
+    """By receiver and item: position among all locations, then sender, location, item, receiver and flags.
+    None if not indexed."""
+    _spheres: typing.Dict[typing.Tuple[int, int], int]
+
+    def __init__(self, values: typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]],
+                 index_receivers: bool = True):
         super().__init__(values)
 
         if not self:
@@ -427,21 +593,58 @@ class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tu
         if len(self.get(0, {})):
             raise ValueError("Invalid player id 0 for location")
 
+        # index by receiver, so find_item and get_for_player don't have to go through all locations
+        self._received = None
+        if index_receivers:
+            self._received = {}
+            position = 0
+            for sender, check_data in self.items():
+                for location_id, (item_id, receiving_player, item_flags) in check_data.items():
+                    self._received.setdefault(receiving_player, {}).setdefault(item_id, []).append(
+                        (position, sender, location_id, item_id, receiving_player, item_flags))
+                    position += 1
+        self._spheres = {}
+
+    def set_spheres(self, spheres: typing.Sequence[typing.Dict[int, typing.Set[int]]]) -> None:
+        for sphere_number, sphere in enumerate(spheres):
+            for player, locations in sphere.items():
+                player_locations = self.get(player, {})
+                for location_id in locations:
+                    if location_id in player_locations:
+                        self._spheres.setdefault((player, location_id), sphere_number)
+
+    def get_sphere(self, player: int, location_id: int) -> int:
+        return self._spheres.get((player, location_id), -1)
+
     def find_item(self, slots: typing.Set[int], seeked_item_id: int
                   ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
-        for finding_player, check_data in self.items():
-            for location_id, (item_id, receiving_player, item_flags) in check_data.items():
-                if receiving_player in slots and item_id == seeked_item_id:
-                    yield finding_player, location_id, item_id, receiving_player, item_flags
+        if self._received is None:
+            for finding_player, check_data in self.items():
+                for location_id, (item_id, receiving_player, item_flags) in check_data.items():
+                    if receiving_player in slots and item_id == seeked_item_id:
+                        yield finding_player, location_id, item_id, receiving_player, item_flags
+            return
+        found = [entry for receiving_player in slots
+                 for entry in self._received.get(receiving_player, {}).get(seeked_item_id, ())]
+        if len(slots) > 1:
+            found.sort()  # restore the order of locations
+        for _, finding_player, location_id, item_id, receiving_player, item_flags in found:
+            yield finding_player, location_id, item_id, receiving_player, item_flags
 
     def get_for_player(self, slot: int) -> typing.Dict[int, typing.Set[int]]:
         import collections
         all_locations: typing.Dict[int, typing.Set[int]] = collections.defaultdict(set)
-        for source_slot, location_data in self.items():
-            for location_id, values in location_data.items():
-                if values[1] == slot:
+        if self._received is None:
+            for source_slot, location_data in self.items():
+                for location_id, values in location_data.items():
+                    if values[1] == slot:
+                        all_locations[source_slot].add(location_id)
+        else:
+            for entries in self._received.get(slot, {}).values():
+                for _, source_slot, location_id, *_ in entries:
                     all_locations[source_slot].add(location_id)
-        return all_locations
+        # senders in order, like the entries of the _speedups LocationStore
+        return {source_slot: all_locations[source_slot] for source_slot in sorted(all_locations)}
 
     def get_checked(self, state: typing.Dict[typing.Tuple[int, int], typing.Set[int]], team: int, slot: int
                     ) -> typing.List[int]:
@@ -510,6 +713,157 @@ class MultiData(typing.TypedDict):
     race_mode: int
 
 
+multidata_format = 4
+""" newest format of multidata, stored in its first byte """
+multidata_sections = ("locations", "spheres", "er_hint_data")
+""" keys of multidata with their own section since format 4, besides the slot_data of each slot """
+_multidata_header = struct.Struct(">I")
+
+
+def compress_multidata(multidata: typing.Mapping[str, typing.Any], format_version: int = multidata_format) -> bytes:
+    """
+    Serializes multidata to be read by decompress_multidata.
+    Up to format 3 that is a compressed pickle of all of it. Format 4 has a table of contents followed by separately
+    compressed sections for multidata_sections and the slot_data of each slot, so those can be loaded when needed.
+    Sections of a MultiDataContainer that were not loaded get copied as they are.
+    """
+    if format_version <= 3:
+        return bytes([format_version]) + zlib.compress(restricted_dumps(dict(multidata)), 9)
+    if format_version != 4:
+        raise ValueError(f"Unknown multidata format {format_version}")
+
+    raw = multidata if isinstance(multidata, MultiDataContainer) else None
+    sections: dict[typing.Hashable, bytes | memoryview] = {}
+    base: dict[str, typing.Any] = {}
+    for key in multidata:
+        if key in multidata_sections:
+            section = raw.raw_section(key) if raw else None
+            sections[key] = section if section is not None else zlib.compress(restricted_dumps(multidata[key]), 9)
+        elif key == "slot_data":
+            slot_data = multidata[key]
+            for slot in slot_data:
+                section = slot_data.raw_section(slot) \
+                    if raw and isinstance(slot_data, SlotDataSections) and slot_data.container is raw else None
+                sections["slot_data", slot] = section if section is not None \
+                    else zlib.compress(restricted_dumps(slot_data[slot]), 9)
+        else:
+            base[key] = multidata[key]
+    sections["base"] = zlib.compress(restricted_dumps(base), 9)
+
+    # offsets are relative to the end of the table of contents
+    contents: dict[typing.Hashable, tuple[int, int]] = {}
+    offset = 0
+    for name, section in sections.items():
+        contents[name] = offset, len(section)
+        offset += len(section)
+    table = restricted_dumps(contents)
+    return b"".join((bytes([4]), _multidata_header.pack(len(table)), table, *sections.values()))
+
+
+def decompress_multidata(data: bytes | memoryview | mmap.mmap) -> MultiData:
+    """Reads multidata written by compress_multidata, from format 4 on only the parts needed to find its sections."""
+    if not len(data):
+        raise ValueError("Multidata is empty.")
+    format_version = data[0]
+    if format_version > multidata_format:
+        raise VersionException("Incompatible multidata.")
+    if format_version == 4:
+        return typing.cast(MultiData, MultiDataContainer(data))
+    return restricted_loads(zlib.decompress(data[1:]))
+
+
+class MultiDataContainer(typing.MutableMapping[str, typing.Any]):
+    """
+    Multidata of format 4, loading each of its sections when first accessed, from a buffer such as a memory mapped file.
+    slot_data is a SlotDataSections, loading the data of a slot when it is first accessed.
+    """
+    _data: memoryview
+    _contents: dict[typing.Hashable, tuple[int, int]]
+    _values: dict[str, typing.Any]
+    _unloaded: set[str]
+
+    def __init__(self, data: bytes | memoryview | mmap.mmap) -> None:
+        self._data = memoryview(data)
+        table_size, = _multidata_header.unpack_from(self._data, 1)
+        start = 1 + _multidata_header.size + table_size
+        self._contents = {name: (start + offset, size) for name, (offset, size)
+                          in restricted_loads(self._data[1 + _multidata_header.size:start]).items()}
+        self._values = self.load_section("base")
+        self._unloaded = {key for key in multidata_sections if key in self._contents}
+        slots = [name[1] for name in self._contents if isinstance(name, tuple) and name[0] == "slot_data"]
+        self._values["slot_data"] = SlotDataSections(self, slots)
+
+    def raw_section(self, name: typing.Hashable) -> memoryview | None:
+        """Returns the compressed section, None if it is missing or was already loaded and may have been changed."""
+        if (name in multidata_sections and name not in self._unloaded) or name not in self._contents:
+            return None
+        offset, size = self._contents[name]
+        return self._data[offset:offset + size]
+
+    def load_section(self, name: typing.Hashable) -> typing.Any:
+        offset, size = self._contents[name]
+        return restricted_loads(zlib.decompress(self._data[offset:offset + size]))
+
+    def __getitem__(self, key: str) -> typing.Any:
+        if key in self._unloaded:
+            self._values[key] = self.load_section(key)
+            self._unloaded.discard(key)  # may have been loaded by another thread meanwhile
+        return self._values[key]
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self._unloaded.discard(key)
+        self._values[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._unloaded:
+            self._unloaded.remove(key)
+        else:
+            del self._values[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values or key in self._unloaded
+
+    def __iter__(self) -> typing.Iterator[str]:
+        yield from list(self._values)
+        yield from sorted(self._unloaded)
+
+    def __len__(self) -> int:
+        return len(self._values) + len(self._unloaded)
+
+
+class SlotDataSections(Mapping[int, typing.Any]):
+    """slot_data of a MultiDataContainer, loading the data of each slot when it is first accessed."""
+    container: MultiDataContainer
+    slots: list[int]
+    _loaded: dict[int, typing.Any]
+
+    def __init__(self, container: MultiDataContainer, slots: list[int]) -> None:
+        self.container = container
+        self.slots = slots
+        self._loaded = {}
+
+    def __getitem__(self, slot: int) -> typing.Any:
+        if slot in self._loaded:
+            return self._loaded[slot]
+        try:
+            data = self.container.load_section(("slot_data", slot))
+        except KeyError:
+            raise KeyError(slot) from None
+        return self._loaded.setdefault(slot, data)  # may have been loaded by another thread meanwhile
+
+    def raw_section(self, slot: int) -> memoryview | None:
+        """Returns the compressed data of slot, None if it is missing or was loaded and may have been changed since."""
+        if slot in self._loaded:
+            return None
+        return self.container.raw_section(("slot_data", slot))
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return iter(self.slots)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
 if typing.TYPE_CHECKING:  # type-check with pure python implementation until we have a typing stub
     LocationStore = _LocationStore
 else:
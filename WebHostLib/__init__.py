@@ -55,6 +55,8 @@ app.config["PONY"] = {
 }
 app.config["MAX_ROLL"] = 20
 app.config["CACHE_TYPE"] = "SimpleCache"
+# number of multidata, multisave and data packages to keep decoded for trackers, per process
+app.config["TRACKER_CACHE_ENTRIES"] = 64
 app.config["HOST_ADDRESS"] = ""
 app.config["ASSET_RIGHTS"] = False
 
@@ -9,7 +9,7 @@ from threading import Event, Thread
 from typing import Any
 from uuid import UUID
 
-from pony.orm import db_session, select, commit, PrimaryKey
+from pony.orm import db_session, exists, select, commit, PrimaryKey
 
 from Utils import restricted_loads
 from .locker import Locker, AlreadyRunningException
@@ -108,11 +108,29 @@ def cleanup():
         rooms = Room.select(lambda room: room.owner == UUID(int=0)).delete(bulk=True)
         seeds = Seed.select(lambda seed: seed.owner == UUID(int=0) and not seed.rooms).delete(bulk=True)
         slots = Slot.select(lambda slot: not slot.seed).delete(bulk=True)
+        SlotDataChunk.select(lambda chunk: not exists(slot for slot in Slot if slot.id == chunk.slot_id)
+                             ).delete(bulk=True)
         # Command gets deleted by ponyorm Cascade Delete, as Room is Required
     if rooms or seeds or slots:
         logging.info(f"{rooms} Rooms, {seeds} Seeds and {slots} Slots have been deleted.")
 
 
+def _should_host(room: Room) -> bool:
+    # the per-room timeout can't currently be PonyORM transpiled, so this is checked after selecting.
+    return room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5)
+
+
+def place_room(hosters: typing.List[MultiworldInstance], room_id: UUID) -> typing.Set[UUID]:
+    """
+    Starts the room on the least loaded hoster, unless one is already hosting it.
+    Returns the IDs of rooms found to have shut down in the meantime, which may need to be placed again.
+    Rooms are only placed when they start, running rooms are never moved to another hoster.
+    """
+    if any(room_id in hoster.room_ids for hoster in hosters):
+        return set()  # should already be hosted currently.
+    return min(hosters, key=MultiworldInstance.get_load).start_room(room_id)
+
+
 def autohost(config: dict):
     def keep_running():
         stop_event = _stop_event
@@ -125,15 +143,26 @@ def autohost(config: dict):
                     hosters.append(hoster)
                     hoster.start()
 
+                # Only rooms whose last_activity changed since the previous poll can need starting,
+                # the overlap covers activity committed by transactions that began before that poll.
+                since = datetime.utcnow() - timedelta(days=3)
                 while not stop_event.wait(0.1):
+                    poll_time = datetime.utcnow()
+                    stopped_rooms = set()
+                    for hoster in hosters:
+                        stopped_rooms |= hoster.update()
                     with db_session:
-                        rooms = select(
-                            room for room in Room if
-                            room.last_activity >= datetime.utcnow() - timedelta(days=3))
-                        for room in rooms:
-                            # we have to filter twice, as the per-room timeout can't currently be PonyORM transpiled.
-                            if room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5):
-                                hosters[room.id.int % len(hosters)].start_room(room.id)
+                        for room in select(room for room in Room if room.last_activity >= since):
+                            stopped_rooms.discard(room.id)
+                            if _should_host(room):
+                                stopped_rooms |= place_room(hosters, room.id)
+                        # activity during shutdown was skipped while the room was still hosted
+                        while stopped_rooms:
+                            room_id = stopped_rooms.pop()
+                            room = Room.get(id=room_id)
+                            if room and _should_host(room):
+                                stopped_rooms |= place_room(hosters, room_id)
+                    since = poll_time - room_poll_overlap
 
         except AlreadyRunningException:
             logging.info("Autohost reports as already running, not starting another.")
@@ -141,6 +170,9 @@ def autohost(config: dict):
     Thread(target=keep_running, name="AP_Autohost").start()
 
 
+room_poll_overlap = timedelta(seconds=10)
+
+
 def autogen(config: dict):
     def keep_running():
         stop_event = _stop_event
@@ -180,8 +212,15 @@ def autogen(config: dict):
 
 
 class MultiworldInstance():
+    # a hosted room weighs as much as this many connected clients or bytes of memory, see get_load
+    room_clients = 20
+    room_memory = 512 * 1024 * 1024
+
     def __init__(self, config: dict, id: int):
         self.room_ids = set()
+        self.room_count = 0
+        self.client_count = 0
+        self.rss = 0
         self.process: typing.Optional[multiprocessing.Process] = None
         self.ponyconfig = config["PONY"]
         self.cert = config["SELFLAUNCHCERT"]
@@ -189,6 +228,7 @@ class MultiworldInstance():
         self.host = config["HOST_ADDRESS"]
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
+        self.load_reports = multiprocessing.Queue()
         self.name = f"MultiHoster{id}"
 
     def start(self):
@@ -198,19 +238,38 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down,
+                                                self.load_reports),
                                           name=self.name)
         process.start()
         self.process = process
 
-    def start_room(self, room_id):
+    def update(self) -> typing.Set[UUID]:
+        """Collects rooms that shut down and the latest load report, returns the IDs of rooms that shut down."""
+        stopped = set()
         while not self.rooms_shutting_down.empty():
-            self.room_ids.remove(self.rooms_shutting_down.get(block=True, timeout=None))
+            room_id = self.rooms_shutting_down.get(block=True, timeout=None)
+            self.room_ids.remove(room_id)
+            stopped.add(room_id)
+        while not self.load_reports.empty():
+            self.room_count, self.client_count, self.rss = self.load_reports.get(block=True, timeout=None)
+        return stopped
+
+    def get_load(self) -> float:
+        """Estimated load of this hoster, in hosted rooms."""
+        # rooms placed since the last report are not in room_count yet
+        rooms = max(self.room_count, len(self.room_ids))
+        return rooms + self.client_count / self.room_clients + self.rss / self.room_memory
+
+    def start_room(self, room_id) -> typing.Set[UUID]:
+        """Starts the room unless already hosted, returns the IDs of rooms that shut down, see update."""
+        stopped = self.update()
         if room_id in self.room_ids:
             pass  # should already be hosted currently.
         else:
             self.room_ids.add(room_id)
             self.rooms_to_start.put(room_id)
+        return stopped
 
     def stop(self):
         if self.process:
@@ -225,6 +284,6 @@ class MultiworldInstance():
         self.process = None
 
 
-from .models import Room, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, db, Seed, Slot
+from .models import Room, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, db, Seed, Slot, SlotDataChunk
 from .customserver import run_server_process, get_static_server_data
 from .generate import gen_game
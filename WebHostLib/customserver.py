@@ -10,7 +10,6 @@ import pickle
 import random
 import socket
 import threading
-import time
 import typing
 import sys
 
@@ -25,7 +24,7 @@ from MultiServer import (
 )
 from Utils import restricted_loads, cache_argsless
 from .locker import Locker
-from .models import Command, GameDataPackage, Room, db
+from .models import Command, GameDataPackage, Room, TrackerAggregates, command_channel, db
 
 
 class CustomClientMessageProcessor(ClientMessageProcessor):
@@ -60,8 +59,83 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+class DBCommandDispatcher:
+    """
+    Delivers Commands from the database to the rooms hosted by this process, with one query for all of them.
+    Wakes up on notifications where the database sends them and polls every poll_interval seconds regardless.
+    """
+    poll_interval = 2
+
+    def __init__(self):
+        self.processors: typing.Dict[typing.Any, DBCommandProcessor] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: typing.Optional[threading.Thread] = None
+
+    def add_room(self, ctx: WebHostContext) -> None:
+        with self.lock:
+            self.processors[ctx.room_id] = DBCommandProcessor(ctx)
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, name="DBCommandDispatcher", daemon=True)
+                self.thread.start()
+                if db.provider_name == "postgres":
+                    threading.Thread(target=self.listen, name="DBCommandListener", daemon=True).start()
+
+    def dispatch(self) -> None:
+        with self.lock:
+            # rooms that are shutting down no longer take commands
+            for room_id, processor in list(self.processors.items()):
+                if processor.ctx.exit_event.is_set():
+                    del self.processors[room_id]
+            processors = dict(self.processors)
+        if not processors:
+            return
+        room_ids = list(processors)
+        with db_session:
+            commands = select(command for command in Command if command.room.id in room_ids)
+            if commands:
+                for command in commands:
+                    processor = processors[command.room.id]
+                    processor.ctx.main_loop.call_soon_threadsafe(processor, command.commandtext)
+                    command.delete()
+                commit()
+            del commands
+
+    def run(self) -> None:
+        while 1:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                logging.exception(e)
+
+    def listen(self) -> None:
+        """Sets wakeup on every notification from notify_command_added, only supported with PostgreSQL."""
+        import select as selectors
+        pool = db.provider.pool
+        try:
+            connection = pool.dbapi_module.connect(*pool.args, **pool.kwargs)
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {command_channel}")
+            while 1:
+                if selectors.select([connection], [], [], 60)[0]:
+                    connection.poll()
+                    if connection.notifies:
+                        connection.notifies.clear()
+                        self.wakeup.set()
+        except Exception as e:
+            logging.exception(e)
+            logging.warning("Command notifications stopped, continuing to poll for Commands.")
+
+
+db_command_dispatcher = DBCommandDispatcher()
+
+
 class WebHostContext(Context):
     room_id: int
+    tracker_aggregates: typing.Dict[typing.Tuple[int, int], typing.Dict[str, typing.Any]]
+    """ team, slot -> counts shown by trackers, see update_tracker_aggregates """
 
     def __init__(self, static_server_data: dict, logger: logging.Logger):
         # static server data is used during _load_game_data to load required data,
@@ -74,6 +148,7 @@ class WebHostContext(Context):
         self.main_loop = asyncio.get_running_loop()
         self.video = {}
         self.tags = ["AP", "WebHost"]
+        self.tracker_aggregates = {}
 
     def __del__(self):
         try:
@@ -89,20 +164,6 @@ class WebHostContext(Context):
             setattr(self, key, value)
         self.non_hintable_names = collections.defaultdict(frozenset, self.non_hintable_names)
 
-    def listen_to_db_commands(self):
-        cmdprocessor = DBCommandProcessor(self)
-
-        while not self.exit_event.is_set():
-            with db_session:
-                commands = select(command for command in Command if command.room.id == self.room_id)
-                if commands:
-                    for command in commands:
-                        self.main_loop.call_soon_threadsafe(cmdprocessor, command.commandtext)
-                        command.delete()
-                    commit()
-            del commands
-            time.sleep(5)
-
     @db_session
     def load(self, room_id: int):
         self.room_id = room_id
@@ -158,18 +219,38 @@ class WebHostContext(Context):
                 if savegame_data:
                     self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
             self._start_async_saving(atexit_save=False)
-        threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
+        db_command_dispatcher.add_room(self)
 
     @db_session
     def _save(self, exit_save: bool = False) -> bool:
         room = Room.get(id=self.room_id)
         # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
         room.multisave = pickle.dumps(self.get_save())
+        aggregates = pickle.dumps(self.update_tracker_aggregates())
+        if room.tracker_aggregates:
+            room.tracker_aggregates.data = aggregates
+            room.tracker_aggregates.saved = datetime.datetime.utcnow()
+        else:
+            TrackerAggregates(room=room, data=aggregates)
         # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
         if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
             room.last_activity = datetime.datetime.utcnow()
         return True
 
+    def update_tracker_aggregates(self) -> typing.Dict[typing.Tuple[int, int], typing.Dict[str, typing.Any]]:
+        """Brings the counts trackers show for each slot up to date, counting only items received since last time."""
+        for team, slot in self.player_names:
+            aggregate = self.tracker_aggregates.get((team, slot), None)
+            if not aggregate:
+                aggregate = self.tracker_aggregates[team, slot] = {"items": 0, "inventory": collections.Counter()}
+            items = self.received_items.get((team, slot, True), [])
+            for item in items[aggregate["items"]:]:
+                aggregate["inventory"][item.item] += 1
+            aggregate["items"] = len(items)
+            aggregate["checked"] = len(self.location_checks.get((team, slot), ()))
+            aggregate["status"] = self.client_game_state.get((team, slot), 0)
+        return self.tracker_aggregates
+
     def get_save(self) -> dict:
         d = super(WebHostContext, self).get_save()
         d["video"] = [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
@@ -229,9 +310,22 @@ def set_up_logging(room_id) -> logging.Logger:
     return logger
 
 
+def get_rss() -> int:
+    """Resident memory of this process in bytes, 0 if unknown."""
+    try:
+        import psutil
+    except ImportError:
+        return 0
+    return psutil.Process().memory_info().rss
+
+
+load_report_interval = 5  # seconds between load reports of a hoster to autohost
+
+
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       load_reports: multiprocessing.Queue):
     from setproctitle import setproctitle
 
     setproctitle(name)
@@ -275,12 +369,20 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
     gc.collect()  # free intermediate objects used during setup
 
     loop = asyncio.get_event_loop()
+    contexts: typing.Dict[typing.Any, WebHostContext] = {}
+
+    async def report_load():
+        """Tells autohost how many rooms and clients this process hosts and its memory use, for placing rooms."""
+        while 1:
+            load_reports.put((len(contexts), sum(len(ctx.endpoints) for ctx in contexts.values()), get_rss()))
+            await asyncio.sleep(load_report_interval)
 
     async def start_room(room_id):
         with Locker(f"RoomLocker {room_id}"):
             try:
                 logger = set_up_logging(room_id)
                 ctx = WebHostContext(static_server_data, logger)
+                contexts[room_id] = ctx
                 ctx.load(room_id)
                 ctx.init_save()
                 assert ctx.server is None
@@ -339,6 +441,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                     ctx._save()
                     setattr(asyncio.current_task(), "save", None)
             finally:
+                contexts.pop(room_id, None)
                 try:
                     ctx.save_dirty = False  # make sure the saving thread does not write to DB after final wakeup
                     ctx.exit_event.set()  # make sure the saving thread stops at some point
@@ -378,6 +481,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
     starter = Starter()
     starter.daemon = True
     starter.start()
+    loop.create_task(report_load())
     try:
         loop.run_forever()
     finally:
@@ -12,7 +12,7 @@ from werkzeug.utils import secure_filename
 from worlds.AutoWorld import AutoWorldRegister, World
 from . import app, cache
 from .markdown import render_markdown
-from .models import Seed, Room, Command, UUID, uuid4
+from .models import Seed, Room, Command, UUID, uuid4, notify_command_added
 from Utils import title_sorted
 
 class WebWorldTheme(StrEnum):
@@ -218,6 +218,7 @@ def host_room_command(room: UUID):
         cmd = request.form["cmd"]
         if cmd:
             Command(room=room, commandtext=cmd)
+            notify_command_added()
             commit()
     return redirect(url_for("host_room", room=room.id))
 
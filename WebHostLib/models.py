@@ -1,6 +1,7 @@
 from datetime import datetime
 from uuid import UUID, uuid4
-from pony.orm import Database, PrimaryKey, Required, Set, Optional, buffer, LongStr
+import typing
+from pony.orm import Database, PrimaryKey, Required, Set, Optional, buffer, LongStr, exists, select
 
 db = Database()
 
@@ -13,10 +14,29 @@ class Slot(db.Entity):
     id = PrimaryKey(int, auto=True)
     player_id = Required(int)
     player_name = Required(str)
-    data = Optional(bytes, lazy=True)
+    data = Optional(bytes, lazy=True)  # files uploaded before they were stored as SlotDataChunk
     seed = Optional('Seed')
     game = Required(str)
 
+    def has_file(self) -> bool:
+        return exists(chunk for chunk in SlotDataChunk if chunk.slot_id == self.id) or bool(self.data)
+
+    def read_file(self) -> typing.Optional[bytes]:
+        chunks = select((chunk.index, chunk.data) for chunk in SlotDataChunk if chunk.slot_id == self.id)[:]
+        return b"".join(data for _, data in sorted(chunks)) if chunks else self.data
+
+
+class SlotDataChunk(db.Entity):
+    """
+    Part of the file of a slot, so uploads only have to hold one part at a time.
+    Refers to its slot by id instead of a relation, so that uploads can insert chunks without going through,
+    and being kept in, the db_session cache. Chunks of deleted slots are deleted by autolauncher's cleanup.
+    """
+    slot_id = Required(int)
+    index = Required(int)
+    data = Required(bytes, lazy=True)
+    PrimaryKey(slot_id, index)
+
 
 class Room(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
@@ -31,6 +51,15 @@ class Room(db.Entity):
     tracker = Optional(UUID, index=True)
     # Port special value -1 means the server errored out. Another attempt can be made with a page refresh
     last_port = Optional(int, default=lambda: 0)
+    tracker_aggregates = Optional('TrackerAggregates', cascade_delete=True)
+
+
+class TrackerAggregates(db.Entity):
+    """Per slot counts shown by trackers, written by the room along with its multisave."""
+    room = PrimaryKey(Room)
+    data = Required(buffer, lazy=True)
+    # bumped on every save, unlike Room.last_activity, so trackers know when their decoded data is stale
+    saved = Required(datetime, default=lambda: datetime.utcnow())
 
 
 class Seed(db.Entity):
@@ -50,6 +79,15 @@ class Command(db.Entity):
     commandtext = Required(str)
 
 
+command_channel = "ap_room_commands"
+
+
+def notify_command_added() -> None:
+    """Wakes up hosters waiting for new Commands, where the database supports notifications. Sent on commit."""
+    if db.provider_name == "postgres":
+        db.execute(f"NOTIFY {command_channel}")
+
+
 class Generation(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
     owner = Required(UUID)
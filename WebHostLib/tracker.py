@@ -1,5 +1,6 @@
 import datetime
 import collections
+import threading
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, NamedTuple, Counter
 from uuid import UUID
@@ -24,6 +25,82 @@ TeamPlayer = Tuple[int, int]
 ItemMetadata = Tuple[int, int, int]
 
 
+class _DecodedDataCache:
+    """Process wide least recently used cache of decoded room data, shared by all TrackerData.
+    Keeps at most app.config["TRACKER_CACHE_ENTRIES"] entries, as the decoded size of an entry can't be known cheaply.
+    Cached data is shared, so it must not be modified.
+    """
+    _entries: "collections.OrderedDict[Tuple[str, Any], Any]"
+
+    def __init__(self) -> None:
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Any], load: Callable[[], Any],
+            is_current: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Returns the cached value for key, or the value returned by load if missing or no longer current."""
+        with self._lock:
+            if key in self._entries and is_current(self._entries[key]):
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = load()  # outside the lock, so other rooms don't have to wait
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > max(1, app.config["TRACKER_CACHE_ENTRIES"]):
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_decoded_data_cache = _DecodedDataCache()
+
+
+class _GameNames(NamedTuple):
+    item_name_to_id: Dict[str, int]
+    location_name_to_id: Dict[str, int]
+    item_id_to_name: Dict[int, str]
+    location_id_to_name: Dict[int, str]
+
+
+def _save_stamp(room: Room) -> datetime.datetime:
+    """
+    When the room last saved, including saves on shutdown. Rooms that didn't save along with tracker aggregates yet
+    fall back to their last activity, which their saves bump as well.
+    """
+    return room.tracker_aggregates.saved if room.tracker_aggregates else room.last_activity
+
+
+def _load_multidata(room: Room) -> Dict[str, Any]:
+    return Context.decompress(room.seed.multidata)
+
+
+def _load_multisave(room: Room) -> Tuple[datetime.datetime, Dict[str, Any]]:
+    multisave = room.multisave
+    return _save_stamp(room), restricted_loads(multisave) if multisave else {}
+
+
+def _load_tracker_aggregates(room: Room) -> Tuple[datetime.datetime, Dict[TeamPlayer, Dict[str, Any]]]:
+    row = room.tracker_aggregates
+    return _save_stamp(room), restricted_loads(row.data) if row else {}
+
+
+def _load_game_names(checksum: str) -> _GameNames:
+    data = GameDataPackage.get(checksum=checksum).data
+    game_package = restricted_loads(data)
+    return _GameNames(
+        game_package["item_name_to_id"],
+        game_package["location_name_to_id"],
+        KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
+            id: name for name, id in game_package["item_name_to_id"].items()}),
+        KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
+            id: name for name, id in game_package["location_name_to_id"].items()}),
+    )
+
+
 def _cache_results(func: Callable) -> Callable:
     """Stores the results of any computationally expensive methods after the initial call in TrackerData.
     If called again, returns the cached result instead, as results will not change for the lifetime of TrackerData.
@@ -49,14 +126,22 @@ class TrackerData:
     """
     room: Room
     _multidata: Dict[str, Any]
-    _multisave: Dict[str, Any]
+    _loaded_multisave: Optional[Dict[str, Any]]
+    _save_stamp: datetime.datetime
+    _aggregates: Dict[TeamPlayer, Dict[str, Any]]
+    """ counts kept up to date by the room, see WebHostContext.update_tracker_aggregates """
     _tracker_cache: Dict[str, Any]
 
     def __init__(self, room: Room):
         """Initialize a new RoomMultidata object for the current room."""
         self.room = room
-        self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        # the multidata of a seed never changes and the multisave only gets saved along with the aggregates
+        self._multidata = _decoded_data_cache.get(("multidata", room.seed.id), lambda: _load_multidata(room))
+        self._loaded_multisave = None
+        self._save_stamp = _save_stamp(room)
+        self._aggregates = _decoded_data_cache.get(
+            ("aggregates", room.id), lambda: _load_tracker_aggregates(room),
+            lambda cached: cached[0] == self._save_stamp)[1]
         self._tracker_cache = {}
 
         self.item_name_to_id: Dict[str, Dict[str, int]] = {}
@@ -70,15 +155,23 @@ class TrackerData:
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Location (ID: {code})")
         })
         for game, game_package in self._multidata["datapackage"].items():
-            game_package = restricted_loads(GameDataPackage.get(checksum=game_package["checksum"]).data)
-            self.item_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
-                id: name for name, id in game_package["item_name_to_id"].items()})
-            self.location_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
-                id: name for name, id in game_package["location_name_to_id"].items()})
+            checksum = game_package["checksum"]
+            names: _GameNames = _decoded_data_cache.get(("datapackage", checksum), lambda: _load_game_names(checksum))
+            self.item_id_to_name[game] = names.item_id_to_name
+            self.location_id_to_name[game] = names.location_id_to_name
 
             # Normal lookup tables as well.
-            self.item_name_to_id[game] = game_package["item_name_to_id"]
-            self.location_name_to_id[game] = game_package["location_name_to_id"]
+            self.item_name_to_id[game] = names.item_name_to_id
+            self.location_name_to_id[game] = names.location_name_to_id
+
+    @property
+    def _multisave(self) -> Dict[str, Any]:
+        """The multisave, only loaded when something is needed that the aggregates don't have."""
+        if self._loaded_multisave is None:
+            self._loaded_multisave = _decoded_data_cache.get(
+                ("multisave", self.room.id), lambda: _load_multisave(self.room),
+                lambda cached: cached[0] == self._save_stamp)[1]
+        return self._loaded_multisave
 
     def get_seed_name(self) -> str:
         """Retrieves the seed name."""
@@ -112,6 +205,13 @@ class TrackerData:
         """Retrieves the set of all locations marked complete by this player."""
         return self._multisave.get("location_checks", {}).get((team, player), set())
 
+    def get_player_checked_locations_count(self, team: int, player: int) -> int:
+        """Retrieves the number of locations marked complete by this player."""
+        aggregate = self._aggregates.get((team, player), None)
+        if aggregate:
+            return aggregate["checked"]
+        return len(self.get_player_checked_locations(team, player))
+
     @_cache_results
     def get_player_missing_locations(self, team: int, player: int) -> Set[int]:
         """Retrieves the set of all locations not marked complete by this player."""
@@ -124,11 +224,14 @@ class TrackerData:
     @_cache_results
     def get_player_inventory_counts(self, team: int, player: int) -> collections.Counter:
         """Retrieves a dictionary of all items received by their id and their received count."""
-        received_items = self.get_player_received_items(team, player)
         starting_items = self.get_player_starting_inventory(player)
-        inventory = collections.Counter()
-        for item in received_items:
-            inventory[item.item] += 1
+        aggregate = self._aggregates.get((team, player), None)
+        if aggregate:
+            inventory = collections.Counter(aggregate["inventory"])
+        else:
+            inventory = collections.Counter()
+            for item in self.get_player_received_items(team, player):
+                inventory[item.item] += 1
         for item in starting_items:
             inventory[item] += 1
 
@@ -148,6 +251,9 @@ class TrackerData:
 
     def get_player_client_status(self, team: int, player: int) -> ClientStatus:
         """Retrieves the ClientStatus of a particular player."""
+        aggregate = self._aggregates.get((team, player), None)
+        if aggregate:
+            return ClientStatus(aggregate["status"])
         return self._multisave.get("client_game_state", {}).get((team, player), ClientStatus.CLIENT_UNKNOWN)
 
     def get_player_alias(self, team: int, player: int) -> Optional[str]:
@@ -186,7 +292,7 @@ class TrackerData:
     def get_team_locations_checked_count(self) -> Dict[int, int]:
         """Retrieves a dictionary of checked player locations each team has."""
         return {
-            team: sum(len(self.get_player_checked_locations(team, player)) for player in players)
+            team: sum(self.get_player_checked_locations_count(team, player) for player in players)
             for team, players in self.get_all_players().items()
         }
 
@@ -241,7 +347,7 @@ class TrackerData:
     def get_room_locations_complete(self) -> Dict[TeamPlayer, int]:
         """Retrieves a dictionary of all locations complete per player."""
         return {
-            (team, player): len(self.get_player_checked_locations(team, player))
+            (team, player): self.get_player_checked_locations_count(team, player)
             for team, players in self.get_all_players().items() for player in players
         }
 
@@ -3,9 +3,7 @@ import pickle
 import typing
 import uuid
 import zipfile
-import zlib
 
-from io import BytesIO
 from flask import request, flash, redirect, url_for, session, render_template, abort
 from markupsafe import Markup
 from pony.orm import commit, flush, select, rollback
@@ -13,12 +11,12 @@ from pony.orm.core import TransactionIntegrityError
 import schema
 
 import MultiServer
-from NetUtils import GamesPackage, SlotType
+from NetUtils import GamesPackage, SlotType, compress_multidata
 from Utils import VersionException, __version__
 from worlds.Files import AutoPatchRegister
 from worlds.AutoWorld import data_package_checksum
 from . import app
-from .models import Seed, Room, Slot, GameDataPackage
+from .models import Seed, Room, Slot, SlotDataChunk, GameDataPackage, db
 
 banned_extensions = (".sfc", ".z64", ".n64", ".nes", ".smc", ".sms", ".gb", ".gbc", ".gba")
 allowed_options_extensions = (".yaml", ".json", ".yml", ".txt", ".zip")
@@ -46,7 +44,7 @@ def banned_file(filename: str) -> bool:
     return filename.endswith(banned_extensions)
 
 
-def process_multidata(compressed_multidata, files={}):
+def process_multidata(compressed_multidata):
     game_data: GamesPackage
 
     decompressed_multidata = MultiServer.Context.decompress(compressed_multidata)
@@ -84,16 +82,25 @@ def process_multidata(compressed_multidata, files={}):
             # Ignore Player Groups (e.g. item links)
             if slot_info.type == SlotType.group:
                 continue
-            slots.add(Slot(data=files.get(slot, None),
-                           player_name=slot_info.name,
+            slots.add(Slot(player_name=slot_info.name,
                            player_id=slot,
                            game=slot_info.game))
         flush()  # commit slots
 
-    compressed_multidata = compressed_multidata[0:1] + zlib.compress(pickle.dumps(decompressed_multidata), 9)
+    compressed_multidata = compress_multidata(decompressed_multidata, compressed_multidata[0])
     return slots, compressed_multidata
 
 
+slot_data_chunk_size = 1024 * 1024
+
+
+def store_slot_data(slot: Slot, stream: typing.BinaryIO) -> None:
+    """Writes the file of a flushed slot in chunks, reading and keeping only one of them in memory at a time."""
+    for index, data in enumerate(iter(lambda: stream.read(slot_data_chunk_size), b"")):
+        # no SlotDataChunk entity is in the db_session cache to go stale, and creating them would keep all in memory
+        db.insert(SlotDataChunk, slot_id=slot.id, index=index, data=data)
+
+
 def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, sid=None):
     if not owner:
         owner = session["_id"]
@@ -104,10 +111,10 @@ def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, s
         return
 
     spoiler = ""
-    files = {}
-    multidata = None
+    files: typing.Dict[int, zipfile.ZipInfo] = {}
+    multidata_file = None
 
-    # Load files.
+    # Find files, slot files are only read once the multidata has been processed and then one at a time.
     for file in infolist:
         handler = AutoPatchRegister.get_handler(file.filename)
         if banned_file(file.filename):
@@ -116,10 +123,10 @@ def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, s
 
         # AP Container
         elif handler:
-            data = zfile.open(file, "r").read()
-            with zipfile.ZipFile(BytesIO(data)) as container:
+            # reads only the manifest, decompressing the rest of the container as a stream to get to it
+            with zfile.open(file, "r") as stream, zipfile.ZipFile(stream) as container:
                 player = json.loads(container.open("archipelago.json").read())["player"]
-            files[player] = data
+            files[player] = file
 
         # Spoiler
         elif file.filename.endswith(".txt"):
@@ -127,12 +134,7 @@ def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, s
 
         # Multi-data
         elif file.filename.endswith(".archipelago"):
-            try:
-                multidata = zfile.open(file).read()
-            except:
-                flash("Could not load multidata. File may be corrupted or incompatible.")
-                multidata = None
-
+            multidata_file = file
 
         # Factorio
         elif file.filename.endswith(".zip"):
@@ -141,8 +143,7 @@ def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, s
             except ValueError:
                 flash("Error: Unexpected file found in .zip: " + file.filename)
                 return
-            data = zfile.open(file, "r").read()
-            files[int(slot_id[1:])] = data
+            files[int(slot_id[1:])] = file
 
         # All other files using the standard MultiWorld.get_out_file_name_base method
         else:
@@ -151,18 +152,29 @@ def upload_zip_to_db(zfile: zipfile.ZipFile, owner=None, meta={"race": False}, s
             except ValueError:
                 flash("Error: Unexpected file found in .zip: " + file.filename)
                 return
-            data = zfile.open(file, "r").read()
-            files[int(slot_id[1:])] = data
+            files[int(slot_id[1:])] = file
+
+    multidata = None
+    if multidata_file:
+        try:
+            multidata = zfile.open(multidata_file).read()
+        except:
+            flash("Could not load multidata. File may be corrupted or incompatible.")
 
     # Load multi data.
     if multidata:
-        slots, multidata = process_multidata(multidata, files)
+        slots, multidata = process_multidata(multidata)
 
         seed = Seed(multidata=multidata, spoiler=spoiler, slots=slots, owner=owner, meta=json.dumps(meta),
                     id=sid if sid else uuid.uuid4())
-        flush()  # create seed
+        del multidata
         for slot in slots:
             slot.seed = seed
+        flush()  # create seed
+        for slot in slots:
+            if slot.player_id in files:
+                with zfile.open(files[slot.player_id]) as stream:
+                    store_slot_data(slot, stream)
         return seed
     else:
         flash("No multidata was found in the zip file, which is required.")
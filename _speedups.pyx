@@ -1,6 +1,5 @@
 #cython: language_level=3
 #distutils: language = c
-#distutils: depends = intset.h
 
 """
 Provides faster implementation of some core parts.
@@ -13,7 +12,8 @@ import warnings
 from cpython cimport PyObject
 from typing import Any, Dict, Iterable, Iterator, Generator, Sequence, Tuple, TypeVar, Union, Set, List, TYPE_CHECKING
 from cymem.cymem cimport Pool
-from libc.stdint cimport int64_t, uint32_t
+from libc.stdint cimport int32_t, int64_t, uint32_t
+from libc.stdlib cimport qsort
 from collections import defaultdict
 
 cdef extern from *:
@@ -27,32 +27,11 @@ cdef extern from *:
 ctypedef uint32_t ap_player_t  # on AMD64 this is faster (and smaller) than 64bit ints
 ctypedef uint32_t ap_flags_t
 ctypedef int64_t ap_id_t
+ctypedef int32_t ap_sphere_t
 
 cdef ap_player_t MAX_PLAYER_ID = 1000000  # limit the size of indexing array
 cdef size_t INVALID_SIZE = <size_t>(-1)  # this is all 0xff... adding 1 results in 0, but it's not negative
 
-# configure INTSET for player
-cdef extern from *:
-    """
-    #define INTSET_NAME ap_player_set
-    #define INTSET_TYPE uint32_t  // has to match ap_player_t
-    """
-
-# create INTSET for player
-cdef extern from "intset.h":
-    """
-    #undef INTSET_NAME
-    #undef INTSET_TYPE
-    """
-    ctypedef struct ap_player_set:
-        pass
-
-    ap_player_set* ap_player_set_new(size_t bucket_count) nogil
-    void ap_player_set_free(ap_player_set* set) nogil
-    bint ap_player_set_add(ap_player_set* set, ap_player_t val) nogil
-    bint ap_player_set_contains(ap_player_set* set, ap_player_t val) nogil
-
-
 cdef struct LocationEntry:
     # layout is so that
     # 64bit player: location+sender and item+receiver 128bit comparisons, if supported
@@ -62,6 +41,7 @@ cdef struct LocationEntry:
     ap_player_t receiver
     ap_id_t item
     ap_flags_t flags
+    ap_sphere_t sphere  # -1 if unknown, see set_spheres
 
 
 cdef struct IndexEntry:
@@ -69,6 +49,26 @@ cdef struct IndexEntry:
     size_t count
 
 
+cdef struct ReceiverEntry:
+    # only used while building the receiver index
+    ap_id_t item
+    size_t entry
+    ap_player_t receiver
+
+
+cdef int compare_receiver_entries(const void* a, const void* b) noexcept nogil:
+    # order by receiver, then item, then position in entries, so results stay in the order of entries
+    cdef const ReceiverEntry* x = <const ReceiverEntry*>a
+    cdef const ReceiverEntry* y = <const ReceiverEntry*>b
+    if x.receiver != y.receiver:
+        return -1 if x.receiver < y.receiver else 1
+    if x.item != y.item:
+        return -1 if x.item < y.item else 1
+    if x.entry != y.entry:
+        return -1 if x.entry < y.entry else 1
+    return 0
+
+
 if TYPE_CHECKING:
     State = Dict[Tuple[int, int], Set[int]]
 else:
@@ -88,10 +88,13 @@ cdef class LocationStore:
 
     cdef Pool _mem
     cdef object _len
-    cdef LocationEntry* entries  # 3.2MB/100k items
+    cdef LocationEntry* entries  # 3.2MB/100k items, including their spheres
     cdef size_t entry_count
     cdef IndexEntry* sender_index  # 16KB/1000 players
     cdef size_t sender_index_size
+    cdef size_t* receiver_entries  # 800KB/100k items, indices into entries sorted by receiver and item
+    cdef IndexEntry* receiver_index  # 16KB/1000 players, ranges of receiver_entries, NULL if not indexed
+    cdef size_t receiver_index_size
     cdef list _keys  # ~36KB/1000 players, speed up iter (28 per int + 8 per list entry)
     cdef list _items  # ~64KB/1000 players, speed up items (56 per tuple + 8 per list entry)
     cdef list _proxies  # ~92KB/1000 players, speed up self[player] (56 per struct + 28 per len + 8 per list entry)
@@ -100,7 +103,10 @@ cdef class LocationStore:
     def get_size(self):
         from sys import getsizeof
         size = getsizeof(self) + getsizeof(self._mem) + getsizeof(self._len) \
-                + sizeof(LocationEntry) * self.entry_count + sizeof(IndexEntry) * self.sender_index_size
+                + sizeof(LocationEntry) * self.entry_count + sizeof(IndexEntry) * self.sender_index_size \
+                + sizeof(IndexEntry) * self.receiver_index_size
+        if self.receiver_index:
+            size += sizeof(size_t) * self.entry_count
         size += getsizeof(self._keys) + getsizeof(self._items) + getsizeof(self._proxies)
         size += sum(sizeof(key) for key in self._keys)
         size += sum(sizeof(item) for item in self._items)
@@ -108,7 +114,7 @@ cdef class LocationStore:
         size += sizeof(self._raw_proxies[0]) * self.sender_index_size
         return size
 
-    def __init__(self, locations_dict: Dict[int, Dict[int, Sequence[int]]]) -> None:
+    def __init__(self, locations_dict: Dict[int, Dict[int, Sequence[int]]], index_receivers: bool = True) -> None:
         self._mem = Pool()
         cdef object key
         self._keys = []
@@ -117,6 +123,7 @@ cdef class LocationStore:
 
         # iterate over everything to get all maxima and validate everything
         cdef size_t max_sender = INVALID_SIZE  # keep track of highest used player id for indexing
+        cdef size_t max_receiver = 0
         cdef size_t sender_count = 0
         cdef size_t count = 0
         for sender, locations in locations_dict.items():
@@ -131,6 +138,7 @@ cdef class LocationStore:
                 receiver = data[1]
                 if receiver < 1 or receiver > MAX_PLAYER_ID:
                     raise ValueError(f"Invalid player id {receiver} for item")
+                max_receiver = max(max_receiver, receiver)
                 count += 1
             sender_count += 1
 
@@ -149,6 +157,9 @@ cdef class LocationStore:
             # leaving entries as NULL if there are none, makes potential memory errors more visible
             self.entries = <LocationEntry*>self._mem.alloc(count, sizeof(LocationEntry))
         self.sender_index = <IndexEntry*>self._mem.alloc(max_sender + 1, sizeof(IndexEntry))
+        if index_receivers:
+            self.receiver_index = <IndexEntry*>self._mem.alloc(max_receiver + 1, sizeof(IndexEntry))
+            assert self.receiver_index
         self._raw_proxies = <PyObject**>self._mem.alloc(max_sender + 1, sizeof(PyObject*))
 
         assert (not self.entries) == (not count)
@@ -168,10 +179,30 @@ cdef class LocationStore:
                 self.entries[i].receiver = data[1]
                 if len(data) > 2:
                     self.entries[i].flags = data[2]  # initialized to 0 during alloc
+                self.entries[i].sphere = -1
                 # Ignoring extra data. warn?
                 self.sender_index[sender].count += 1
                 i += 1
 
+        # build receiver index, so find_item and get_for_player don't have to go through all entries
+        cdef ReceiverEntry* by_receiver
+        cdef ap_player_t receiving_player
+        if count and index_receivers:
+            by_receiver = <ReceiverEntry*>self._mem.alloc(count, sizeof(ReceiverEntry))
+            for i in range(count):
+                by_receiver[i].item = self.entries[i].item
+                by_receiver[i].entry = i
+                by_receiver[i].receiver = self.entries[i].receiver
+            qsort(by_receiver, count, sizeof(ReceiverEntry), compare_receiver_entries)
+            self.receiver_entries = <size_t*>self._mem.alloc(count, sizeof(size_t))
+            for i in range(count):
+                self.receiver_entries[i] = by_receiver[i].entry
+                receiving_player = by_receiver[i].receiver
+                if not self.receiver_index[receiving_player].count:
+                    self.receiver_index[receiving_player].start = i
+                self.receiver_index[receiving_player].count += 1
+            self._mem.free(by_receiver)
+
         # build pyobject caches
         self._proxies.append(None)  # player 0
         assert self.sender_index[0].count == 0
@@ -187,6 +218,8 @@ cdef class LocationStore:
             self._raw_proxies[i] = <PyObject*>proxy
 
         self.sender_index_size = max_sender + 1
+        if index_receivers:
+            self.receiver_index_size = max_receiver + 1
         self.entry_count = count
         self._len = sender_count
 
@@ -215,48 +248,131 @@ cdef class LocationStore:
         return self._items
 
     # specialized accessors
+    def set_spheres(self, spheres: Sequence[Dict[int, Set[int]]]) -> None:
+        """Stores the sphere of each location, as in multidata's spheres, to be looked up with get_sphere."""
+        cdef LocationEntry* entry
+        cdef size_t sender
+        for sphere_number, sphere in enumerate(spheres):
+            for player, locations in sphere.items():
+                sender = player
+                if sender < 1 or sender >= self.sender_index_size:
+                    continue
+                for location in locations:
+                    entry = (<PlayerLocationProxy>self._raw_proxies[sender])._get(location)
+                    if entry and entry.sphere < 0:
+                        entry.sphere = sphere_number
+
+    def get_sphere(self, player: int, location: int) -> int:
+        """Returns the sphere of a location, -1 if it has none."""
+        cdef size_t sender = player
+        if sender < 1 or sender >= self.sender_index_size:
+            return -1
+        cdef LocationEntry* entry = (<PlayerLocationProxy>self._raw_proxies[sender])._get(location)
+        if entry:
+            return entry.sphere
+        return -1
+
+    cdef IndexEntry _find_received(self, ap_player_t receiver, ap_id_t item) nogil:
+        # range of receiver_entries for item sent to receiver
+        cdef IndexEntry result
+        cdef size_t l, r, m, first
+        result.start = 0
+        result.count = 0
+        if receiver >= self.receiver_index_size:
+            return result
+        l = self.receiver_index[receiver].start
+        r = l + self.receiver_index[receiver].count
+        # binary search for first and last entry of item
+        while l < r:
+            m = (l + r) // 2
+            if self.entries[self.receiver_entries[m]].item < item:
+                l = m + 1
+            else:
+                r = m
+        first = l
+        r = self.receiver_index[receiver].start + self.receiver_index[receiver].count
+        while l < r:
+            m = (l + r) // 2
+            if self.entries[self.receiver_entries[m]].item <= item:
+                l = m + 1
+            else:
+                r = m
+        result.start = first
+        result.count = l - first
+        return result
+
     def find_item(self, slots: Set[int], seeked_item_id: int) -> Generator[Tuple[int, int, int, int, int], None, None]:
         cdef ap_id_t item = seeked_item_id
         cdef ap_player_t receiver
-        cdef ap_player_set* receivers
+        cdef IndexEntry found
+        cdef LocationEntry* entry
+        cdef size_t i
+        cdef list found_entries
         cdef size_t slot_count = len(slots)
-        if slot_count == 1:
-            # specialized implementation for single slot
-            receiver = list(slots)[0]
-            with nogil:
-                for entry in self.entries[:self.entry_count]:
-                    if entry.item == item and entry.receiver == receiver:
-                        with gil:
-                            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-        elif slot_count:
-            # generic implementation with lookup in set
-            receivers = ap_player_set_new(min(1023, slot_count))  # limit top level struct to 16KB
-            if not receivers:
-                raise MemoryError()
-            try:
-                for receiver in slots:
-                    if not ap_player_set_add(receivers, receiver):
-                        raise MemoryError()
+        if not self.receiver_index:
+            # not indexed, go through all entries
+            if slot_count == 1:
+                receiver = list(slots)[0]
                 with nogil:
-                    for entry in self.entries[:self.entry_count]:
-                        if entry.item == item and ap_player_set_contains(receivers, entry.receiver):
+                    for i in range(self.entry_count):
+                        entry = self.entries + i
+                        if entry.item == item and entry.receiver == receiver:
                             with gil:
                                 yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-            finally:
-                ap_player_set_free(receivers)
+            elif slot_count:
+                with nogil:
+                    for i in range(self.entry_count):
+                        entry = self.entries + i
+                        if entry.item == item:
+                            with gil:
+                                if entry.receiver in slots:
+                                    yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
+        elif slot_count == 1:
+            # specialized implementation for single slot
+            receiver = list(slots)[0]
+            found = self._find_received(receiver, item)
+            for i in range(found.start, found.start + found.count):
+                entry = self.entries + self.receiver_entries[i]
+                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
+        elif slot_count:
+            # collect matches of all receivers, then restore the order of entries
+            found_entries = []
+            for receiver in slots:
+                found = self._find_received(receiver, item)
+                for i in range(found.start, found.start + found.count):
+                    found_entries.append(self.receiver_entries[i])
+            found_entries.sort()
+            for i in found_entries:
+                entry = self.entries + i
+                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
 
     def get_for_player(self, slot: int) -> Dict[int, Set[int]]:
         cdef ap_player_t receiver = slot
+        cdef LocationEntry* entry
+        cdef size_t i, start, count
         all_locations: Dict[int, Set[int]] = {}
-        with nogil:
-            for entry in self.entries[:self.entry_count]:
-                if entry.receiver == receiver:
-                    with gil:
-                        sender: int = entry.sender
-                        if sender not in all_locations:
-                            all_locations[sender] = set()
-                        all_locations[sender].add(entry.location)
-        return all_locations
+        if not self.receiver_index:
+            # not indexed, go through all entries
+            start = 0
+            count = self.entry_count
+        elif receiver >= self.receiver_index_size:
+            return all_locations
+        else:
+            start = self.receiver_index[receiver].start
+            count = self.receiver_index[receiver].count
+        for i in range(start, start + count):
+            if self.receiver_index:
+                entry = self.entries + self.receiver_entries[i]
+            else:
+                entry = self.entries + i
+                if entry.receiver != receiver:
+                    continue
+            sender: int = entry.sender
+            if sender not in all_locations:
+                all_locations[sender] = set()
+            all_locations[sender].add(entry.location)
+        # keep senders in order, like iterating over all entries would
+        return {sender: all_locations[sender] for sender in sorted(all_locations)}
 
     def get_checked(self, state: State, team: int, slot: int) -> List[int]:
         cdef ap_player_t sender = slot
@@ -0,0 +1,166 @@
+"""
+Timing report of a single generation, enabled with Generate.py's --profile_generation.
+It is meant to find out which world's steps, which fill phase or which access rules make a seed slow to generate.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from BaseClasses import Entrance, Location, MultiWorld
+
+__all__ = ["GenerationProfile", "RuleTiming", "enter_phase"]
+
+
+class RuleTiming:
+    """Calls of a single access rule, of which every `sample_every`th call is timed."""
+    __slots__ = ("spot", "rule", "calls", "samples", "sampled_seconds")
+
+    spot: typing.Union[Location, Entrance]
+    rule: typing.Callable[..., bool]
+    calls: int
+    samples: int
+    sampled_seconds: float
+
+    def __init__(self, spot: typing.Union[Location, Entrance], rule: typing.Callable[..., bool]) -> None:
+        self.spot = spot
+        self.rule = rule
+        self.calls = 0
+        self.samples = 0
+        self.sampled_seconds = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.sampled_seconds / self.samples if self.samples else 0.0
+
+    @property
+    def estimated_seconds(self) -> float:
+        """Time spent in all calls of the rule, extrapolated from the sampled calls."""
+        return self.mean_seconds * self.calls
+
+
+class GenerationProfile:
+    """
+    Collects the wall time of every generation step per player and of the fill phases, and samples how long access
+    rules take between `sample_rules` and `stop_sampling`.
+    """
+    top_rules: int
+    """Amount of the slowest access rules to list in the report."""
+    sample_every: int
+    """Only every this many calls of an access rule get timed, to keep the overhead of timing them low."""
+    stages: typing.Dict[str, typing.Dict[str, float]]
+    """Seconds spent in each step, by player, or "stage" for the world types' stage_ methods."""
+    phases: typing.Dict[str, float]
+    """Seconds spent in each phase of generation, see enter_phase."""
+    rules: typing.List[RuleTiming]
+    _originals: typing.Dict[typing.Union[Location, Entrance], typing.Tuple[typing.Callable[..., bool],
+                                                                           typing.Callable[..., bool]]]
+    """The original access rule and the wrapper installed in its place by sample_rules, by location or entrance."""
+    _sampling: bool
+
+    def __init__(self, top_rules: int = 20, sample_every: int = 16) -> None:
+        self.top_rules = top_rules
+        self.sample_every = sample_every
+        self.stages = {}
+        self.phases = {}
+        self.rules = []
+        self._originals = {}
+        self._sampling = False
+        self._start = time.perf_counter()
+        self._phase: typing.Optional[str] = None
+        self._phase_start = self._start
+
+    def record_stage(self, stage: str, player: typing.Optional[int], seconds: float) -> None:
+        players = self.stages.setdefault(stage.removeprefix("stage_"), {})
+        key = "stage" if player is None else str(player)
+        players[key] = players.get(key, 0.0) + seconds
+
+    def enter_phase(self, name: typing.Optional[str]) -> None:
+        """Ends the current phase and starts timing phase `name`, if given."""
+        now = time.perf_counter()
+        if self._phase:
+            self.phases[self._phase] = self.phases.get(self._phase, 0.0) + now - self._phase_start
+        self._phase = name
+        self._phase_start = now
+
+    def sample_rules(self, multiworld: MultiWorld) -> None:
+        """Wraps the access rules of all locations and entrances, so their calls get counted and sampled."""
+        self._sampling = True
+        for spot in (*multiworld.get_locations(), *multiworld.get_entrances()):
+            timing = RuleTiming(spot, spot.access_rule)
+            self.rules.append(timing)
+            spot.access_rule = self._sampled_rule(timing)
+            self._originals[spot] = timing.rule, spot.access_rule
+
+    def _sampled_rule(self, timing: RuleTiming) -> typing.Callable[..., bool]:
+        rule = timing.rule
+        sample_every = self.sample_every
+        perf_counter = time.perf_counter
+
+        def sampled_rule(state) -> bool:
+            if not self._sampling:
+                return rule(state)
+            timing.calls += 1
+            if timing.calls % sample_every:
+                return rule(state)
+            start = perf_counter()
+            try:
+                return rule(state)
+            finally:
+                timing.sampled_seconds += perf_counter() - start
+                timing.samples += 1
+
+        sampled_rule.__wrapped__ = rule  # type: ignore[attr-defined]
+        return sampled_rule
+
+    def stop_sampling(self) -> None:
+        """
+        Stops timing access rules and puts back the original ones where the wrapper is still the access rule.
+        Wrappers that got combined into another rule meanwhile, such as by add_rule in pre_fill, stay there, but only
+        call the original rule from now on.
+        """
+        self._sampling = False
+        for spot, (rule, wrapper) in self._originals.items():
+            if spot.access_rule is wrapper:
+                spot.access_rule = rule
+        self._originals.clear()
+
+    def report(self, multiworld: MultiWorld) -> typing.Dict[str, typing.Any]:
+        """Ends the current phase and returns the report as a json compatible dict."""
+        self.enter_phase(None)
+        slowest_rules = sorted((timing for timing in self.rules if timing.samples),
+                               key=lambda timing: timing.estimated_seconds, reverse=True)[:self.top_rules]
+        return {
+            "seed_name": multiworld.seed_name,
+            "total_seconds": time.perf_counter() - self._start,
+            "players": {str(player): {"name": multiworld.player_name[player], "game": multiworld.game[player]}
+                        for player in multiworld.player_ids},
+            "stages": {stage: {"total_seconds": sum(players.values()), "seconds": players}
+                       for stage, players in self.stages.items()},
+            "phases": self.phases,
+            "sample_every": self.sample_every,
+            "slowest_rules": [{
+                "player": timing.spot.player,
+                "type": type(timing.spot).__name__,
+                "name": timing.spot.name,
+                "calls": timing.calls,
+                "samples": timing.samples,
+                "mean_seconds": timing.mean_seconds,
+                "estimated_seconds": timing.estimated_seconds,
+            } for timing in slowest_rules],
+        }
+
+    def write(self, path: str, multiworld: MultiWorld) -> None:
+        """Writes the report to `path`."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(multiworld), f, indent=2)
+        logging.info(f"Wrote generation profile to {path}")
+
+
+def enter_phase(multiworld: MultiWorld, name: str) -> None:
+    """Starts timing phase `name` of generation, if it is being profiled."""
+    if multiworld.generation_profile:
+        multiworld.generation_profile.enter_phase(name)
@@ -615,6 +615,7 @@ class ServerOptions(Group):
     multidata: str | None = None
     savefile: str | None = None
     disable_save: bool = False
+    disable_save_journal: bool = False
     loglevel: str = "info"
     logtime: bool = False
     server_password: ServerPassword | None = None
@@ -687,6 +688,15 @@ class GeneratorOptions(Group):
         start_inventory -> Move remaining items to start_inventory, generate additional filler items to fill locations.
         """
 
+    class MultidataFormat(IntEnum):
+        """
+        Format of the .archipelago file written for the server
+        3 -> Can be opened by all servers and trackers
+        4 -> Lets the server load slot data and other large parts only when needed. Needs this version or newer
+        """
+        COMPATIBLE = 3
+        SECTIONS = 4
+
     enemizer_path: EnemizerPath = EnemizerPath("EnemizerCLI/EnemizerCLI.Core")  # + ".exe" is implied on Windows
     player_files_path: PlayerFilesPath = PlayerFilesPath("Players")
     players: Players = Players(0)
@@ -696,6 +706,7 @@ class GeneratorOptions(Group):
     race: Race = Race(0)
     plando_options: PlandoOptions = PlandoOptions("bosses, connections, texts")
     panic_method: PanicMethod = PanicMethod("swap")
+    multidata_format: MultidataFormat = MultidataFormat(3)
     loglevel: str = "info"
     logtime: bool = False
 
@@ -0,0 +1,55 @@
+"""Micro benchmark comparing the json codecs of NetUtils on ReceivedItems and PrintJSON packets of a release"""
+
+import typing
+from random import Random
+from timeit import timeit
+
+
+def generate_received_items(count: int) -> typing.List[dict]:
+    from NetUtils import NetworkItem
+
+    r = Random(0)
+    items = [NetworkItem(r.randint(1000, 1999), r.randint(1000, 1999), r.randint(1, 50),
+                         r.choice((0, 0, 0, 0, 0, 0, 0, 1, 2, 3)))
+             for _ in range(count)]
+    return [{"cmd": "ReceivedItems", "index": 0, "items": items}]
+
+
+def generate_print_json(count: int) -> typing.List[dict]:
+    from MultiServer import json_format_send_event
+    from NetUtils import NetworkItem
+
+    r = Random(0)
+    return [json_format_send_event(NetworkItem(r.randint(1000, 1999), r.randint(1000, 1999), r.randint(1, 50),
+                                               r.choice((0, 0, 0, 0, 0, 0, 0, 1, 2, 3))), r.randint(1, 50))
+            for _ in range(count)]
+
+
+def run_json_codec_benchmark(number: int = 200) -> None:
+    from NetUtils import JSONCodec, OrjsonCodec, StdlibJSONCodec
+
+    codecs: typing.List[JSONCodec] = [StdlibJSONCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        print("orjson not available")
+
+    corpus = {
+        "ReceivedItems x1000": generate_received_items(1000),
+        "PrintJSON x140": generate_print_json(140),  # chunk size of register_location_checks
+        "PrintJSON x1": generate_print_json(1),
+    }
+    for name, packet in corpus.items():
+        text = codecs[0].encode(packet)
+        print(f"{name}, {len(text)} characters, {number} times")
+        for codec in codecs:
+            assert codec.encode(packet) == text, f"{codec.name} output differs"
+            encode_time = timeit(lambda: codec.encode(packet), number=number)
+            decode_time = timeit(lambda: codec.decode(text), number=number)
+            print(f"  {codec.name:>6}: encode {encode_time * 1000:.1f}ms, decode {decode_time * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    import path_change
+    path_change.change_home()
+    run_json_codec_benchmark()
@@ -0,0 +1,80 @@
+"""
+Micro benchmark of LocationStore.find_item and get_for_player, as used by !hint and !collect, comparing the
+receiver index of both implementations to going through all locations, by hand and in unindexed stores.
+"""
+
+import random
+import typing
+from timeit import timeit
+
+RawLocations = typing.Dict[int, typing.Dict[int, typing.Tuple[int, int, int]]]
+
+
+def make_locations(players: int, locations_per_player: int, items_per_game: int) -> RawLocations:
+    r = random.Random(0)
+    return {
+        sender: {
+            location: (r.randrange(items_per_game), r.randint(1, players), r.choice((0, 0, 0, 1, 2)))
+            for location in range(1000, 1000 + locations_per_player)
+        }
+        for sender in range(1, players + 1)
+    }
+
+
+def scan_find_item(locations: RawLocations, slots: typing.Set[int], seeked_item_id: int
+                   ) -> typing.List[typing.Tuple[int, int, int, int, int]]:
+    return [(finding_player, location_id, item_id, receiving_player, item_flags)
+            for finding_player, check_data in locations.items()
+            for location_id, (item_id, receiving_player, item_flags) in check_data.items()
+            if receiving_player in slots and item_id == seeked_item_id]
+
+
+def scan_get_for_player(locations: RawLocations, slot: int) -> typing.Dict[int, typing.Set[int]]:
+    all_locations: typing.Dict[int, typing.Set[int]] = {}
+    for source_slot, location_data in locations.items():
+        for location_id, values in location_data.items():
+            if values[1] == slot:
+                all_locations.setdefault(source_slot, set()).add(location_id)
+    return all_locations
+
+
+def run_location_store_benchmark(players: int = 100, locations_per_player: int = 1000, number: int = 100) -> None:
+    from NetUtils import LocationStore, _LocationStore
+
+    locations = make_locations(players, locations_per_player, 200)
+    stores: typing.Dict[str, typing.Any] = {
+        "python": _LocationStore(locations),
+        "python unindexed": _LocationStore(locations, index_receivers=False),
+    }
+    if LocationStore is not _LocationStore:
+        stores["speedups"] = LocationStore(locations)
+        stores["speedups unindexed"] = LocationStore(locations, index_receivers=False)
+
+    print(f"{players} players with {locations_per_player} locations each, {number} calls each")
+    for store in stores.values():
+        assert list(store.find_item({1}, 1)) == scan_find_item(locations, {1}, 1)
+        assert list(store.find_item({1, 2, 3}, 1)) == scan_find_item(locations, {1, 2, 3}, 1)
+        assert store.get_for_player(1) == scan_get_for_player(locations, 1)
+
+    print(f"  scan find_item single slot: {timeit(lambda: scan_find_item(locations, {1}, 1), number=number):.4f}s")
+    for name, store in stores.items():
+        time = timeit(lambda: list(store.find_item({1}, 1)), number=number)
+        print(f"  {name} find_item single slot: {time:.4f}s")
+    print(f"  scan find_item three slots: "
+          f"{timeit(lambda: scan_find_item(locations, {1, 2, 3}, 1), number=number):.4f}s")
+    for name, store in stores.items():
+        time = timeit(lambda: list(store.find_item({1, 2, 3}, 1)), number=number)
+        print(f"  {name} find_item three slots: {time:.4f}s")
+    print(f"  scan get_for_player: {timeit(lambda: scan_get_for_player(locations, 1), number=number):.4f}s")
+    for name, store in stores.items():
+        time = timeit(lambda: store.get_for_player(1), number=number)
+        print(f"  {name} get_for_player: {time:.4f}s")
+    for name, location_type in (("python", _LocationStore), ("speedups", LocationStore)):
+        if name in stores:
+            print(f"  {name} construction: {timeit(lambda: location_type(locations), number=1):.4f}s")
+
+
+if __name__ == "__main__":
+    import path_change
+    path_change.change_home()
+    run_location_store_benchmark()
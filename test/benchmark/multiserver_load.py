@@ -0,0 +1,345 @@
+"""
+Load test of MultiServer: hosts a multiworld with MultiServer.main in a child process and drives simulated websocket
+clients against it over localhost, reporting command latency, throughput, event loop lag and memory use of the server.
+
+Without --multidata a synthetic multiworld of a made up game is generated, so no world has to be generated first.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import tempfile
+import typing
+
+if typing.TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+    from NetUtils import MultiData
+
+commands = ("LocationChecks", "LocationScouts", "Set", "Bounce")
+load_test_game = "Load Test"
+
+
+def make_multidata(players: int, locations_per_player: int, items_per_game: int = 200) -> "MultiData":
+    """Generates a multiworld of a made up game, with the data package embedded so any server can host it."""
+    from NetUtils import NetworkSlot, SlotType
+    from Utils import version_tuple
+    from worlds.AutoWorld import data_package_checksum
+
+    r = random.Random(0)
+    item_name_to_id = {f"Item {item}": item for item in range(1000, 1000 + items_per_game)}
+    location_name_to_id = {f"Location {location}": location
+                           for location in range(1000, 1000 + locations_per_player)}
+    package = {"item_name_to_id": item_name_to_id, "location_name_to_id": location_name_to_id}
+    package["checksum"] = data_package_checksum(package)
+    package.update(item_name_groups={"Everything": sorted(item_name_to_id)}, location_name_groups={})
+    slots = range(1, players + 1)
+    return {
+        "slot_data": {slot: {} for slot in slots},
+        "slot_info": {slot: NetworkSlot(f"Player{slot}", load_test_game, SlotType.player) for slot in slots},
+        "connect_names": {f"Player{slot}": (0, slot) for slot in slots},
+        "locations": {
+            slot: {location: (r.choice(tuple(item_name_to_id.values())), r.choice(slots), r.choice((0, 0, 0, 1, 2)))
+                   for location in location_name_to_id.values()}
+            for slot in slots
+        },
+        "checks_in_area": {},
+        "server_options": {},
+        "er_hint_data": {},
+        "precollected_items": {slot: [] for slot in slots},
+        "precollected_hints": {slot: set() for slot in slots},
+        "version": (version_tuple.major, version_tuple.minor, version_tuple.build),
+        "tags": ["AP"],
+        "minimum_versions": {"server": (0, 5, 0), "clients": {slot: (0, 5, 0) for slot in slots}},
+        "seed_name": "LoadTest",
+        "spheres": [],
+        "datapackage": {load_test_game: package},
+        "race_mode": 0,
+    }
+
+
+def write_multidata(multidata: "MultiData", path: str) -> None:
+    from NetUtils import compress_multidata
+
+    with open(path, "wb") as f:
+        f.write(compress_multidata(multidata))
+
+
+def read_multidata(path: str) -> "MultiData":
+    from MultiServer import Context
+
+    if path.lower().endswith(".zip"):
+        import zipfile
+        with zipfile.ZipFile(path) as zf:
+            data = next(zf.read(file) for file in zf.namelist() if file.endswith(".archipelago"))
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    return Context.decompress(data)
+
+
+def serve(server_arguments: typing.List[str], connection: "Connection") -> None:
+    """Runs MultiServer.main in a child process, measuring event loop lag and memory between "start" and "stop"."""
+    import sys
+
+    import MultiServer
+
+    sys.argv = ["MultiServer.py", *server_arguments]
+    # the server is shut down by typing /exit into its console
+    console_input, console = os.pipe()
+    sys.stdin = open(console_input)
+    with open(console, "w") as console_output:
+        asyncio.run(_serve(MultiServer.parse_args(), connection, console_output))
+
+
+async def _serve(args: argparse.Namespace, connection: "Connection", console: typing.TextIO) -> None:
+    import MultiServer
+
+    loop = asyncio.get_running_loop()
+    lags: typing.List[float] = []
+
+    async def probe(interval: float = 0.01) -> None:
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(loop.time() - start - interval)
+
+    server_task = asyncio.create_task(MultiServer.main(args))
+    assert await loop.run_in_executor(None, connection.recv) == "start"
+    probe_task = asyncio.create_task(probe())
+    assert await loop.run_in_executor(None, connection.recv) == "stop"
+    probe_task.cancel()
+    connection.send({"lags": lags, **get_memory()})
+    console.write("/exit\n")
+    console.flush()
+    await server_task
+
+
+def get_memory() -> typing.Dict[str, int]:
+    memory: typing.Dict[str, int] = {}
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        memory["rss"] = psutil.Process().memory_info().rss
+    try:
+        import resource
+    except ModuleNotFoundError:
+        pass  # unix only module
+    else:
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory["peak_rss"] = peak if sys.platform == "darwin" else peak * 1024
+    return memory
+
+
+class LoadClient:
+    """A player slot sending a random mix of commands, waiting for the answer of each before sending the next."""
+    name: str
+    game: str
+    slot: int
+    locations: typing.List[int]
+    unchecked: typing.List[int]
+    latencies: typing.Dict[str, typing.List[float]]
+    received: int = 0
+    socket: typing.Any = None
+    _waiting: typing.Optional[typing.Tuple[str, typing.Callable[[dict], bool], "asyncio.Future[None]"]] = None
+    _probes: int = 0
+
+    def __init__(self, name: str, game: str, slot: int, locations: typing.Iterable[int], seed: int) -> None:
+        self.name = name
+        self.game = game
+        self.slot = slot
+        self.locations = sorted(locations)
+        self.random = random.Random(seed)
+        self.unchecked = self.random.sample(self.locations, len(self.locations))
+        self.latencies = {command: [] for command in commands}
+
+    async def connect(self, address: str) -> None:
+        import websockets
+        from NetUtils import decode, encode
+        from Utils import version_tuple
+
+        self.socket = await websockets.connect(address, ping_timeout=None, ping_interval=None, max_size=None)
+        await self.socket.recv()  # RoomInfo
+        await self.socket.send(encode([{"cmd": "Connect", "password": None, "game": self.game, "name": self.name,
+                                        "uuid": f"load-test-{self.slot}", "version": version_tuple,
+                                        "items_handling": 0b111, "tags": ["AP"], "slot_data": False}]))
+        while True:
+            for packet in decode(await self.socket.recv()):
+                if packet["cmd"] == "ConnectionRefused":
+                    raise ConnectionError(f"{self.name} was refused: {packet['errors']}")
+                if packet["cmd"] == "Connected":
+                    return
+
+    async def read(self) -> None:
+        from NetUtils import decode
+
+        async for message in self.socket:
+            for packet in decode(message):
+                self.received += 1
+                if self._waiting and packet["cmd"] == self._waiting[0] and self._waiting[1](packet):
+                    self._waiting[2].set_result(None)
+                    self._waiting = None
+
+    def make_command(self, command: str) -> typing.Tuple[dict, str, typing.Callable[[dict], bool]]:
+        """Returns a packet and the answer to wait for."""
+        if command == "LocationChecks":
+            location = self.unchecked.pop()
+            return ({"cmd": "LocationChecks", "locations": [location]}, "RoomUpdate",
+                    lambda packet: location in packet.get("checked_locations", ()))
+        if command == "LocationScouts":
+            return ({"cmd": "LocationScouts", "locations": self.random.sample(self.locations, 10)}, "LocationInfo",
+                    lambda packet: True)
+        if command == "Set":
+            key = f"load_test_{self.slot}"
+            return ({"cmd": "Set", "key": key, "default": 0, "want_reply": True,
+                     "operations": [{"operation": "add", "value": 1}]}, "SetReply",
+                    lambda packet: packet["key"] == key)
+        self._probes += 1
+        probe = self._probes
+        return ({"cmd": "Bounce", "slots": [self.slot], "data": {"probe": probe}}, "Bounced",
+                lambda packet: packet.get("data", {}).get("probe") == probe)
+
+    async def run(self, mix: typing.Dict[str, int], deadline: float, interval: float) -> None:
+        from NetUtils import encode
+
+        loop = asyncio.get_running_loop()
+        population, weights = zip(*mix.items())
+        while loop.time() < deadline:
+            command = self.random.choices(population, weights)[0]
+            if command == "LocationChecks" and not self.unchecked:
+                command = "LocationScouts"
+            packet, answer, check = self.make_command(command)
+            future = loop.create_future()
+            self._waiting = answer, check, future
+            start = loop.time()
+            await self.socket.send(encode([packet]))
+            await future
+            self.latencies[command].append(loop.time() - start)
+            if interval:
+                await asyncio.sleep(self.random.uniform(0, 2 * interval))
+
+
+def format_times(times: typing.List[float]) -> str:
+    if len(times) < 2:
+        return f"{len(times)} samples"
+    percentiles = statistics.quantiles(times, n=100)
+    return (f"p50 {percentiles[49] * 1000:.2f}ms, p99 {percentiles[98] * 1000:.2f}ms, "
+            f"max {max(times) * 1000:.2f}ms, {len(times)} samples")
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(address: str, clients: typing.List[LoadClient], mix: typing.Dict[str, int], duration: float,
+                interval: float, connection: "Connection", timeout: float = 120) -> float:
+    """Connects all clients once the server is up, then runs them for duration seconds."""
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + timeout
+    while True:
+        try:
+            await clients[0].connect(address)
+            break
+        except OSError:
+            if loop.time() > give_up:
+                raise
+            await asyncio.sleep(0.5)
+    await asyncio.gather(*(client.connect(address) for client in clients[1:]))
+    readers = [asyncio.create_task(client.read()) for client in clients]
+
+    connection.send("start")
+    start = loop.time()
+    await asyncio.gather(*(client.run(mix, start + duration, interval) for client in clients))
+    elapsed = loop.time() - start
+    connection.send("stop")
+
+    await asyncio.gather(*(client.socket.close() for client in clients))
+    await asyncio.gather(*readers, return_exceptions=True)
+    return elapsed
+
+
+def run_multiserver_load_benchmark(clients: int = 20, duration: float = 10, mix: str = "",
+                                   interval: float = 0, players: int = 0, locations_per_player: int = 500,
+                                   multidata: str = "", server_loglevel: str = "warning") -> None:
+    import multiprocessing
+    from Utils import format_SI_prefix
+
+    weights = {command: 1 for command in commands}
+    if mix:
+        weights = {command: int(weight) for command, weight in (part.split("=") for part in mix.split(","))}
+        if unknown := weights.keys() - set(commands):
+            raise ValueError(f"Unknown commands {unknown} in mix, known are {commands}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if multidata:
+            data = read_multidata(multidata)
+        else:
+            data = make_multidata(players or clients, locations_per_player)
+            multidata = os.path.join(temp_dir, "LoadTest.archipelago")
+            write_multidata(data, multidata)
+        names = sorted(data["connect_names"].items(), key=lambda name_and_slot: name_and_slot[1])[:clients]
+        load_clients = [LoadClient(name, data["slot_info"][slot].game, slot, data["locations"].get(slot, {}), slot)
+                        for name, (team, slot) in names]
+        if len(load_clients) < clients:
+            print(f"Only {len(load_clients)} slots to connect to")
+
+        port = get_free_port()
+        server_connection, connection = multiprocessing.Pipe()
+        server = multiprocessing.get_context("spawn").Process(
+            target=serve, args=([multidata, "--host", "127.0.0.1", "--port", str(port), "--disable_save",
+                                 "--loglevel", server_loglevel, "--auto_shutdown", "0"], server_connection),
+            name="MultiServer load test")
+        server.start()
+        try:
+            elapsed = asyncio.run(drive(f"ws://127.0.0.1:{port}", load_clients, weights, duration, interval,
+                                        connection))
+            report = connection.recv()
+        finally:
+            server.join(10)
+            if server.is_alive():
+                server.terminate()
+
+    print(f"{len(load_clients)} clients of {len(data['slot_info'])} slots for {elapsed:.1f}s, mix {weights}")
+    all_latencies = []
+    for command in commands:
+        latencies = [latency for client in load_clients for latency in client.latencies[command]]
+        all_latencies += latencies
+        if latencies:
+            print(f"  {command}: {format_times(latencies)}")
+    print(f"  all commands: {format_times(all_latencies)}")
+    print(f"  {len(all_latencies) / elapsed:.0f} commands/s sent, "
+          f"{sum(client.received for client in load_clients) / elapsed:.0f} packets/s received")
+    print(f"  server event loop lag: {format_times(report['lags'])}")
+    for key, name in (("rss", "RSS"), ("peak_rss", "peak RSS")):
+        if key in report:
+            print(f"  server {name}: {format_SI_prefix(report[key], 1024)}iB")
+
+
+if __name__ == "__main__":
+    import path_change
+    path_change.change_home()
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=20, help="Number of simulated clients, one per slot.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to send commands for.")
+    parser.add_argument("--mix", default="",
+                        help=f"Relative weights of the commands sent, such as LocationChecks=4,Set=1. "
+                             f"Known commands are {', '.join(commands)}, each weighs 1 by default.")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Average seconds a client waits between commands, 0 sends the next one right away.")
+    parser.add_argument("--players", type=int, default=0,
+                        help="Slots in the generated multiworld, defaults to the number of clients.")
+    parser.add_argument("--locations", type=int, default=500, help="Locations per slot in the generated multiworld.")
+    parser.add_argument("--multidata", default="", help="Host this .archipelago or .zip instead of a generated one.")
+    parser.add_argument("--server_loglevel", default="warning", choices=["debug", "info", "warning", "error"])
+    options = parser.parse_args()
+    run_multiserver_load_benchmark(options.clients, options.duration, options.mix, options.interval,
+                                   options.players, options.locations, options.multidata, options.server_loglevel)
@@ -463,6 +463,37 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertEqual(1, len(player1.prog_items))
         self.assertIsNot(loc0.item, player1.prog_items[0], "Filled item was still present in item pool")
 
+    def test_single_player_placement_removes_filled_locations(self):
+        """Test that single player placement only removes the filled locations, keeping the order of the others"""
+        multiworld = generate_test_multiworld(2)
+        player1 = generate_player_data(multiworld, 1, 3, 2)
+        player2 = generate_player_data(multiworld, 2, 2, 0)
+        locations = [player2.locations[0], *player1.locations, player2.locations[1]]
+
+        fill_restrictive(multiworld, multiworld.state, locations, player1.prog_items.copy(),
+                         single_player_placement=True)
+
+        self.assertEqual(player1.locations[0].item, player1.prog_items[1])
+        self.assertEqual(player1.locations[1].item, player1.prog_items[0])
+        self.assertEqual([player2.locations[0], player1.locations[2], player2.locations[1]], locations)
+
+    def test_always_allow_unreachable_location(self):
+        """Test that an unreachable location is still filled if it always allows the item"""
+        multiworld = generate_test_multiworld()
+        player1 = generate_player_data(multiworld, 1, 2, 2)
+        items = player1.prog_items
+        locations = player1.locations
+
+        multiworld.completion_condition[player1.id] = lambda state: state.has_all(
+            (items[0].name, items[1].name), player1.id)
+        set_rule(locations[0], lambda state: False)
+        locations[0].always_allow = lambda state, item: item == items[1]
+
+        fill_restrictive(multiworld, multiworld.state, locations.copy(), items.copy())
+
+        self.assertEqual(locations[0].item, items[1])
+        self.assertEqual(locations[1].item, items[0])
+
 
 class TestDistributeItemsRestrictive(unittest.TestCase):
     def test_basic_distribute(self):
@@ -0,0 +1,40 @@
+import unittest
+
+from BaseClasses import CollectionState, Entrance
+from generation_profile import GenerationProfile
+from worlds.generic.Rules import add_rule, set_rule
+from . import generate_locations, generate_test_multiworld
+
+
+class TestGenerationProfile(unittest.TestCase):
+    def test_stop_sampling(self) -> None:
+        """Access rules are back to their original functions, and combined wrappers stop counting calls."""
+        multiworld = generate_test_multiworld()
+        region = multiworld.get_region("Menu", 1)
+        untouched, added_to, replaced = generate_locations(3, 1, region)
+
+        def rule(state) -> bool:
+            return True
+
+        def other_rule(state) -> bool:
+            return True
+
+        set_rule(untouched, rule)
+        set_rule(added_to, rule)
+        set_rule(replaced, rule)
+        profile = GenerationProfile(sample_every=1)
+        profile.sample_rules(multiworld)
+        add_rule(added_to, other_rule)
+        set_rule(replaced, other_rule)
+        state = CollectionState(multiworld)
+        self.assertTrue(added_to.can_reach(state))
+        timing = next(timing for timing in profile.rules if timing.spot is added_to)
+        self.assertEqual((timing.calls, timing.samples), (1, 1))
+        profile.stop_sampling()
+
+        self.assertIs(untouched.access_rule, rule)
+        self.assertIs(replaced.access_rule, other_rule)
+        for entrance in multiworld.get_entrances():
+            self.assertIs(entrance.access_rule, Entrance.access_rule)
+        self.assertTrue(added_to.can_reach(state))
+        self.assertEqual((timing.calls, timing.samples), (1, 1))
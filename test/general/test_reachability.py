@@ -1,8 +1,8 @@
 import unittest
 
-from BaseClasses import CollectionState
+from BaseClasses import CollectionState, Location, Region
 from worlds.AutoWorld import AutoWorldRegister
-from . import setup_solo_multiworld, gen_steps
+from . import generate_test_multiworld, setup_solo_multiworld, gen_steps
 
 
 class TestBase(unittest.TestCase):
@@ -79,3 +79,45 @@ class TestBase(unittest.TestCase):
                             locations.add(location)
                     self.assertGreater(len(locations), 0,
                                        msg="Need to be able to reach at least one location to get started.")
+
+
+class TestRuleTracing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.gated = Region("Gated", 1, self.multiworld)
+        self.multiworld.regions.append(self.gated)
+        self.menu.connect(self.gated, "Gate", lambda state: state.has("Key", 1))
+
+    def test_traces_item_reads(self) -> None:
+        """Ensure reads of every player's items are recorded, including those through the state helpers"""
+        state = CollectionState(self.multiworld)
+        reachable, dependencies = state.trace_rule(
+            lambda state: state.has_any(("A", "B"), 1) or state.has_all_counts({"C": 2}, 2))
+        self.assertFalse(reachable)
+        self.assertEqual({(1, "A"), (1, "B"), (2, "C")}, dependencies.items)
+        self.assertEqual(set(), dependencies.regions)
+        self.assertFalse(dependencies.opaque)
+
+    def test_traces_region_reads(self) -> None:
+        """Ensure rules checking reachability record whose regions they looked at"""
+        state = CollectionState(self.multiworld)
+        reachable, dependencies = state.trace_rule(lambda state: state.can_reach_region("Gated", 1))
+        self.assertFalse(reachable)
+        self.assertEqual({1}, dependencies.regions)
+        self.assertFalse(dependencies.opaque)
+
+    def test_traces_opaque_reads(self) -> None:
+        """Ensure rules reading prog_items as a whole are reported as opaque"""
+        state = CollectionState(self.multiworld)
+        _, dependencies = state.trace_rule(lambda state: sum(state.prog_items[1].values()) > 0)
+        self.assertTrue(dependencies.opaque)
+
+    def test_rule_dependencies(self) -> None:
+        """Ensure dependencies are exported for locations and entrances"""
+        location = Location(1, "Location", None, self.gated)
+        location.access_rule = lambda state: state.has("Lamp", 1)
+        self.gated.locations.append(location)
+        dependencies = self.multiworld.trace_rule_dependencies(CollectionState(self.multiworld))
+        self.assertEqual({(1, "Lamp")}, dependencies[location].items)
+        self.assertEqual({(1, "Key")}, dependencies[self.multiworld.get_entrance("Gate", 1)].items)
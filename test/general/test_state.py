@@ -1,7 +1,9 @@
 import unittest
+from collections import Counter
 
+from BaseClasses import CollectionState, IndexedItemCounter, Item, ItemClassification, Region
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from . import generate_items, generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +29,210 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestStateCopy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        self.items = generate_items(2, 1, True)
+        for player in self.multiworld.player_ids:
+            menu = self.multiworld.get_region("Menu", player)
+            region = Region("Locked", player, self.multiworld)
+            self.multiworld.regions.append(region)
+            menu.connect(region, "Door", lambda state: state.has(self.items[0].name, 1))
+
+    def test_copies_are_independent(self) -> None:
+        """Ensure writes to a copied state and its original don't leak into each other"""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.multiworld.get_region("Locked", 1).can_reach(state))
+        copied_state = state.copy()
+        copied_state.collect(self.items[0], True)
+        self.assertTrue(self.multiworld.get_region("Locked", 1).can_reach(copied_state))
+        self.assertFalse(self.multiworld.get_region("Locked", 1).can_reach(state))
+        self.assertEqual(state.count(self.items[0].name, 1), 0)
+
+        state.collect(self.items[1], True)
+        state.set_item("Direct Write", 2, 1)
+        self.assertEqual(copied_state.count(self.items[1].name, 1), 0)
+        self.assertFalse(copied_state.has("Direct Write", 2))
+        self.assertEqual(copied_state.prog_items, {1: {self.items[0].name: 1}, 2: {}})
+        self.assertEqual(state.prog_items, {1: {self.items[1].name: 1}, 2: {"Direct Write": 1}})
+
+    def test_copy_of_copy(self) -> None:
+        """Ensure values shared between more than two states are only ever written by their owner"""
+        state = CollectionState(self.multiworld)
+        state.collect(self.items[0], True)
+        first_copy = state.copy()
+        second_copy = first_copy.copy()
+        second_copy.remove(self.items[0])
+        self.assertTrue(state.has(self.items[0].name, 1))
+        self.assertTrue(first_copy.has(self.items[0].name, 1))
+        self.assertFalse(second_copy.has(self.items[0].name, 1))
+        self.assertEqual(len(second_copy.prog_items), 2)
+        self.assertIn(2, second_copy.reachable_regions)
+
+    def test_copy_while_in_use(self) -> None:
+        """Ensure a copy taken by an access rule while regions are updated doesn't see the rest of the update"""
+        copies = []
+        locked = self.multiworld.get_region("Locked", 1)
+        beyond = Region("Beyond", 1, self.multiworld)
+        self.multiworld.regions.append(beyond)
+        locked.connect(beyond, "Copying Door", lambda state: copies.append(state.copy()) or True)
+        state = CollectionState(self.multiworld)
+        state.collect(self.items[0], True)
+        self.assertTrue(beyond.can_reach(state))
+        self.assertEqual(len(copies), 1)
+        self.assertIn(locked, copies[0].reachable_regions[1])
+        self.assertNotIn(beyond, copies[0].reachable_regions[1])
+
+    def test_copy_on_write(self) -> None:
+        """Ensure copies only copy the values of a player once they write to them"""
+        state = CollectionState(self.multiworld)
+        counter = state.prog_items[1]
+        copied_state = state.copy()
+        self.assertFalse(copied_state.has(self.items[0].name, 1))
+        self.assertIs(copied_state.prog_items[1], counter)
+        copied_state.collect(self.items[0], True)
+        self.assertIsNot(copied_state.prog_items[1], counter)
+        self.assertIs(state.prog_items[1], counter)
+        self.assertIs(copied_state.prog_items[2], state.prog_items[2])
+        state.collect(self.items[1], True)
+        self.assertIsNot(state.prog_items[1], counter)
+        self.assertEqual(copied_state.count(self.items[1].name, 1), 0)
+        self.assertEqual(counter, Counter())
+
+    def test_reads_do_not_copy(self) -> None:
+        """Ensure reaching regions that were already reached before copying doesn't copy a player's values"""
+        state = CollectionState(self.multiworld)
+        locked = self.multiworld.get_region("Locked", 1)
+        self.assertFalse(locked.can_reach(state))
+        counter = state.prog_items[1]
+        regions = state.reachable_regions[1]
+        copied_state = state.copy()
+        self.assertFalse(locked.can_reach(copied_state))
+        self.assertIs(copied_state.prog_items[1], counter)
+        self.assertIs(copied_state.reachable_regions[1], regions)
+        self.assertIn(1, copied_state.shared_players)
+
+    def test_own_player(self) -> None:
+        """Ensure direct writes after own_player don't leak into other states"""
+        state = CollectionState(self.multiworld)
+        copied_state = state.copy()
+        copied_state.own_player(1)
+        copied_state.prog_items[1][self.items[0].name] += 1
+        self.assertEqual(state.count(self.items[0].name, 1), 0)
+        self.assertNotIn(1, copied_state.shared_players)
+        self.assertIn(1, state.shared_players)
+
+
+class TestIndexedItemCounter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        self.items = generate_items(2, 1, True)
+        self.multiworld.itempool += self.items
+        self.multiworld.worlds[1].interned_prog_items = True
+        self.multiworld.index_prog_items()
+        menu = self.multiworld.get_region("Menu", 1)
+        region = Region("Locked", 1, self.multiworld)
+        self.multiworld.regions.append(region)
+        menu.connect(region, "Door", lambda state: state.has(self.items[0].name, 1))
+
+    def test_interned_players(self) -> None:
+        """Ensure only the players of worlds opting in count their items in an IndexedItemCounter"""
+        state = CollectionState(self.multiworld)
+        self.assertIsInstance(state.prog_items[1], IndexedItemCounter)
+        self.assertIs(type(state.prog_items[2]), Counter)
+        self.assertEqual(2, len(state.prog_items[1].index))
+
+    def test_counts(self) -> None:
+        """Ensure the counter behaves like a Counter for names in and outside its index"""
+        state = CollectionState(self.multiworld)
+        state.collect(self.items[0], True)
+        state.add_item(self.items[0].name, 1, 2)
+        state.add_item("Not Indexed", 1)
+        self.assertEqual(3, state.count(self.items[0].name, 1))
+        self.assertTrue(state.has("Not Indexed", 1))
+        self.assertFalse(state.has(self.items[1].name, 1))
+        self.assertEqual({self.items[0].name: 3, "Not Indexed": 1}, dict(state.prog_items[1]))
+        self.assertEqual(4, state.prog_items[1].total())
+        state.remove_item(self.items[0].name, 1, 3)
+        state.set_item("Not Indexed", 1, 0)
+        self.assertEqual(0, len(state.prog_items[1]))
+        self.assertNotIn(self.items[0].name, state.prog_items[1])
+
+    def test_copies_are_independent(self) -> None:
+        """Ensure copies of an interned state don't share their counts and reachability still updates"""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.multiworld.get_region("Locked", 1).can_reach(state))
+        copied_state = state.copy()
+        copied_state.collect(self.items[0], True)
+        self.assertTrue(self.multiworld.get_region("Locked", 1).can_reach(copied_state))
+        self.assertFalse(self.multiworld.get_region("Locked", 1).can_reach(state))
+        self.assertEqual(0, state.count(self.items[0].name, 1))
+
+
+class TestGroupCounts(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(1)
+        self.multiworld.worlds[1].item_name_groups = {"Keys": {"Small Key", "Big Key"}, "Big": {"Big Key"}}
+        # only "Small Key" is interned, "Big Key" is counted outside of the index
+        self.multiworld.itempool.append(Item("Small Key", ItemClassification.progression, None, 1))
+        self.multiworld.worlds[1].interned_prog_items = True
+        self.multiworld.index_prog_items()
+
+    def assert_group_counts(self, state: CollectionState) -> None:
+        for group, item_names in self.multiworld.worlds[1].item_name_groups.items():
+            counts = [state.prog_items[1][item_name] for item_name in item_names]
+            self.assertEqual(sum(counts), state.count_group(group, 1))
+            self.assertEqual(sum(count > 0 for count in counts), state.count_group_unique(group, 1))
+
+    def test_running_counts(self) -> None:
+        """Ensure group counts follow every way of changing the items in state"""
+        state = CollectionState(self.multiworld)
+        self.assert_group_counts(state)
+        state.add_item("Small Key", 1, 3)
+        state.add_item("Big Key", 1)
+        state.add_item("Lamp", 1)
+        self.assert_group_counts(state)
+        self.assertTrue(state.has_group("Keys", 1, 4))
+        self.assertFalse(state.has_group_unique("Keys", 1, 3))
+        state.remove_item("Small Key", 1, 3)
+        state.set_item("Big Key", 1, 5)
+        self.assert_group_counts(state)
+        self.assertTrue(state.has_group("Big", 1, 5))
+        state.set_item("Big Key", 1, 0)
+        state.prog_items[1]["Small Key"] += 2
+        self.assert_group_counts(state)
+        state.prog_items[1].clear()
+        self.assert_group_counts(state)
+        with self.assertRaises(KeyError):
+            state.has_group("Not A Group", 1)
+
+    def test_copies_are_independent(self) -> None:
+        """Ensure group counts of a copied state don't change with the original"""
+        state = CollectionState(self.multiworld)
+        state.add_item("Small Key", 1, 2)
+        copied_state = state.copy()
+        state.add_item("Big Key", 1)
+        copied_state.remove_item("Small Key", 1)
+        self.assert_group_counts(state)
+        self.assert_group_counts(copied_state)
+        self.assertEqual(1, copied_state.count_group("Keys", 1))
+        self.assertEqual(3, state.count_group("Keys", 1))
+
+    def test_plain_counter(self) -> None:
+        """Ensure worlds without interned items keep a plain Counter and still count their groups"""
+        multiworld = generate_test_multiworld(1)
+        multiworld.worlds[1].item_name_groups = self.multiworld.worlds[1].item_name_groups
+        state = CollectionState(multiworld)
+        self.assertIs(type(state.prog_items[1]), Counter)
+        state.add_item("Small Key", 1, 2)
+        state.add_item("Big Key", 1)
+        self.assert_group_counts(state)
+        self.assertTrue(state.has_group_unique("Keys", 1, 2))
+
+    def test_traced_group_reads(self) -> None:
+        """Ensure tracing a group rule still records the group's items"""
+        state = CollectionState(self.multiworld)
+        _, dependencies = state.trace_rule(lambda state: state.has_group("Keys", 1))
+        self.assertEqual({(1, "Small Key"), (1, "Big Key")}, dependencies.items)
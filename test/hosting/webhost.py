@@ -138,7 +138,7 @@ def stop_room(app_client: "FlaskClient",
 
     from pony.orm import db_session
 
-    from WebHostLib.models import Command, Room
+    from WebHostLib.models import Command, Room, notify_command_added
     from WebHostLib import app
 
     poll_interval = 2
@@ -161,6 +161,7 @@ def stop_room(app_client: "FlaskClient",
             original_timeout = room.timeout
             room.timeout = 1  # avoid spinning it up again
             Command(room=room, commandtext="/exit")
+            notify_command_added()
 
     try:
         if address and timeout is not None:
@@ -0,0 +1,80 @@
+# Tests for the codecs behind NetUtils.encode and NetUtils.decode
+import collections
+import typing
+import unittest
+from unittest import mock
+
+from NetUtils import (Hint, HintStatus, JSONCodec, NetworkItem, NetworkSlot, OrjsonCodec, SlotType, StdlibJSONCodec,
+                      decode, encode)
+from Utils import Version
+
+samples: typing.List[typing.Any] = [
+    [{"cmd": "ReceivedItems", "index": 0, "items": [NetworkItem(1, 2, 3, 1), NetworkItem(4, -2, 0)]}],
+    [{"cmd": "PrintJSON", "type": "ItemSend", "receiving": 2, "item": NetworkItem(1, 2, 3),
+      "data": [{"text": "a\u0001\n\"é😀 "}, {"type": "player_id", "text": "1"}]}],
+    {1: {2, 3}, "x": frozenset({4}), "version": Version(0, 6, 1), "slot": NetworkSlot("a", "b", SlotType.player)},
+    {"hint": Hint(1, 2, 3, 4, False, status=HintStatus.HINT_PRIORITY), True: None, 2.5: (1, (2, 3))},
+    [0.1, 1.5e-5, 1e16, -2.5e-300, float("nan"), float("inf"), float("-inf")],
+    [2 ** 63 - 1, -2 ** 63, 2 ** 64, -2 ** 70],
+    {"nested": [({"deep": 1e20},)], 1e-5: "key", "counter": collections.Counter({"a": float("nan")})},
+    "text", 12, 0.5, None, [], {},
+]
+
+
+class TestJSONCodecs(unittest.TestCase):
+    codecs: typing.List[JSONCodec]
+
+    def setUp(self) -> None:
+        self.codecs = [StdlibJSONCodec()]
+        try:
+            self.codecs.append(OrjsonCodec())
+        except ImportError:
+            pass
+
+    def test_round_trip(self) -> None:
+        packet = [{"cmd": "ReceivedItems", "index": 0, "items": [NetworkItem(1, 2, 3, 1)]},
+                  {"cmd": "Connected", "version": Version(0, 6, 1)}]
+        self.assertEqual(decode(encode(packet)), packet)
+
+    def test_same_output(self) -> None:
+        """All codecs write the same text and read it back the same way."""
+        reference = StdlibJSONCodec()
+        for codec in self.codecs:
+            for sample in samples:
+                with self.subTest(codec=codec.name, sample=sample):
+                    text = codec.encode(sample)
+                    self.assertEqual(text, reference.encode(sample))
+                    # repr, so NaN, -0.0 and the classes of NamedTuples get compared too
+                    self.assertEqual(repr(codec.decode(text)), repr(reference.decode(text)))
+
+    def test_same_input(self) -> None:
+        """All codecs accept and reject the same text."""
+        reference = StdlibJSONCodec()
+        for codec in self.codecs:
+            for text in ("1e400", "-0.0", "[1.0e+2]", '{"a":1,"a":2}', '"\\ud800"', "NaN", "[Infinity]",
+                         "123456789012345678901234567890", '{"a":[{"b":-99999999999999999999}]}',
+                         '{"class":"NetworkItem","item":1,"location":2,"player":3,"flags":0,"extra":4}'):
+                with self.subTest(codec=codec.name, text=text):
+                    self.assertEqual(repr(codec.decode(text)), repr(reference.decode(text)))
+            for text in ("", "{", "[1,]", "'a'"):
+                with self.subTest(codec=codec.name, text=text):
+                    with self.assertRaises(ValueError):
+                        codec.decode(text)
+
+    def test_float_walk_skipped(self) -> None:
+        """The orjson codec only looks for floats in packets whose output could contain one it writes differently."""
+        codec = next((codec for codec in self.codecs if isinstance(codec, OrjsonCodec)), None)
+        if not codec:
+            self.skipTest("orjson is not installed")
+        with mock.patch("NetUtils._has_inexact_float", return_value=False) as has_inexact_float:
+            codec.encode(samples[0])
+            codec.encode({"cmd": "Bounced", "data": {"x": 0.5, "y": [1.25, -3.0]}})
+            has_inexact_float.assert_not_called()
+            codec.encode({"cmd": "Bounced", "data": {"text": "1e5"}})
+            has_inexact_float.assert_called_once()
+
+    def test_unserializable(self) -> None:
+        for codec in self.codecs:
+            with self.subTest(codec=codec.name):
+                with self.assertRaises(TypeError):
+                    codec.encode(object())
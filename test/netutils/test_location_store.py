@@ -165,6 +165,17 @@ class Base:
             with self.assertRaises(KeyError):
                 self.store.get_remaining(bad_state, 0, 9999)
 
+        def test_spheres(self) -> None:
+            self.assertEqual(self.store.get_sphere(1, 11), -1)
+            # unknown players and locations are ignored, the first sphere of a location counts
+            self.store.set_spheres([{1: {11}, 6: {1}}, {1: {12, 11, 10}, 2: {23}}])
+            self.assertEqual(self.store.get_sphere(1, 11), 0)
+            self.assertEqual(self.store.get_sphere(1, 12), 1)
+            self.assertEqual(self.store.get_sphere(2, 23), 1)
+            self.assertEqual(self.store.get_sphere(1, 13), -1)
+            self.assertEqual(self.store.get_sphere(1, 10), -1)
+            self.assertEqual(self.store.get_sphere(6, 1), -1)
+
         def test_location_set_intersection(self) -> None:
             locations = {10, 11, 12}
             locations.intersection_update(self.store[1])
@@ -241,6 +252,35 @@ class Base:
             self.assertEqual(len(store[1]), 1)
             self.assertEqual(len(store[2]), 0)
 
+        def test_receiver_without_locations(self) -> None:
+            # items for item link groups go to slots that have no locations
+            store = self.type({
+                1: {1: (5, 3, 0), 2: (5, 1, 1), 4: (6, 3, 0)},
+                2: {3: (5, 3, 0), 5: (5, 1, 0)},
+            })
+            self.assertEqual(list(store.find_item({3}, 5)), [(1, 1, 5, 3, 0), (2, 3, 5, 3, 0)])
+            # same order as going through all locations
+            self.assertEqual(list(store.find_item({1, 3}, 5)),
+                             [(1, 1, 5, 3, 0), (1, 2, 5, 1, 1), (2, 3, 5, 3, 0), (2, 5, 5, 1, 0)])
+            self.assertEqual(list(store.find_item({4}, 5)), [])
+            self.assertEqual(store.get_for_player(3), {1: {1, 4}, 2: {3}})
+            self.assertEqual(list(store.get_for_player(1)), [1, 2])
+
+        def test_unindexed(self) -> None:
+            locations: RawLocations = {
+                2: {3: (5, 3, 0), 5: (5, 1, 0)},
+                1: {1: (5, 3, 0), 2: (5, 1, 1), 4: (6, 3, 0)},
+            }
+            store = self.type(locations)
+            unindexed = self.type(locations, index_receivers=False)
+            for slots in ({1}, {3}, {1, 3}, {4}, set()):
+                self.assertEqual(list(unindexed.find_item(slots, 5)), list(store.find_item(slots, 5)))
+            for slot in (1, 3, 4):
+                self.assertEqual(list(unindexed.get_for_player(slot).items()),
+                                 list(store.get_for_player(slot).items()))
+            # senders in order, independent of the order of the dict
+            self.assertEqual(list(store.get_for_player(1)), [1, 2])
+
 
 class TestPurePythonLocationStore(Base.TestLocationStore):
     """Run base method tests for pure python implementation."""
@@ -249,6 +289,13 @@ class TestPurePythonLocationStore(Base.TestLocationStore):
         super().setUp()
 
 
+class TestPurePythonUnindexedLocationStore(Base.TestLocationStore):
+    """Run base method tests for pure python implementation without receiver index."""
+    def setUp(self) -> None:
+        self.store = _LocationStore(sample_data, index_receivers=False)
+        super().setUp()
+
+
 class TestPurePythonLocationStoreConstructor(Base.TestLocationStoreConstructor):
     """Run base constructor tests for the pure python implementation."""
     def setUp(self) -> None:
@@ -265,6 +312,15 @@ class TestSpeedupsLocationStore(Base.TestLocationStore):
         super().setUp()
 
 
+@unittest.skipIf(LocationStore is _LocationStore and not ci, "_speedups not available")
+class TestSpeedupsUnindexedLocationStore(Base.TestLocationStore):
+    """Run base method tests for cython implementation without receiver index."""
+    def setUp(self) -> None:
+        self.assertFalse(LocationStore is _LocationStore, "Failed to load _speedups")
+        self.store = LocationStore(sample_data, index_receivers=False)
+        super().setUp()
+
+
 @unittest.skipIf(LocationStore is _LocationStore and not ci, "_speedups not available")
 class TestSpeedupsLocationStoreConstructor(Base.TestLocationStoreConstructor):
     """Run base constructor tests and tests the additional constraints for cython implementation."""
@@ -0,0 +1,61 @@
+# Tests for the multidata formats of NetUtils.compress_multidata and NetUtils.decompress_multidata
+import typing
+import unittest
+
+from NetUtils import (Hint, MultiDataContainer, NetworkSlot, SlotType, compress_multidata, decompress_multidata,
+                      multidata_format)
+from Utils import VersionException
+
+
+def make_multidata() -> typing.Dict[str, typing.Any]:
+    return {
+        "slot_data": {1: {"option": 1}, 2: {}},
+        "slot_info": {1: NetworkSlot("A", "Game", SlotType.player), 2: NetworkSlot("B", "Game", SlotType.player)},
+        "connect_names": {"A": (0, 1), "B": (0, 2)},
+        "locations": {1: {10: (20, 2, 1)}, 2: {11: (21, 1, 0)}},
+        "er_hint_data": {1: {10: "Entrance"}},
+        "precollected_hints": {1: {Hint(2, 1, 10, 20, False)}, 2: set()},
+        "seed_name": "123",
+        "spheres": [{1: {10}}, {2: {11}}],
+        "datapackage": {"Game": {"checksum": "abc"}},
+    }
+
+
+class TestMultiData(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        for format_version in (3, multidata_format):
+            with self.subTest(format_version=format_version):
+                multidata = decompress_multidata(compress_multidata(make_multidata(), format_version))
+                self.assertEqual({key: dict(value) if key == "slot_data" else value
+                                  for key, value in multidata.items()}, make_multidata())
+
+    def test_lazy_sections(self) -> None:
+        multidata = decompress_multidata(compress_multidata(make_multidata()))
+        assert isinstance(multidata, MultiDataContainer)
+        self.assertIsNotNone(multidata.raw_section("locations"))
+        self.assertIn("locations", multidata)
+        self.assertEqual(multidata.pop("locations"), make_multidata()["locations"])
+        self.assertNotIn("locations", multidata)
+        self.assertIsNone(multidata.raw_section("locations"))
+        self.assertEqual(multidata["slot_data"][1], {"option": 1})
+        self.assertIs(multidata["slot_data"][1], multidata["slot_data"][1], "slot_data should be decoded once")
+        with self.assertRaises(KeyError):
+            _ = multidata["slot_data"][3]
+
+    def test_rewrite(self) -> None:
+        """Changing part of the container and writing it again keeps the rest."""
+        multidata = decompress_multidata(compress_multidata(make_multidata()))
+        multidata["datapackage"]["Game"] = {"checksum": "def"}
+        multidata["spheres"].append({})
+        multidata["slot_data"][1]["option"] = 2
+        rewritten = decompress_multidata(compress_multidata(multidata))
+        expected = make_multidata()
+        expected["datapackage"]["Game"] = {"checksum": "def"}
+        expected["spheres"].append({})
+        expected["slot_data"][1]["option"] = 2
+        self.assertEqual({key: dict(value) if key == "slot_data" else value for key, value in rewritten.items()},
+                         expected)
+
+    def test_newer_format(self) -> None:
+        with self.assertRaises(VersionException):
+            decompress_multidata(bytes([multidata_format + 1]))
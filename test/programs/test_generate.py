@@ -1,5 +1,6 @@
 # Tests for Generate.py (ArchipelagoGenerate.exe)
 
+import json
 import unittest
 import os
 import os.path
@@ -72,6 +73,25 @@ class TestGenerateMain(unittest.TestCase):
 
         self.assertOutput(self.output_tempdir.name)
 
+    def test_generate_profile(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_generation', '5']
+        print(f'Testing Generate.py {sys.argv} in {os.getcwd()}')
+        multiworld = Main.main(*Generate.main())
+
+        self.assertOutput(self.output_tempdir.name)
+        profile_files = list(Path(self.output_tempdir.name).glob('*_profile.json'))
+        self.assertEqual(len(profile_files), 1)
+        with open(profile_files[0], encoding="utf-8") as f:
+            profile = json.load(f)
+        self.assertIn("1", profile["stages"]["create_regions"]["seconds"])
+        self.assertTrue({"setup", "prefill", "progression", "remaining", "output"} <= profile["phases"].keys())
+        self.assertLessEqual(len(profile["slowest_rules"]), 5)
+        for location in multiworld.get_locations():
+            self.assertFalse(hasattr(location.access_rule, "__wrapped__"), "access rule was not restored")
+
     def test_generate_yaml(self):
         # override host.yaml
         from settings import get_settings
@@ -108,6 +128,7 @@ class TestGenerateWeights(TestGenerateMain):
     # don't need to run these tests
     test_generate_absolute = None
     test_generate_relative = None
+    test_generate_profile = None
 
     def test_generate_yaml(self):
         from settings import get_settings
@@ -1,5 +1,13 @@
+import asyncio
+import os
+import tempfile
+import typing
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+from unittest import mock
+
+from MultiServer import (Client, Context, SaveJournal, SendQueue, ServerCommandProcessor, process_client_cmd,
+                         send_items_to, send_new_items)
+from NetUtils import Hint, HintStatus, NetworkItem
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +46,366 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestSaveJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.save_filename = os.path.join(self.directory.name, "test.apsave")
+
+    def make_context(self) -> Context:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.connect_names = {"Player1": (0, 1)}
+        ctx.save_filename = self.save_filename
+        # saves are triggered by hand below
+        ctx._start_async_saving = lambda *args, **kwargs: None  # type: ignore[method-assign]
+        ctx.init_save()
+        assert ctx.save_journal
+        return ctx
+
+    def make_changes(self, ctx: Context) -> None:
+        ctx.received_items.setdefault((0, 1, True), []).append(NetworkItem(1, 2, 1, 0))
+        ctx.location_checks[0, 1] |= {2, 3}
+        ctx.save_journal.note_location_checks(0, 1, {2, 3})
+        ctx.hints[0, 1].add(Hint(1, 1, 2, 1, False))
+        ctx.save_journal.note_hints(0, 1)
+        ctx.stored_data["key"] = [1, 2]
+        ctx.save_journal.note_stored_data("key")
+        ctx.hints_used[0, 1] = 1
+        ctx.name_aliases[0, 1] = "Alias"
+        ctx.note_save_meta()
+
+    def assert_changes(self, ctx: Context) -> None:
+        self.assertEqual(ctx.received_items[0, 1, True], [NetworkItem(1, 2, 1, 0)])
+        self.assertEqual(ctx.location_checks[0, 1], {2, 3})
+        self.assertEqual(ctx.hints[0, 1], {Hint(1, 1, 2, 1, False)})
+        self.assertEqual(ctx.stored_data["key"], [1, 2])
+        self.assertEqual(ctx.hints_used[0, 1], 1)
+        self.assertEqual(ctx.name_aliases, {(0, 1): "Alias"})
+
+    def test_replay(self) -> None:
+        """Changes written to the journal are restored without a new save file."""
+        ctx = self.make_context()
+        self.assertTrue(ctx._save())  # nothing to load, so this writes the first save file
+        save_size = os.path.getsize(self.save_filename)
+        self.make_changes(ctx)
+        self.assertTrue(ctx._save())
+        self.assertEqual(os.path.getsize(self.save_filename), save_size)
+        journal_size = os.path.getsize(ctx.save_journal.path)
+        self.assertTrue(ctx._save())
+        self.assertEqual(os.path.getsize(ctx.save_journal.path), journal_size, "nothing changed, nothing to write")
+
+        self.assert_changes(self.make_context())
+
+    def test_replay_replaced_hints(self) -> None:
+        """Hints replaced after being journaled are no longer indexed by their location after replaying."""
+        ctx = self.make_context()
+        ctx._save()
+        hint = Hint(1, 1, 2, 1, False)
+        ctx.hints[0, 1].add(hint)
+        ctx.index_hint(0, hint)
+        ctx.save_journal.note_hints(0, 1)
+        ctx._save()
+        ctx.replace_hint(0, 1, hint, hint._replace(item_flags=1))
+        ctx._save()
+
+        loaded = self.make_context()
+        self.assertEqual(loaded.hints[0, 1], {hint._replace(item_flags=1)})
+        self.assertEqual(loaded.location_hints[0, 1, 2], {hint._replace(item_flags=1)})
+
+    def test_meta_noted(self) -> None:
+        """The save meta is journaled only after a change to it was noted."""
+        ctx = self.make_context()
+        ctx._save()
+        journal_size = os.path.getsize(ctx.save_journal.path)
+        ctx.client_game_state[0, 1] = 10
+        self.assertTrue(ctx._save())
+        self.assertEqual(os.path.getsize(ctx.save_journal.path), journal_size)
+        ctx.note_save_meta()
+        self.assertTrue(ctx._save())
+        self.assertGreater(os.path.getsize(ctx.save_journal.path), journal_size)
+        self.assertEqual(self.make_context().client_game_state[0, 1], 10)
+
+    def test_empty_multidata(self) -> None:
+        """An empty multidata file fails to load with an error about its content, not an IndexError."""
+        multidata_filename = os.path.join(self.directory.name, "empty.archipelago")
+        open(multidata_filename, "wb").close()
+        with self.assertRaisesRegex(ValueError, "empty"):
+            Context("", 0, "", "", 0, 0, False).load(multidata_filename)
+
+    def test_torn_record(self) -> None:
+        """An incomplete record at the end of the journal, as left by a crash, is cut off."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx)
+        ctx._save()
+        with open(ctx.save_journal.path, "ab") as f:
+            f.write(SaveJournal.record_header.pack(100) + b"torn")
+
+        loaded = self.make_context()
+        self.assert_changes(loaded)
+        loaded.hints_used[0, 1] = 2
+        loaded.note_save_meta()
+        loaded._save()
+        self.assertEqual(self.make_context().hints_used[0, 1], 2)
+
+    def test_compaction(self) -> None:
+        """Writing a new save file starts over the journal, and an outdated journal is not replayed."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx)
+        ctx._save()
+        with open(ctx.save_journal.path, "rb") as f:
+            outdated_journal = f.read()
+        ctx.name_aliases.clear()
+        ctx._save(exit_save=True)
+        self.assertEqual(ctx.save_journal.size, os.path.getsize(ctx.save_journal.path))
+        with open(ctx.save_journal.path, "wb") as f:
+            f.write(outdated_journal)
+
+        loaded = self.make_context()
+        self.assertEqual(loaded.name_aliases, {})
+        self.assertEqual(loaded.location_checks[0, 1], {2, 3})
+
+    def test_without_journal(self) -> None:
+        """A save file written without journal discards the journal, as it may be older than the save file."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx)
+        ctx._save()
+        ctx.save_journal = None
+        ctx.name_aliases.clear()
+        ctx._save()
+
+        loaded = self.make_context()
+        self.assertEqual(loaded.name_aliases, {})
+        self.assertTrue(loaded.save_journal.compact_next)
+
+
+class TestSendNewItems(unittest.TestCase):
+    def test_batched(self) -> None:
+        """Items sent in the same event loop iteration arrive in one packet, only at the clients receiving them."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        sent: typing.List[typing.Tuple[Client, typing.List[dict]]] = []
+
+        async def send_msgs(endpoint: Client, msgs: typing.List[dict]) -> bool:
+            sent.append((endpoint, msgs))
+            return True
+
+        ctx.send_msgs = send_msgs  # type: ignore[method-assign]
+        receiver = Client(None, ctx)  # type: ignore[arg-type]
+        receiver.team, receiver.slot, receiver.remote_items = 0, 1, True
+        local_receiver = Client(None, ctx)  # type: ignore[arg-type]
+        local_receiver.team, local_receiver.slot = 0, 1
+        other = Client(None, ctx)  # type: ignore[arg-type]
+        other.team, other.slot, other.remote_items = 0, 2, True
+        ctx.clients = {0: {1: [receiver, local_receiver], 2: [other]}}
+
+        async def check_locations() -> None:
+            send_items_to(ctx, 0, 1, NetworkItem(10, 100, 2, 0))
+            send_new_items(ctx)
+            send_items_to(ctx, 0, 1, NetworkItem(11, 101, 1, 0))
+            send_new_items(ctx)
+            self.assertEqual(sent, [])
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        asyncio.run(check_locations())
+        self.assertCountEqual(sent, [
+            (receiver, [{"cmd": "ReceivedItems", "index": 0,
+                         "items": [NetworkItem(10, 100, 2, 0), NetworkItem(11, 101, 1, 0)]}]),
+            (local_receiver, [{"cmd": "ReceivedItems", "index": 0, "items": [NetworkItem(10, 100, 2, 0)]}]),
+        ])
+        self.assertEqual((receiver.send_index, local_receiver.send_index, other.send_index), (2, 1, 0))
+
+
+class TestSendQueue(unittest.TestCase):
+    class SlowSocket:
+        open = True
+
+        def __init__(self, sent: typing.List[str], buffered: int) -> None:
+            self.sent = sent
+            self.transport = mock.Mock(**{"get_write_buffer_size.return_value": buffered})
+
+        async def send(self, msg: str) -> None:
+            await asyncio.sleep(0)
+            self.sent.append(msg)
+
+    def test_coalesce(self) -> None:
+        """Messages queued while a client that fell behind is busy are sent together, in order."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        sent: typing.List[str] = []
+        client = Client(self.SlowSocket(sent, 1024 * 1024), ctx)  # type: ignore[arg-type]
+        text_client = Client(self.SlowSocket(sent, 1024 * 1024), ctx)  # type: ignore[arg-type]
+        text_client.no_text = True
+        ctx.endpoints = [client, text_client]
+
+        async def send() -> None:
+            self.assertTrue(await ctx.send_msgs(client, [{"cmd": "RoomUpdate", "hint_points": 1}]))
+            await asyncio.sleep(0)  # first message is being sent
+            await ctx.broadcast_send_encoded_msgs(ctx.endpoints, '[{"cmd":"PrintJSON","data":[]}]', True, True)
+            await ctx.send_msgs(client, [{"cmd": "RoomUpdate", "hint_points": 2}])
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        asyncio.run(send())
+        self.assertEqual(sent, [
+            '[{"cmd":"RoomUpdate","hint_points":1}]',
+            '[{"cmd":"PrintJSON","data":[]},{"cmd":"RoomUpdate","hint_points":2}]',
+        ])
+        self.assertEqual(ctx.get_send_queue_stats(), {"queued": 0, "queued_size": 0, "max_queued_size": 0,
+                                                      "sent": 2, "coalesced": 1, "dropped": 1, "dropped_size": 31,
+                                                      "overflows": 0})
+
+    def test_send_directly(self) -> None:
+        """Other messages, and all messages to clients that keep up, are sent right away without being queued."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        sent: typing.List[str] = []
+        client = Client(self.SlowSocket(sent, 0), ctx)  # type: ignore[arg-type]
+        behind = Client(self.SlowSocket(sent, 1024 * 1024), ctx)  # type: ignore[arg-type]
+
+        async def send() -> None:
+            self.assertTrue(await ctx.send_msgs(client, [{"cmd": "RoomUpdate", "hint_points": 1}]))
+            self.assertTrue(await ctx.send_msgs(behind, [{"cmd": "ReceivedItems", "index": 0, "items": []}]))
+            self.assertEqual(len(sent), 2)
+            with mock.patch("websockets.broadcast") as broadcast:
+                await ctx.broadcast_send_encoded_msgs([client, behind], "[]", True)
+            broadcast.assert_called_once_with([client.socket], "[]")
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        asyncio.run(send())
+        self.assertEqual((client.send_queue.sent, behind.send_queue.sent), (0, 1))
+
+    def test_order(self) -> None:
+        """Other messages to a client with messages queued wait behind them instead of overtaking them."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        sent: typing.List[str] = []
+        client = Client(self.SlowSocket(sent, 1024 * 1024), ctx)  # type: ignore[arg-type]
+
+        async def send() -> None:
+            await ctx.send_msgs(client, [{"cmd": "RoomUpdate", "hint_points": 1}])
+            await asyncio.sleep(0)  # first message is being sent
+            await ctx.send_msgs(client, [{"cmd": "RoomUpdate", "hint_points": 2}])
+            self.assertTrue(await ctx.send_msgs(client, [{"cmd": "ReceivedItems", "index": 0, "items": []}]))
+            with mock.patch("websockets.broadcast") as broadcast:
+                await ctx.broadcast_send_encoded_msgs([client], '[{"cmd":"Bounced"}]')
+            broadcast.assert_called_once_with([], '[{"cmd":"Bounced"}]')
+            self.assertEqual(sent, [])
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        asyncio.run(send())
+        self.assertEqual(sent, [
+            '[{"cmd":"RoomUpdate","hint_points":1}]',
+            '[{"cmd":"RoomUpdate","hint_points":2},{"cmd":"ReceivedItems","index":0,"items":[]},{"cmd":"Bounced"}]',
+        ])
+
+    def test_overflow(self) -> None:
+        """Text is dropped first, then the queue refuses what does not fit."""
+        queue = SendQueue(10)
+        self.assertTrue(queue.put("[1,2]", False))
+        self.assertTrue(queue.put("[3]", True))
+        self.assertTrue(queue.put("[4]", False))
+        self.assertTrue(queue.put("[5]", True))
+        self.assertEqual((queue.dropped, queue.size), (2, 8))
+        self.assertFalse(queue.put("[6]", False))
+        self.assertEqual(queue.pop(), "[1,2,4]")
+        self.assertEqual((queue.size, queue.coalesced), (0, 1))
+
+    def test_frame_size(self) -> None:
+        """Coalesced messages are split up to not exceed max_frame_size, a larger single message is sent as is."""
+        queue = SendQueue(100, 10)
+        for msg in ("[1,2]", "[3]", "[4,5]", "[6]", "[7,8,9,10,11]", "[]", "[12]"):
+            self.assertTrue(queue.put(msg, False))
+        self.assertEqual(queue.pop(), "[1,2,3]")
+        self.assertEqual(queue.size, 27)
+        self.assertEqual(queue.pop(), "[4,5,6]")
+        self.assertEqual(queue.pop(), "[7,8,9,10,11]")
+        self.assertEqual(queue.pop(), "[12]")
+        self.assertEqual((queue.size, queue.sent, queue.coalesced), (0, 4, 3))
+
+
+class TestBounce(unittest.TestCase):
+    def test_receivers(self) -> None:
+        """Bounce reaches the clients of the same team matching any of the games, tags or slots."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.games = {1: "A", 2: "B", 3: "B"}
+        ctx.clients = {0: {1: [], 2: [], 3: []}, 1: {1: [], 2: [], 3: []}}
+        clients: typing.Dict[typing.Tuple[int, int], Client] = {}
+        for team in (0, 1):
+            for slot in (1, 2, 3):
+                client = clients[team, slot] = Client(None, ctx)  # type: ignore[arg-type]
+                client.team, client.slot, client.auth = team, slot, True
+                client.tags = ["DeathLink"] if slot != 3 else []
+                ctx.clients[team][slot].append(client)
+                ctx.add_bounce_receiver(client)
+        received: typing.List[Client] = []
+
+        async def broadcast_send_encoded_msgs(endpoints: typing.Iterable[Client], msg: str) -> bool:
+            received.extend(endpoints)
+            return True
+
+        ctx.broadcast_send_encoded_msgs = broadcast_send_encoded_msgs  # type: ignore[method-assign]
+
+        def bounce(**args: typing.List[typing.Any]) -> typing.List[Client]:
+            received.clear()
+            asyncio.run(process_client_cmd(ctx, clients[0, 1], {"cmd": "Bounce", "data": {}, **args}))
+            return received
+
+        self.assertCountEqual(bounce(tags=["DeathLink"]), [clients[0, 1], clients[0, 2]])
+        self.assertCountEqual(bounce(games=["B"], slots=[1]), [clients[0, 1], clients[0, 2], clients[0, 3]])
+        self.assertCountEqual(bounce(slots=[3, 4]), [clients[0, 3]])
+
+        ctx.remove_bounce_receiver(clients[0, 2])
+        clients[0, 2].tags = []
+        ctx.add_bounce_receiver(clients[0, 2])
+        clients[0, 1].auth = False  # skips the leave message
+        asyncio.run(ctx.disconnect(clients[0, 1]))
+        self.assertEqual(bounce(tags=["DeathLink"]), [])
+        self.assertEqual(set(ctx.bounce_tags), {(1, "DeathLink")})
+
+
+class TestLocationHints(unittest.TestCase):
+    def test_recheck_location(self) -> None:
+        """Checking a location only updates the hints for that location, in all hint lists they are in."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        hint = Hint(2, 1, 5, 10, False)
+        other_hint = Hint(2, 1, 6, 11, False)
+        for hinted in (hint, other_hint):
+            ctx.hints[0, 1].add(hinted)
+            ctx.hints[0, 2].add(hinted)
+            ctx.index_hint(0, hinted)
+
+        ctx.location_checks[0, 1] |= {5}
+        changed: typing.Set[typing.Tuple[int, int]] = set()
+        ctx.recheck_location_hints(0, 1, {5}, changed)
+        found_hint = hint.re_check(ctx, 0)
+        self.assertTrue(found_hint.found)
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+        self.assertEqual(ctx.hints[0, 1], {found_hint, other_hint})
+        self.assertEqual(ctx.hints[0, 2], {found_hint, other_hint})
+        self.assertEqual(ctx.get_save()["hints"][0, 2], {found_hint, other_hint})
+
+        changed.clear()
+        ctx.recheck_location_hints(0, 1, {5}, changed)
+        self.assertEqual(changed, set())
+
+    def test_replace_hint(self) -> None:
+        """Replacing a hint, e.g. by changing its status, also replaces it in the hints to recheck for its location."""
+        ctx = Context("", 0, "", "", 0, 0, False)
+        hint = Hint(2, 1, 5, 10, False)
+        ctx.hints[0, 1].add(hint)
+        ctx.hints[0, 2].add(hint)
+        ctx.index_hint(0, hint)
+
+        new_hint = hint.re_prioritize(ctx, HintStatus.HINT_AVOID)
+        for slot in (1, 2):
+            self.assertTrue(ctx.replace_hint(0, slot, hint, new_hint))
+        self.assertEqual(ctx.location_hints[0, 1, 5], {new_hint})
+
+        ctx.location_checks[0, 1] |= {5}
+        ctx.recheck_hints(0, 1)
+        found_hint = new_hint.re_check(ctx, 0)
+        self.assertEqual(ctx.location_hints[0, 1, 5], {found_hint})
@@ -103,3 +103,103 @@ class TestTracker(TestBase):
                 self.assertEqual(response.status_code, 200)
             with self.client.open(url_for("api.tracker_slot_data", tracker=self.tracker_uuid)) as response:
                 self.assertEqual(response.status_code, 200)
+
+    def test_decoded_data_cache(self) -> None:
+        """Verify that trackers share the decoded multidata and reload the multisave after every save of the room."""
+        import datetime
+        from pony.orm import db_session
+        from NetUtils import ClientStatus
+        from WebHostLib.models import Room, TrackerAggregates
+        from WebHostLib.tracker import TrackerData
+
+        with self.app.app_context(), db_session:
+            room = Room.get(id=self.room_id)
+            first = TrackerData(room)
+            second = TrackerData(room)
+            self.assertIs(first._multidata, second._multidata)
+            self.assertIs(first.item_id_to_name["Archipelago"], second.item_id_to_name["Archipelago"])
+            self.assertIs(first._multisave, second._multisave)
+
+            room.multisave = pickle.dumps({"client_game_state": {(0, 1): ClientStatus.CLIENT_GOAL}})
+            TrackerAggregates(room=room, data=pickle.dumps({}))
+            third = TrackerData(room)
+            self.assertIs(first._multidata, third._multidata)
+            self.assertEqual(third.get_player_client_status(0, 1), ClientStatus.CLIENT_GOAL)
+
+            # saving on shutdown doesn't count as activity, but still has to show up
+            last_activity = room.last_activity
+            room.multisave = pickle.dumps({"client_game_state": {(0, 1): ClientStatus.CLIENT_PLAYING}})
+            room.tracker_aggregates.saved += datetime.timedelta(seconds=1)
+            fourth = TrackerData(room)
+            self.assertEqual(room.last_activity, last_activity)
+            self.assertEqual(fourth.get_player_client_status(0, 1), ClientStatus.CLIENT_PLAYING)
+
+    def test_decoded_data_cache_without_aggregates(self) -> None:
+        """Verify that the multisave of a room that saved without tracker aggregates is reloaded on its activity."""
+        import datetime
+        from pony.orm import db_session
+        from NetUtils import ClientStatus
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        with self.app.app_context(), db_session:
+            room = Room.get(id=self.room_id)
+            room.multisave = pickle.dumps({"client_game_state": {(0, 1): ClientStatus.CLIENT_GOAL}})
+            room.last_activity += datetime.timedelta(seconds=1)
+            self.assertEqual(TrackerData(room).get_player_client_status(0, 1), ClientStatus.CLIENT_GOAL)
+
+            room.multisave = pickle.dumps({"client_game_state": {(0, 1): ClientStatus.CLIENT_PLAYING}})
+            room.last_activity += datetime.timedelta(seconds=1)
+            self.assertIsNone(room.tracker_aggregates)
+            self.assertEqual(TrackerData(room).get_player_client_status(0, 1), ClientStatus.CLIENT_PLAYING)
+
+    def test_decoded_data_cache_entries(self) -> None:
+        """Verify that the decoded data cache evicts the least recently used entries past its configured count."""
+        from WebHostLib.tracker import _DecodedDataCache
+
+        cache = _DecodedDataCache()
+        entries = self.app.config["TRACKER_CACHE_ENTRIES"]
+        self.app.config["TRACKER_CACHE_ENTRIES"] = 2
+        try:
+            first = cache.get(("test", 1), lambda: [1])
+            cache.get(("test", 2), lambda: [2])
+            self.assertIs(cache.get(("test", 1), lambda: [1]), first)
+            cache.get(("test", 3), lambda: [3])
+            self.assertIs(cache.get(("test", 1), lambda: [1]), first)
+            self.assertEqual(cache.get(("test", 2), lambda: None), None)
+        finally:
+            self.app.config["TRACKER_CACHE_ENTRIES"] = entries
+
+    def test_tracker_aggregates(self) -> None:
+        """Verify that trackers use the counts saved by the room instead of the multisave when they exist."""
+        import collections
+        from pony.orm import db_session
+        from NetUtils import ClientStatus
+        from WebHostLib.models import Room, TrackerAggregates
+        from WebHostLib.tracker import TrackerData
+
+        aggregates = {(0, 1): {"items": 2, "inventory": collections.Counter({1: 2}), "checked": 3,
+                               "status": ClientStatus.CLIENT_PLAYING}}
+        with self.app.app_context(), db_session:
+            room = Room.get(id=self.room_id)
+            room.multisave = pickle.dumps({"client_game_state": {(0, 1): ClientStatus.CLIENT_GOAL}})
+            TrackerAggregates(room=room, data=pickle.dumps(aggregates))
+            tracker = TrackerData(room)
+            self.assertEqual(tracker.get_player_client_status(0, 1), ClientStatus.CLIENT_PLAYING)
+            self.assertEqual(tracker.get_player_checked_locations_count(0, 1), 3)
+            self.assertEqual(tracker.get_player_inventory_counts(0, 1)[1], 2)
+            self.assertIsNone(tracker._loaded_multisave)
+
+    def test_tracker_aggregates_deleted_with_room(self) -> None:
+        """Verify that bulk deleting a room, like autolauncher's cleanup does, also deletes its tracker aggregates."""
+        from pony.orm import db_session
+        from WebHostLib.models import Room, TrackerAggregates
+
+        with db_session:
+            room = Room(seed=Room.get(id=self.room_id).seed, owner=uuid4())
+            TrackerAggregates(room=room, data=pickle.dumps({}))
+            room_id = room.id
+        with db_session:
+            Room.select(lambda room: room.id == room_id).delete(bulk=True)
+        with db_session:
+            self.assertFalse(TrackerAggregates.select(lambda row: row.room.id == room_id).exists())
@@ -0,0 +1,62 @@
+import io
+import zipfile
+from pathlib import Path
+from typing import ClassVar
+from uuid import uuid4
+
+from . import TestBase
+
+
+class TestUpload(TestBase):
+    data: ClassVar[bytes]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        with (Path(__file__).parent / "data" / "One_Archipelago.archipelago").open("rb") as f:
+            cls.data = f.read()
+
+    def test_upload_zip(self) -> None:
+        """Verify that slot files of an uploaded zip end up in the slot they belong to, stored in chunks."""
+        from unittest import mock
+        from pony.orm import db_session
+        from WebHostLib.models import Seed, SlotDataChunk
+        from WebHostLib.upload import upload_zip_to_db
+
+        patch = bytes(range(256)) * 1024
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zfile:
+            zfile.writestr("AP_12345_P1_Player1.bin", patch)
+            zfile.writestr("AP_12345_Spoiler.txt", "spoiler")
+            zfile.writestr("AP_12345.archipelago", self.data)
+
+        with self.app.app_context(), self.app.test_request_context(), db_session, \
+                mock.patch("WebHostLib.upload.slot_data_chunk_size", 100000):
+            with zipfile.ZipFile(buffer) as zfile:
+                seed = upload_zip_to_db(zfile, owner=uuid4())
+            seed_id = seed.id
+            self.assertEqual(seed.slots.select().first().read_file(), patch)
+        with db_session:
+            seed = Seed.get(id=seed_id)
+            self.assertEqual(seed.spoiler, "spoiler")
+            slot = seed.slots.select().first()
+            self.assertEqual(slot.player_id, 1)
+            self.assertTrue(slot.has_file())
+            self.assertEqual(slot.read_file(), patch)
+            self.assertEqual(SlotDataChunk.select(lambda chunk: chunk.slot_id == slot.id).count(), 3)
+
+    def test_cleanup_slot_data(self) -> None:
+        """Verify that autolauncher's cleanup deletes the slot file chunks of the slots it deletes."""
+        from pony.orm import db_session, flush
+        from WebHostLib.autolauncher import cleanup
+        from WebHostLib.models import Slot, SlotDataChunk
+
+        with db_session:
+            slot = Slot(player_id=1, player_name="Player1", game="Archipelago")
+            flush()
+            SlotDataChunk(slot_id=slot.id, index=0, data=b"patch")
+            slot_id = slot.id
+        cleanup()
+        with db_session:
+            self.assertIsNone(Slot.get(id=slot_id))
+            self.assertFalse(SlotDataChunk.select(lambda chunk: chunk.slot_id == slot_id).exists())
@@ -6,7 +6,6 @@ import pathlib
 import sys
 import time
 from random import Random
-from dataclasses import make_dataclass
 from typing import (Any, Callable, ClassVar, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, TextIO, Tuple,
                     TYPE_CHECKING, Type, Union)
 
@@ -78,7 +77,7 @@ class AutoWorldRegister(type):
         if "world_version" in dct:
             if dct["world_version"] != Version(0, 0, 0):
                 raise RuntimeError(f"{name} is attempting to set 'world_version' from within the class. world_version "
-                                   f"can only be set from manifest.")
+                                   "can only be set from manifest.")
 
         # construct class
         new_class = super().__new__(mcs, name, bases, dct)
@@ -115,7 +114,8 @@ class AutoLogicRegister(type):
                 assert callable(function) or "init_mixin" in dct, (
                     f"{name} defined class variable {item_name} without also having init_mixin.\n\n"
                     "Explanation:\n"
-                    "Class variables that will be mutated need to be inintialized as instance variables in init_mixin.\n"
+                    "Class variables that will be mutated need to be inintialized as instance variables in "
+                    "init_mixin.\n"
                     "If your LogicMixin variables aren't actually mutable / you don't intend to mutate them, "
                     "there is no point in using LogixMixin.\n"
                     "LogicMixin exists to track custom state variables that change when items are collected/removed."
@@ -142,7 +142,7 @@ class WebWorldRegister(type):
 
             if group.name == "Item & Location Options":
                 assert not any(option in item_and_loc_options for option in group.options), \
-                    f"Item and Location Options cannot be specified multiple times"
+                    "Item and Location Options cannot be specified multiple times"
                 group.options.extend(item_and_loc_options)
                 item_group_in_list = True
             else:
@@ -163,6 +163,8 @@ def _timed_call(method: Callable[..., Any], *args: Any,
     start = time.perf_counter()
     ret = method(*args)
     taken = time.perf_counter() - start
+    if multiworld and multiworld.generation_profile:
+        multiworld.generation_profile.record_stage(method.__name__, player, taken)
     if taken > 1.0:
         if player and multiworld:
             perf_logger.info(f"Took {taken:.4f} seconds in {method.__qualname__} for player {player}, "
@@ -202,6 +204,8 @@ def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
                         f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
 
     call_stage(multiworld, method_name, *args)
+    if method_name == "create_items":
+        multiworld.index_prog_items()
 
 
 def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
@@ -209,7 +213,7 @@ def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     for world_type in sorted(world_types, key=lambda world: world.__name__):
         stage_callable = getattr(world_type, f"stage_{method_name}", None)
         if stage_callable:
-            _timed_call(stage_callable, multiworld, *args)
+            _timed_call(stage_callable, multiworld, *args, multiworld=multiworld)
 
 
 class WebWorld(metaclass=WebWorldRegister):
@@ -314,6 +318,12 @@ class World(metaclass=AutoWorldRegister):
     If False, everything is rechecked at every step, which is slower computationally, 
     but may be desirable in complex/dynamic worlds."""
 
+    interned_prog_items: bool = False
+    """If True, this world's progression item names are interned once all items are created and CollectionState counts
+    them in an array instead of a Counter, so copying states is a single memory copy per player. Worlds relying on
+    state.prog_items[player] being an actual Counter, e.g. by using Counter arithmetic on it, should leave this
+    False."""
+
     multiworld: "MultiWorld"
     """autoset on creation. The MultiWorld object for the currently generating multiworld."""
     player: int
@@ -358,7 +368,8 @@ class World(metaclass=AutoWorldRegister):
 
     # overridable methods that get called by Main.py, sorted by execution order
     # can also be implemented as a classmethod and called "stage_<original_name>",
-    # in that case the MultiWorld object is passed as the first argument, and it gets called once for the entire multiworld.
+    # in that case the MultiWorld object is passed as the first argument,
+    # and it gets called once for the entire multiworld.
     # An example of this can be found in alttp as stage_pre_fill
 
     @classmethod
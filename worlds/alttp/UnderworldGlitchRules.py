@@ -29,7 +29,8 @@ def fake_pearl_state(state, player):
     if state.has('Moon Pearl', player):
         return state
     fake_state = state.copy()
-    fake_state.prog_items[player]['Moon Pearl'] += 1
+    fake_state.add_item('Moon Pearl', player)
+    fake_state.stale[player] = True
     return fake_state
 
 